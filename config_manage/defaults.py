@@ -31,7 +31,10 @@ class DefaultConfigProvider:
             "music_settings": {
                 "style": "J-Pop, Upbeat",
                 "model": "V4",
-                "instrumental": False
+                "instrumental": False,
+                "callback_url": "",
+                "callback_port": 0,
+                "poll_timeout": 240
             },
             "ai_features": {
                 "enable_summary_text": True,
@@ -63,12 +66,36 @@ class DefaultConfigProvider:
                 "enable_audio_player": True,
                 "enable_timeshift_jump": True
             },
+            "highlight_settings": {
+                "window_seconds": 300,
+                "threshold": 2.5,
+                "max_highlights": 10,
+                "min_gap_seconds": 60
+            },
+            "storage_settings": {
+                "json_compression": "none",
+                "json_indent": 2,
+                "html_precompress": [],
+                "cleanup_intermediate_audio": False
+            },
+            "pipeline_settings": {
+                "max_parallel_steps": 4,
+                "max_process_workers": 2,
+                "resume": True,
+                "priority": 0,
+                "step_executors": {},
+                "step_limits": {}
+            },
             "special_users": [],
             "special_users_config": {
                 "default_analysis_enabled": True,
                 "default_analysis_ai_model": "openai-gpt4o",
                 "default_analysis_prompt": "以下のユーザーのコメント履歴を分析して、このユーザーの特徴、傾向、配信との関わり方について詳しく分析してください。\n\n分析観点：\n- コメントの頻度と投稿タイミング\n- コメント内容の傾向（質問、感想、ツッコミなど）\n- 配信者との関係性\n- 他の視聴者との関わり\n- このユーザーの配信に対する貢献度\n- 特徴的な発言や行動パターン",
                 "default_template": "user_detail.html",
+                "list_page_size": 0,
+                "analysis_max_workers": 4,
+                "analysis_provider_concurrency": {"openai": 2, "google": 2},
+                "analysis_prompt_max_tokens": 6000,
                 "users": {}
             },
             # 引数設定を追加
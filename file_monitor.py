@@ -1,16 +1,60 @@
 import os
 import time
 import re
-import subprocess
+import logging
 import threading
 from datetime import datetime
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from pipeline_modules.fs_index import DirectoryIndex, get_directory_index
+from pipeline_modules.job_queue import PipelineJobQueue
+from pipeline_modules.pipeline_job import PipelineJobHandle
+
+DEBUGLOG = logging.getLogger(__name__)
+
+
+def start_pipeline_process(job, logger):
+    """pipeline.py をサブプロセスで起動してハンドルを返す（終了は待たない）"""
+    user_name = job['user_name']
+    lv_value = job['lv_value']
+    
+    def on_progress(handle, event):
+        # ステップの完了・失敗だけをログに残す（出力全体はハンドルのバッファで確認）
+        if event.get('status') in ('running', 'cached', 'disabled'):
+            return
+        logger.event(
+            'pipeline_step', user=user_name, lv_value=lv_value, step=event['step'], status=event['status'],
+            step_seconds=event.get('step_seconds'), elapsed=event.get('elapsed'), eta_seconds=event.get('eta_seconds')
+        )
+        eta = event.get('eta_seconds')
+        eta_text = f", 残り約{eta:.0f}秒" if eta is not None else ""
+        logger.log(f"[{user_name}] {lv_value} {event['step']}: {event['status']} ({event['done']}/{event['total']}{eta_text})")
+    
+    def on_done(handle):
+        DEBUGLOG.debug(f"[{user_name}] パイプライン終了コード: {handle.returncode}")
+        logger.event(
+            'pipeline_done', 'INFO' if handle.returncode == 0 else 'ERROR', user=user_name, lv_value=lv_value,
+            returncode=handle.returncode, total_seconds=round(handle.finished_at - handle.started_at, 1)
+        )
+        if handle.returncode == 0:
+            logger.log(f"[{user_name}] パイプライン処理完了: {lv_value}")
+        else:
+            logger.log(f"[{user_name}] パイプライン処理失敗: {lv_value} (終了コード {handle.returncode})", 'ERROR')
+    
+    handle = PipelineJobHandle(job, on_progress=on_progress)
+    DEBUGLOG.debug(f"[{user_name}] 実行コマンド: {' '.join(handle.cmd)}")
+    handle.start()
+    handle.add_done_callback(on_done)
+    return handle
 
 class Mp4FileHandler(FileSystemEventHandler):
     def __init__(self, mp4_monitor):
         self.mp4_monitor = mp4_monitor
         
+    def on_any_event(self, event):
+        # 監視中のイベントでファイル名インデックスも差分更新
+        self.mp4_monitor.file_index.apply_event(event)
+        
     def on_created(self, event):
         if not event.is_directory and event.src_path.endswith('.mp4'):
             filename = os.path.basename(event.src_path)
@@ -23,11 +67,12 @@ class Mp4FileHandler(FileSystemEventHandler):
             self.mp4_monitor.handle_file_change(filename)
 
 class Mp4Monitor:
-    def __init__(self, user_name, config, logger, error_callback):
+    def __init__(self, user_name, config, logger, error_callback, job_queue=None):
         self.user_name = user_name
         self.config = config
         self.logger = logger
         self.error_callback = error_callback
+        self.job_queue = job_queue
         
         # display_nameを取得
         self.display_name = config.get("display_name", "")
@@ -42,6 +87,9 @@ class Mp4Monitor:
         # アカウントIDからディレクトリを特定
         self.platform_directory = self.find_account_directory()
         
+        # アカウントディレクトリのファイル名インデックス（Mp4FileHandlerのイベントで更新）
+        self.file_index = DirectoryIndex(self.platform_directory, watch=False).start()
+        
         # ★ 追加が必要な属性 ★
         self.running = False
         self.observer = None
@@ -119,7 +167,7 @@ class Mp4Monitor:
                 print(f"DEBUG: [{self.user_name}] call_pipeline開始前")
                 self.call_pipeline(lv_value)
                 print(f"DEBUG: [{self.user_name}] call_pipeline完了")
-                # 処理完了後は無視リストに追加
+                # キュー投入後は無視リストに追加
                 self.ignored_files.add(filename)
                 print(f"DEBUG: [{self.user_name}] ファイルを無視リストに追加: {filename}")
             else:
@@ -144,21 +192,12 @@ class Mp4Monitor:
                 self.logger.log(f"[{self.user_name}] 監視ディレクトリが存在しません: {self.base_platform_directory}")
                 return self.base_platform_directory
             
-            # ディレクトリ一覧を取得
-            for dirname in os.listdir(self.base_platform_directory):
-                dir_path = os.path.join(self.base_platform_directory, dirname)
-                
-                if os.path.isdir(dir_path):
-                    # アンダースコア前の数字部分を抽出
-                    if '_' in dirname:
-                        id_part = dirname.split('_')[0]
-                    else:
-                        id_part = dirname
-                    
-                    # アカウントIDと一致するかチェック
-                    if id_part == account_id:
-                        self.logger.log(f"[{self.user_name}] アカウントディレクトリ発見: {dir_path}")
-                        return dir_path
+            # アンダースコア前の数字部分がアカウントIDと一致するディレクトリを検索（インデックス経由）
+            index = get_directory_index(self.base_platform_directory)
+            dir_path = index.find(lambda dirname: dirname.split('_')[0] == account_id, kind='dir')
+            if dir_path:
+                self.logger.log(f"[{self.user_name}] アカウントディレクトリ発見: {dir_path}")
+                return dir_path
             # 見つからなかった場合は新規作成
             if self.display_name:
                 account_dir = os.path.join(self.base_platform_directory, f"{account_id}_{self.display_name}")
@@ -177,19 +216,19 @@ class Mp4Monitor:
         try:
             if not os.path.exists(self.platform_directory):
                 self.platform_directory = self.find_account_directory()
+                self.file_index = DirectoryIndex(self.platform_directory, watch=False).start()
                 
             if not os.path.exists(self.platform_directory):
                 return {}
             
             files_info = {}
-            for filename in os.listdir(self.platform_directory):
-                if filename.endswith('.mp4'):
-                    filepath = os.path.join(self.platform_directory, filename)
-                    try:
-                        size = os.path.getsize(filepath)
-                        files_info[filename] = size
-                    except OSError:
-                        continue
+            for filename in self.file_index.names(lambda name: name.endswith('.mp4')):
+                filepath = os.path.join(self.platform_directory, filename)
+                try:
+                    size = os.path.getsize(filepath)
+                    files_info[filename] = size
+                except OSError:
+                    continue
             
             return files_info
         except Exception as e:
@@ -203,57 +242,29 @@ class Mp4Monitor:
         return None
 
     def call_pipeline(self, lv_value):
+        """パイプライン実行を共通キューに投入（起動はGPU・CPU・APIの空きに応じてキュー側で行う）"""
         try:
-            print(f"DEBUG: [{self.user_name}] パイプライン呼び出し開始: {lv_value}")
-            
-            import sys
-            python_executable = sys.executable
-            print(f"DEBUG: [{self.user_name}] Python実行ファイル: {python_executable}")
-            
-            env = os.environ.copy()
-            env['PYTHONUNBUFFERED'] = '1'
-            
-            cmd = [
-                python_executable,
-                'pipeline.py',
-                self.config["basic_settings"]["platform"],
-                self.config["basic_settings"]["account_id"],
-                self.config["basic_settings"]["platform_directory"],
-                self.config["basic_settings"]["ncv_directory"],
-                lv_value,
-            ]
-            
-            print(f"DEBUG: [{self.user_name}] 実行コマンド: {' '.join(cmd)}")
-            print(f"DEBUG: [{self.user_name}] subprocess.Popen開始")
-            
-            # Popenでリアルタイム出力
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
-                env=env
-            )
-            
-            print(f"DEBUG: [{self.user_name}] プロセス開始、出力待機中...")
-            
-            # リアルタイムで行ごとに出力
-            for line in iter(process.stdout.readline, ''):
-                print(line.rstrip())
-            
-            process.wait()
-            print(f"DEBUG: [{self.user_name}] パイプライン終了コード: {process.returncode}")
-            
-            if process.returncode == 0:
-                self.logger.log(f"[{self.user_name}] パイプライン処理完了: {lv_value}")
-                
+            if self.job_queue is None:
+                start_pipeline_process(self.pipeline_job(lv_value), self.logger)
+                return
+            self.job_queue.enqueue(self.user_name, self.config, lv_value)
         except Exception as e:
             print(f"DEBUG: [{self.user_name}] パイプライン呼び出しエラー: {str(e)}")
             import traceback
             print(f"DEBUG: [{self.user_name}] エラートレースバック: {traceback.format_exc()}")
 
+    def pipeline_job(self, lv_value):
+        """キューを使わずに直接実行する場合のジョブ情報"""
+        basic = self.config["basic_settings"]
+        return {
+            'user_name': self.user_name,
+            'platform': basic["platform"],
+            'account_id': basic["account_id"],
+            'platform_directory': basic["platform_directory"],
+            'ncv_directory': basic["ncv_directory"],
+            'lv_value': lv_value
+        }
+
     def start_watching(self):
         if not self.running:
             self.running = True
@@ -294,16 +305,17 @@ class Mp4Monitor:
             timer.cancel()
         self.stability_threads.clear()
 
-# MultiUserMonitorクラスは変更なし
 class MultiUserMonitor:
     def __init__(self, logger, error_callback):
         self.logger = logger
         self.error_callback = error_callback
         self.active_watchers = {}
+        # 全アカウントのパイプラインを1つのキューで順番に起動（前回の待機分も再開）
+        self.job_queue = PipelineJobQueue(lambda job: start_pipeline_process(job, logger), logger).start()
     
     def start_user_watch(self, user_name, config):
         if user_name not in self.active_watchers:
-            monitor = Mp4Monitor(user_name, config, self.logger, self.error_callback)
+            monitor = Mp4Monitor(user_name, config, self.logger, self.error_callback, self.job_queue)
             self.active_watchers[user_name] = monitor
             monitor.start_watching()
             return True
@@ -323,4 +335,5 @@ class MultiUserMonitor:
     
     def stop_all(self):
         for user_name in list(self.active_watchers.keys()):
-            self.stop_user_watch(user_name)
\ No newline at end of file
+            self.stop_user_watch(user_name)
+        self.job_queue.stop()
\ No newline at end of file
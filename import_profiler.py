@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import atexit
+import builtins
+import importlib
+import threading
+
+# 子プロセス（pipeline.py）にも計測を引き継ぐための環境変数
+PROFILE_ENV = 'NICO_PROFILE_IMPORTS'
+
+_records = {}
+_local = threading.local()
+_installed = False
+_started_at = None
+
+
+def is_requested(argv=None):
+    """--profile-imports 指定（または親プロセスからの引き継ぎ）があるか"""
+    argv = sys.argv if argv is None else argv
+    return '--profile-imports' in argv or os.environ.get(PROFILE_ENV) == '1'
+
+
+def _timed(load, name):
+    """未読み込みのモジュールだけ計測（累積時間と、子のimportを除いた自身の時間）"""
+    if name in sys.modules:
+        return load()
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        return load()
+    finally:
+        elapsed = time.perf_counter() - started
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        record = _records.setdefault(name, {'cumulative': 0.0, 'self': 0.0, 'nested': bool(stack)})
+        record['cumulative'] += elapsed
+        record['self'] += elapsed - children
+
+
+def install(label='import'):
+    """import文とimportlib.import_moduleを計測し、終了時にレポートを出す"""
+    global _installed, _started_at
+    if _installed:
+        return
+    _installed = True
+    _started_at = time.perf_counter()
+    os.environ[PROFILE_ENV] = '1'
+
+    original_import = builtins.__import__
+    original_import_module = importlib.import_module
+
+    def profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level:
+            return original_import(name, globals, locals, fromlist, level)
+        return _timed(lambda: original_import(name, globals, locals, fromlist, level), name)
+
+    def profiled_import_module(name, package=None):
+        if name.startswith('.'):
+            return original_import_module(name, package)
+        return _timed(lambda: original_import_module(name, package), name)
+
+    builtins.__import__ = profiled_import
+    importlib.import_module = profiled_import_module
+    atexit.register(report, label)
+
+
+def report(label='import', top=20, file=None):
+    """import時間の上位を表示"""
+    file = file or sys.stdout
+    total = sum(r['cumulative'] for r in _records.values() if not r['nested'])
+    elapsed = time.perf_counter() - _started_at if _started_at else 0.0
+
+    print(f"=== {label} 時間レポート (計測開始から{elapsed:.2f}秒, 最上位import合計{total:.2f}秒) ===", file=file)
+    print(f"{'累積(秒)':>9} {'自身(秒)':>9}  モジュール", file=file)
+    ranked = sorted(_records.items(), key=lambda item: item[1]['cumulative'], reverse=True)
+    for name, record in ranked[:top]:
+        print(f"{record['cumulative']:9.3f} {record['self']:9.3f}  {name}", file=file)
+    file.flush()
@@ -1,37 +1,152 @@
 import os
+import json
+import time
 import logging
+import itertools
+from collections import deque
 from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+LOG_MAX_BYTES = 10 * 1024 * 1024      # このサイズを超えたらローテーション
+LOG_ROTATE_SECONDS = 24 * 3600        # サイズに関係なく1日ごとにもローテーション
+LOG_BACKUP_COUNT = 7                  # watchdog.log.1 〜 .7 まで残す
+RING_BUFFER_SIZE = 1000               # メモリ上に保持する直近の行数
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def tail_file(path, lines=50, block_size=TAIL_BLOCK_SIZE):
+    """ファイル末尾から必要な行数だけ読む（ファイル全体は読まない）"""
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return []
+    with f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        # 末尾の改行の分だけ1行多く必要
+        while position > 0 and data.count(b'\n') <= lines:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    text_lines = data.decode('utf-8', errors='replace').splitlines()
+    if position > 0:
+        # 先頭は途中から読んだ行なので捨てる
+        text_lines = text_lines[1:]
+    return text_lines[-lines:] if lines > 0 else []
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """サイズ上限か一定時間の経過のどちらかでローテーションする（番号付きバックアップ）"""
+
+    def __init__(self, filename, max_bytes=LOG_MAX_BYTES, interval=LOG_ROTATE_SECONDS,
+                 backup_count=LOG_BACKUP_COUNT, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.interval = interval
+        # 起動時から数える（作成時刻はWindowsだとリネーム直後の同名ファイルに引き継がれるため使わない）
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class RingBufferHandler(logging.Handler):
+    """整形済みの直近の行を連番付きでメモリに保持（読み出しはコピーを取るだけでロック不要）"""
+
+    def __init__(self, capacity=RING_BUFFER_SIZE):
+        super().__init__()
+        self.lines = deque(maxlen=capacity)   # (連番, 行)
+        self.counter = itertools.count(1)
+        self.last_seq = 0
+
+    def emit(self, record):
+        try:
+            seq = next(self.counter)
+            self.lines.append((seq, self.format(record)))
+            self.last_seq = seq
+        except Exception:
+            self.handleError(record)
+
+    def recent(self, since_seq=0, limit=None):
+        """since_seq より後の行を (行リスト, 最新の連番) で返す（バッファから消えた分は読み飛ばす）"""
+        snapshot = list(self.lines)   # deque のコピーはGILの下で一度に行われる
+        if not snapshot:
+            return [], self.last_seq
+        lines = [line for seq, line in snapshot if seq > since_seq]
+        if limit is not None:
+            lines = lines[-limit:] if limit > 0 else []
+        return lines, snapshot[-1][0]
+
+    def clear(self):
+        self.lines.clear()
+
 
 class Logger:
-    def __init__(self):
+    def __init__(self, log_dir="logs", max_bytes=LOG_MAX_BYTES, rotate_seconds=LOG_ROTATE_SECONDS,
+                 backup_count=LOG_BACKUP_COUNT, buffer_size=RING_BUFFER_SIZE):
         # 絶対パスに変換
-        self.log_dir = os.path.abspath("logs")
+        self.log_dir = os.path.abspath(log_dir)
         self.log_file = os.path.join(self.log_dir, "watchdog.log")
+        self.event_file = os.path.join(self.log_dir, "events.jsonl")   # 構造化ログ（1行1JSON）
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.buffer = RingBufferHandler(buffer_size)
         self.setup_logger()
-        
+
     def setup_logger(self):
         """ログ設定を初期化"""
         os.makedirs(self.log_dir, exist_ok=True)
-        
+
         # ログフォーマットを設定
         formatter = logging.Formatter(
             '%(asctime)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
-        
-        # ファイルハンドラを設定
-        file_handler = logging.FileHandler(self.log_file, encoding='utf-8')
+
+        # ファイルハンドラを設定（サイズ・時間でローテーション）
+        file_handler = SizeAndTimeRotatingFileHandler(
+            self.log_file, self.max_bytes, self.rotate_seconds, self.backup_count
+        )
         file_handler.setFormatter(formatter)
         file_handler.setLevel(logging.INFO)
-        
+
+        # GUI表示用のリングバッファ
+        self.buffer.setFormatter(formatter)
+        self.buffer.setLevel(logging.INFO)
+
         # ロガーを設定
         self.logger = logging.getLogger('watchdog')
         self.logger.setLevel(logging.INFO)
-        
+        self.logger.propagate = False
+
         # 既存のハンドラをクリア
+        for handler in self.logger.handlers:
+            handler.close()
         self.logger.handlers.clear()
         self.logger.addHandler(file_handler)
-    
+        self.logger.addHandler(self.buffer)
+
+        # 構造化ログ（メッセージはJSONそのもの）
+        event_handler = SizeAndTimeRotatingFileHandler(
+            self.event_file, self.max_bytes, self.rotate_seconds, self.backup_count
+        )
+        event_handler.setFormatter(logging.Formatter('%(message)s'))
+        self.event_logger = logging.getLogger('watchdog.events')
+        self.event_logger.setLevel(logging.INFO)
+        self.event_logger.propagate = False
+        for handler in self.event_logger.handlers:
+            handler.close()
+        self.event_logger.handlers.clear()
+        self.event_logger.addHandler(event_handler)
+
     def log(self, message, level='INFO'):
         """ログメッセージを記録"""
         if level == 'INFO':
@@ -42,32 +157,57 @@ class Logger:
             self.logger.warning(message)
         elif level == 'DEBUG':
             self.logger.debug(message)
-    
+
     def info(self, message):
         """INFOレベルでログ記録"""
         self.log(message, 'INFO')
-    
+
     def error(self, message):
         """ERRORレベルでログ記録"""
         self.log(message, 'ERROR')
-    
+
     def warning(self, message):
         """WARNINGレベルでログ記録"""
         self.log(message, 'WARNING')
-    
+
     def debug(self, message):
         """DEBUGレベルでログ記録"""
         self.log(message, 'DEBUG')
-    
+
+    def event(self, name, level='INFO', **fields):
+        """構造化ログに1件記録（ステップの所要時間などを集計用にそのまま残す）"""
+        record = {'ts': datetime.now().isoformat(timespec='milliseconds'), 'level': level, 'event': name}
+        record.update(fields)
+        self.event_logger.log(
+            getattr(logging, level, logging.INFO), json.dumps(record, ensure_ascii=False, default=str)
+        )
+
+    def tail(self, since_seq=0, limit=None):
+        """このプロセスで記録した直近の行を (行リスト, 最新の連番) で返す（GUIの差分表示用）"""
+        return self.buffer.recent(since_seq, limit)
+
     def get_recent_logs(self, lines=50):
-        """最近のログを取得"""
-        if os.path.exists(self.log_file):
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                return ''.join(all_lines[-lines:])
-        return ""
-    
+        """最近のログを取得（メモリ上に足りなければファイル末尾から読む）"""
+        recent, _ = self.buffer.recent(limit=lines)
+        if len(recent) < lines:
+            # ローテーション直後はファイルの方が短いこともある
+            file_lines = tail_file(self.log_file, lines)
+            if len(file_lines) > len(recent):
+                recent = file_lines
+        return '\n'.join(recent) + '\n' if recent else ""
+
     def clear_logs(self):
         """ログファイルをクリア"""
+        self.buffer.clear()
+        for handler in self.logger.handlers:
+            if isinstance(handler, RotatingFileHandler):
+                handler.acquire()
+                try:
+                    if handler.stream:
+                        handler.stream.seek(0)
+                        handler.stream.truncate()
+                finally:
+                    handler.release()
+                return
         if os.path.exists(self.log_file):
-            open(self.log_file, 'w').close()
\ No newline at end of file
+            open(self.log_file, 'w').close()
@@ -1,30 +1,24 @@
+# --profile-imports 指定時は以降のimport時間を計測（他のimportより先に組み込む）
+import import_profiler
+if import_profiler.is_requested():
+    import_profiler.install("main.py import")
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext
 import threading
 import json
 import os
-from datetime import datetime
 from user_config import UserConfigWindow
 from file_monitor import MultiUserMonitor
 from config_manager import ConfigManager
 from logger import Logger
-
-# GPU状態チェック用
-try:
-    import torch
-    GPU_AVAILABLE = torch.cuda.is_available()
-    GPU_NAME = torch.cuda.get_device_name() if GPU_AVAILABLE else "N/A"
-    CUDA_VERSION = torch.version.cuda if GPU_AVAILABLE else "N/A"
-except ImportError:
-    GPU_AVAILABLE = False
-    GPU_NAME = "PyTorch未インストール"
-    CUDA_VERSION = "N/A"
+from utils import get_gpu_info
 
 class MainWindow:
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("ニコ生アーカイブ監視システム")
-        self.root.geometry("800x600")
+        self.root.geometry("800x800")
         
         self.config_manager = ConfigManager()
         self.logger = Logger()
@@ -36,20 +30,23 @@ class MainWindow:
         self.watchdog = MultiUserMonitor(self.logger, self.on_error)
         
         self.load_active_users()
+        
+        # パイプラインの進捗と出力を定期的に反映（UIスレッドはバッファを読むだけ）
+        self.root.after(1000, self.poll_pipeline_jobs)
 
     def setup_ui(self):
         # ヘッダー情報
         info_frame = tk.Frame(self.root)
         info_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        # GPU情報表示
-        gpu_status = "利用可能" if GPU_AVAILABLE else "利用不可"
-        gpu_color = "green" if GPU_AVAILABLE else "red"
-        
-        gpu_label = tk.Label(info_frame, 
-                            text=f"GPU状態: {gpu_status} ({GPU_NAME})", 
-                            fg=gpu_color, font=("", 9))
-        gpu_label.pack(side=tk.LEFT)
+        # GPU情報表示（キャッシュがなければtorchの読み込みを裏で行い、起動を待たせない）
+        self.gpu_info = get_gpu_info(probe=False)
+        self.gpu_label = tk.Label(info_frame, font=("", 9))
+        self.gpu_label.pack(side=tk.LEFT)
+        self.update_gpu_label()
+        if self.gpu_info is None:
+            threading.Thread(target=self.probe_gpu_info, daemon=True).start()
+            self.root.after(500, self.poll_gpu_info)
         
         # ユーザー設定管理ボタン
         btn_frame = tk.Frame(self.root)
@@ -95,6 +92,31 @@ class MainWindow:
         self.detail_text = tk.Text(detail_frame, height=8, state=tk.DISABLED)
         self.detail_text.pack(fill=tk.X, padx=5, pady=5)
         
+        # パイプライン実行状況
+        job_frame = tk.LabelFrame(self.root, text="パイプライン実行状況")
+        job_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.job_tree = ttk.Treeview(job_frame, columns=("lv", "state", "step", "progress", "eta"), height=4)
+        self.job_tree.heading("#0", text="アカウントID")
+        self.job_tree.heading("lv", text="放送")
+        self.job_tree.heading("state", text="状態")
+        self.job_tree.heading("step", text="ステップ")
+        self.job_tree.heading("progress", text="進捗")
+        self.job_tree.heading("eta", text="残り")
+        self.job_tree.column("#0", width=110)
+        self.job_tree.column("lv", width=110)
+        self.job_tree.column("state", width=70)
+        self.job_tree.column("step", width=230)
+        self.job_tree.column("progress", width=90)
+        self.job_tree.column("eta", width=70)
+        self.job_tree.pack(fill=tk.X, padx=5, pady=5)
+        
+        # 選択中ジョブの出力（差分のみ追記）
+        self.job_output = scrolledtext.ScrolledText(job_frame, height=8)
+        self.job_output.pack(fill=tk.X, padx=5, pady=5)
+        self.selected_job_id = None
+        self.job_output_seq = 0
+        
         # ログ
         log_frame = tk.LabelFrame(self.root, text="ログ")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
@@ -102,8 +124,16 @@ class MainWindow:
         self.log_text = scrolledtext.ScrolledText(log_frame, height=10)
         self.log_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # 前回までのログはファイル末尾だけ読み、以降はロガーのリングバッファから差分で追記
+        previous_logs = self.logger.get_recent_logs(self.LOG_VIEW_LINES)
+        if previous_logs:
+            self.log_text.insert(tk.END, previous_logs)
+            self.log_text.see(tk.END)
+        _, self.log_seq = self.logger.tail()
+        
         # イベントバインド
         self.user_tree.bind("<<TreeviewSelect>>", self.on_user_select)
+        self.job_tree.bind("<<TreeviewSelect>>", self.on_job_select)
         
     def open_user_config(self):
         UserConfigWindow(self.root, self.config_manager, self.refresh_users)
@@ -124,19 +154,114 @@ class MainWindow:
                                 values=(display_name, platform, status))
     
 
+    STATE_LABELS = {'queued': '待機中', 'starting': '起動中', 'running': '実行中', 'done': '完了', 'failed': '失敗'}
+    JOB_OUTPUT_LINES = 500
+    LOG_VIEW_LINES = 500
+    
+    def poll_pipeline_jobs(self):
+        """ジョブ一覧と選択中ジョブの出力、ログ表示を更新（1秒ごと）"""
+        try:
+            self.update_log_view()
+            views = self.watchdog.job_queue.job_views()
+            seen = set()
+            for view in views:
+                job_id = view['job_id']
+                if not job_id or job_id in seen:
+                    continue
+                seen.add(job_id)
+                progress = view.get('progress', {})
+                step = progress.get('step', '')
+                if progress.get('running'):
+                    step = ', '.join(name.split('_')[0] for name in progress['running'])
+                percent = f"{progress['done']}/{progress['total']} ({progress['percent']:.0f}%)" if progress else ""
+                eta = progress.get('eta_seconds')
+                eta_text = f"{eta / 60:.1f}分" if eta is not None and view['state'] == 'running' else ""
+                values = (view['lv_value'], self.STATE_LABELS.get(view['state'], view['state']), step, percent, eta_text)
+                if self.job_tree.exists(job_id):
+                    self.job_tree.item(job_id, values=values)
+                else:
+                    self.job_tree.insert("", tk.END, iid=job_id, text=view['user_name'], values=values)
+            for job_id in self.job_tree.get_children():
+                if job_id not in seen:
+                    self.job_tree.delete(job_id)
+            
+            self.update_job_output()
+        finally:
+            self.root.after(1000, self.poll_pipeline_jobs)
+    
+    def on_job_select(self, event):
+        selection = self.job_tree.selection()
+        self.selected_job_id = selection[0] if selection else None
+        self.job_output_seq = 0
+        self.job_output.delete(1.0, tk.END)
+        self.update_job_output()
+    
+    def update_job_output(self):
+        """選択中ジョブの新しい出力行だけを追記（表示は直近 JOB_OUTPUT_LINES 行まで）"""
+        if not self.selected_job_id:
+            return
+        handle = self.watchdog.job_queue.handle(self.selected_job_id)
+        if handle is None:
+            return
+        lines, self.job_output_seq = handle.tail(self.job_output_seq, limit=self.JOB_OUTPUT_LINES)
+        if not lines:
+            return
+        self.job_output.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(self.job_output.index('end-1c').split('.')[0])
+        if line_count > self.JOB_OUTPUT_LINES:
+            self.job_output.delete(1.0, f"{line_count - self.JOB_OUTPUT_LINES}.0")
+        self.job_output.see(tk.END)
+
+    def update_log_view(self):
+        """ロガーに新しく記録された行だけを追記（監視スレッドからのログもここで表示、直近 LOG_VIEW_LINES 行まで）"""
+        lines, self.log_seq = self.logger.tail(self.log_seq, limit=self.LOG_VIEW_LINES)
+        if not lines:
+            return
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(self.log_text.index('end-1c').split('.')[0])
+        if line_count > self.LOG_VIEW_LINES:
+            self.log_text.delete(1.0, f"{line_count - self.LOG_VIEW_LINES}.0")
+        self.log_text.see(tk.END)
+
+    def probe_gpu_info(self):
+        """GPU情報を取得（別スレッドで実行）"""
+        self.probed_gpu_info = get_gpu_info()
+    
+    def poll_gpu_info(self):
+        """GPU情報の取得完了を待って表示を更新（Tkのスレッドで実行）"""
+        info = getattr(self, 'probed_gpu_info', None)
+        if info is None:
+            self.root.after(500, self.poll_gpu_info)
+            return
+        self.gpu_info = info
+        self.update_gpu_label()
+    
+    def update_gpu_label(self):
+        if self.gpu_info is None:
+            self.gpu_label.config(text="GPU状態: 確認中...", fg="gray")
+            return
+        gpu_status = "利用可能" if self.gpu_info["available"] else "利用不可"
+        gpu_color = "green" if self.gpu_info["available"] else "red"
+        self.gpu_label.config(text=f"GPU状態: {gpu_status} ({self.gpu_info['name']})", fg=gpu_color)
+
     def show_system_info(self):
         """システム情報を表示"""
         import platform
         
+        gpu_info = self.gpu_info or {"available": "確認中", "name": "確認中", "cuda_version": "確認中"}
+        jobs = self.watchdog.job_queue.snapshot()
+        running_jobs = sum(1 for job in jobs if job['status'] == 'running')
+        queued_jobs = len(jobs) - running_jobs
         info = f"""システム情報:
         OS: {platform.system()} {platform.release()}
         Python: {platform.python_version()}
-        GPU利用可能: {GPU_AVAILABLE}
-        GPU名: {GPU_NAME}
-        CUDA Version: {CUDA_VERSION}
+        GPU利用可能: {gpu_info['available']}
+        GPU名: {gpu_info['name']}
+        CUDA Version: {gpu_info['cuda_version']}
 
         アクティブ監視数: {len(self.watchdog.active_watchers)}
         登録ユーザー数: {len(self.config_manager.get_user_list())}
+        パイプライン: 実行中 {running_jobs}件 / 待機中 {queued_jobs}件
         """
         
         # 新しいウィンドウで表示
@@ -271,12 +396,7 @@ class MainWindow:
         self.save_active_users()
     
     def log_message(self, message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"{timestamp} {message}\n"
-        
-        self.log_text.insert(tk.END, log_entry)
-        self.log_text.see(tk.END)
-        
+        """ログに記録（画面への表示は update_log_view がTkのスレッドで行う）"""
         self.logger.log(message)
     
     def save_active_users(self):
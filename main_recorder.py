@@ -10,6 +10,7 @@ from recorder_modules.recording_controller import RecordingController
 from recorder_modules.segment_manager import SegmentManager
 from recorder_modules.broadcast_monitor import BroadcastMonitor
 from recorder_modules.video_processor import VideoProcessor
+from recorder_modules.comment_tailer import CommentTailer
 
 # ログ設定
 logging.basicConfig(
@@ -125,10 +126,10 @@ def main():
         os.makedirs(output_dir, exist_ok=True)
         video_processor = VideoProcessor(tmp_dir, output_dir, "Downloads")
         segment_manager = SegmentManager(recording_controller, video_processor)
-        broadcast_monitor = BroadcastMonitor(broadcast_id)
-
         # 6. 録画開始（セグメント録画開始）
         recording_start_time = segment_manager.start_segment_recording(broadcast_id, broadcast_title)
+        # 開始時刻を渡し、番組の終了予定はポーラーが放送ページから取得する
+        broadcast_monitor = BroadcastMonitor(broadcast_id, begin_time=recording_start_time)
 
         # 7. 画面サイズ200x400変更
         time.sleep(0.3)
@@ -148,6 +149,7 @@ def main():
         print(f"セグメント間隔: 30分")
         
         # 10-13. バックグラウンド処理（録画開始後）
+        comment_tailer = None
         try:
             # グローバル設定読み込み
             global_cfg = load_global_config()
@@ -167,6 +169,19 @@ def main():
                 video_processor.output_dir = proper_output_dir
                 print(f"保存先: {proper_output_dir}")
                 DEBUGLOG.info(f"保存先: {proper_output_dir}")
+                
+                # NCVのコメントログを配信中から取り込む（終了後のコメント処理を短縮）
+                ncv_directory = basic.get('ncv_directory')
+                if ncv_directory:
+                    from utils import find_ncv_directory
+                    from pipeline_modules.storage import storage_settings
+                    comment_tailer = CommentTailer(
+                        find_ncv_directory(ncv_directory, broadcaster_id, broadcaster_name),
+                        os.path.join(proper_output_dir, broadcast_id),
+                        broadcast_id,
+                        storage=storage_settings(user_cfg)
+                    )
+                    comment_tailer.start()
             else:
                 DEBUGLOG.warning("ユーザー設定が無い/不正のため、カレント配下に rec/ を作成して保存します")
                 print(f"保存先: {output_dir}")
@@ -203,6 +218,8 @@ def main():
 
         # 15. 停止処理
         broadcast_monitor.stop_monitoring()
+        if comment_tailer:
+            comment_tailer.stop()
         segment_manager.stop_all_segments()
 
         # セグメント毎のファイル処理
@@ -1,22 +1,104 @@
 import sys
 import os
 
+# --profile-imports 指定時（またはmain.pyから引き継いだ場合）は以降のimport時間を計測
+import import_profiler
+if import_profiler.is_requested():
+    import_profiler.install("pipeline.py import")
+
 # 環境変数で出力バッファリングを無効化
 os.environ['PYTHONUNBUFFERED'] = '1'
 
-print(f"DEBUG: Pipeline実行Python: {sys.executable}")
-print(f"DEBUG: Python PATH: {sys.path[:3]}")
-try:
-    import moviepy
-    print("DEBUG: moviepy import成功")
-    from moviepy.editor import VideoFileClip
-    print("DEBUG: moviepy.editor import成功")
-except ImportError as e:
-    print(f"DEBUG: moviepy import失敗: {e}")
-
 import json
-import importlib
 from datetime import datetime
+from pipeline_modules.step_scheduler import StepScheduler
+from pipeline_modules.broadcast_document import BroadcastDocument
+from pipeline_modules.step_manifest import StepManifest
+from pipeline_modules.storage import storage_settings
+from pipeline_modules.pipeline_job import emit_progress
+from pipeline_modules.fs_index import release_directory_index
+
+# ステップ依存関係（値のステップがすべて終わると実行可能になる）
+STEP_DEPENDENCIES = {
+    'step01_data_collector': [],
+    'step02_audio_transcriber': ['step01_data_collector'],
+    'step03_emotion_scorer': ['step02_audio_transcriber'],
+    'step04_word_analyzer': ['step02_audio_transcriber'],
+    'step05_summarizer': ['step02_audio_transcriber'],
+    'step06_music_generator': ['step05_summarizer'],
+    'step07_image_generator': ['step05_summarizer'],
+    'step08_conversation_generator': ['step05_summarizer'],
+    'step09_screenshot_generator': ['step01_data_collector'],
+    'step10_comment_processor': ['step01_data_collector'],
+    'step11_special_user_html_generator': ['step10_comment_processor'],
+    'step12_html_generator': [
+        'step03_emotion_scorer', 'step04_word_analyzer', 'step05_summarizer',
+        'step06_music_generator', 'step07_image_generator', 'step08_conversation_generator',
+        'step09_screenshot_generator', 'step10_comment_processor', 'step11_special_user_html_generator'
+    ],
+    'step13_index_generator': ['step12_html_generator']
+}
+
+# メモリ・CPU負荷の高いステップはステップごとに別プロセスで実行（それ以外はスレッド）
+# pipeline_settings.step_executors で個別に 'process' / 'inprocess' を上書き、
+# pipeline_settings.step_limits で {"max_rss_mb": ..., "max_cpu_seconds": ...} を指定（0は無制限）
+PROCESS_STEPS = [
+    'step02_audio_transcriber',
+    'step03_emotion_scorer',
+    'step04_word_analyzer'
+]
+
+# ステップの入力（再実行判定用）
+#   config  … 結果に影響する設定キー（ドット区切り）
+#   media   … 入力ファイル（mp4: サイズと更新時刻、xml: NCVのXML内容）
+#   outputs … 出力ファイル（放送ディレクトリからの相対パス、なければ再実行）
+#   code    … processors/{step}.py 以外で結果に影響するモジュール・テンプレート（リポジトリからの相対パス）
+STEP_INPUTS = {
+    'step01_data_collector': {
+        'config': ['display_name'], 'media': ['mp4', 'xml'], 'outputs': ['{lv}_data.json'],
+        'code': ['pipeline_modules/media_probe.py', 'pipeline_modules/broadcast_history.py']
+    },
+    'step02_audio_transcriber': {
+        'config': ['audio_settings'], 'media': ['mp4'], 'outputs': ['{lv}_transcript.json'],
+        'code': ['pipeline_modules/media_probe.py']
+    },
+    'step03_emotion_scorer': {'outputs': ['{lv}_transcript.json']},
+    'step04_word_analyzer': {},
+    'step05_summarizer': {
+        'config': ['api_settings.summary_ai_model', 'api_settings.openai_api_key', 'api_settings.google_api_key',
+                   'ai_prompts.summary_prompt'],
+        'outputs': ['{lv}_summary.txt']
+    },
+    'step06_music_generator': {'config': ['api_settings.suno_api_key', 'music_settings']},
+    'step07_image_generator': {
+        'config': ['api_settings.openai_api_key', 'api_settings.imgur_api_key', 'ai_prompts.image_prompt'],
+        'code': ['pipeline_modules/media_store.py']
+    },
+    'step08_conversation_generator': {
+        'config': ['api_settings.conversation_ai_model', 'api_settings.ai_model', 'api_settings.openai_api_key',
+                   'api_settings.google_api_key', 'ai_prompts']
+    },
+    'step09_screenshot_generator': {'media': ['mp4'], 'code': ['pipeline_modules/media_probe.py']},
+    'step10_comment_processor': {
+        'media': ['xml'], 'outputs': ['{lv}_comments.json', '{lv}_comment_ranking.json'],
+        'code': ['pipeline_modules/live_comments.py']
+    },
+    'step11_special_user_html_generator': {
+        'config': ['special_users', 'special_users_config'],
+        'code': ['pipeline_modules/special_user_analysis.py', 'pipeline_modules/special_user_history.py',
+                 'pipeline_modules/static_assets.py', 'templates']
+    },
+    'step12_html_generator': {
+        'config': ['display_features', 'ai_prompts', 'tags', 'highlight_settings'],
+        'code': ['pipeline_modules/highlights.py', 'pipeline_modules/static_assets.py', 'templates']
+    }
+}
+
+# 他の放送の結果も集約するため毎回実行するステップ
+ALWAYS_RUN_STEPS = ['step13_index_generator']
+
+# 失敗すると後続が入力（統合JSON）を得られないステップ（後続は実行せずスキップ扱い、次回の再開時に再実行）
+CRITICAL_STEPS = ['step01_data_collector']
 
 def load_user_config(account_id):
     """ユーザー設定を読み込む"""
@@ -51,7 +133,8 @@ def should_run_step(config, step_name):
     
     return step_mapping.get(step_name, True)
 
-def run_pipeline(platform, account_id, platform_directory, ncv_directory, lv_value, config_account_id):
+def run_pipeline(platform, account_id, platform_directory, ncv_directory, lv_value, config_account_id,
+                 force_all=False, force_steps=()):
     """パイプライン処理を実行"""
     try:
         # ユーザー設定を読み込み
@@ -73,53 +156,49 @@ def run_pipeline(platform, account_id, platform_directory, ncv_directory, lv_val
             'start_time': datetime.now(),
             'results': {}
         }
+        # 放送ごとのJSON群はステップ間でメモリ上に共有し、変更分だけ書き出す
+        pipeline_data['broadcast_doc'] = BroadcastDocument(
+            platform_directory, account_id, lv_value, storage=storage_settings(config)
+        )
+        
+        # 依存関係グラフに従って実行（独立したステップは並列実行）
+        pipeline_settings = config.get('pipeline_settings', {})
+        scheduler = StepScheduler(
+            STEP_DEPENDENCIES,
+            process_steps=PROCESS_STEPS,
+            max_workers=pipeline_settings.get('max_parallel_steps', 4),
+            max_process_workers=pipeline_settings.get('max_process_workers', 2),
+            log_prefix=f"[{config_account_id}] ",
+            step_executors=pipeline_settings.get('step_executors', {}),
+            step_limits=pipeline_settings.get('step_limits', {}),
+            on_progress=emit_progress,
+            critical_steps=CRITICAL_STEPS
+        )
         
-        # 各ステップを順次実行
-# 各ステップを順次実行
-        steps = [
-            'step01_data_collector',
-            'step02_audio_transcriber',
-            'step03_emotion_scorer',
-            'step04_word_analyzer',
-            'step05_summarizer',
-            'step06_music_generator',
-            'step07_image_generator',
-            'step08_conversation_generator',
-            'step09_screenshot_generator',
-            'step10_comment_processor',
-            'step11_special_user_html_generator',
-            'step12_html_generator',
-            'step13_index_generator'
-        ]
+        # 前回の実行記録と入力が同じステップは省略（--force で全再実行）
+        checkpoint = None
+        if pipeline_settings.get('resume', True) or force_steps:
+            checkpoint = StepManifest(
+                pipeline_data['broadcast_doc'], STEP_DEPENDENCIES, STEP_INPUTS, config,
+                always_run=ALWAYS_RUN_STEPS, force_steps=force_steps, force_all=force_all
+            )
         
-        for step_name in steps:
-            if should_run_step(config, step_name):
-                print(f"[{config_account_id}] 実行中: {step_name}")
-                
-                try:
-                    # ステップモジュールを動的読み込み
-                    module = importlib.import_module(f"processors.{step_name}")
-                    
-                    # process関数を実行
-                    if hasattr(module, 'process'):
-                        result = module.process(pipeline_data)
-                        pipeline_data['results'][step_name] = result
-                        print(f"[{config_account_id}] 完了: {step_name}")
-                    else:
-                        print(f"[{config_account_id}] スキップ: {step_name} (process関数なし)")
-                        
-                except ImportError as e:
-                    print(f"[{config_account_id}] スキップ: {step_name} (モジュールなし)")
-                    print(f"[{config_account_id}] ImportError詳細: {e}")
-                except Exception as e:
-                    print(f"[{config_account_id}] エラー: {step_name} - {str(e)}")
-                    print(f"[{config_account_id}] Exception詳細: {type(e).__name__}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    # エラーが発生してもパイプラインは継続
-                    
-            else:
-                print(f"[{config_account_id}] スキップ: {step_name} (設定により無効)")
+        timings = scheduler.run(pipeline_data, lambda step_name: should_run_step(config, step_name), checkpoint)
+        pipeline_data['step_timings'] = timings
+        
+        # 失敗したステップが残した変更もまとめて保存
+        pipeline_data['broadcast_doc'].flush()
+        # 放送ディレクトリのインデックスはこの放送の処理が終われば不要
+        release_directory_index(pipeline_data['broadcast_doc'].broadcast_dir)
+        
+        # ステップごとの所要時間
+        total_seconds = (datetime.now() - pipeline_data['start_time']).total_seconds()
+        print(f"[{config_account_id}] ステップ所要時間:")
+        for step_name in STEP_DEPENDENCIES:
+            timing = timings.get(step_name)
+            if timing:
+                print(f"[{config_account_id}]   {step_name}: {timing['seconds']:.1f}秒 ({timing['status']})")
+        print(f"[{config_account_id}]   合計: {total_seconds:.1f}秒")
         
         print(f"[{config_account_id}] パイプライン完了: {lv_value}")
         return 0
@@ -129,16 +208,23 @@ def run_pipeline(platform, account_id, platform_directory, ncv_directory, lv_val
         return 1
 
 def main():
-    if len(sys.argv) != 6:
+    # 位置引数5つ + オプション（--force: 全ステップ再実行、--force-steps=step12_html_generator,...: 指定ステップのみ再実行、
+    # --profile-imports: import時間レポート）
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    options = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    if len(args) != 5:
         return 1
     
-    platform = sys.argv[1]
-    account_id = sys.argv[2]
-    platform_directory = sys.argv[3]
-    ncv_directory = sys.argv[4]
-    lv_value = sys.argv[5]
+    platform, account_id, platform_directory, ncv_directory, lv_value = args
+    
+    force_all = '--force' in options
+    force_steps = []
+    for option in options:
+        if option.startswith('--force-steps='):
+            force_steps.extend(name.strip() for name in option.split('=', 1)[1].split(',') if name.strip())
     
-    return run_pipeline(platform, account_id, platform_directory, ncv_directory, lv_value, account_id)
+    return run_pipeline(platform, account_id, platform_directory, ncv_directory, lv_value, account_id,
+                        force_all=force_all, force_steps=force_steps)
 
 if __name__ == "__main__":
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,194 @@
+import os
+import gzip
+import json
+import hashlib
+import threading
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+CHECKSUM_MANIFEST = '.checksums.json'   # ディレクトリごとの成果物チェックサム
+
+# 圧縮形式 → 拡張子（読み込み時は先頭バイトで判定）
+COMPRESSION_SUFFIXES = {'zstd': '.zst', 'gzip': '.gz'}
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+_manifest_lock = threading.Lock()
+
+
+def _fsync_directory(directory):
+    """rename をディスクに確定させる（POSIXのみ、Windowsではディレクトリを開けない）"""
+    if os.name != 'posix':
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data, compress=None, checksum=False, fsync=True):
+    """一時ファイル→fsync→renameで書き込み、(パス, sha256, バイト数) を返す
+
+    data は bytes か str（UTF-8で書く）。compress='gzip' / 'zstd' なら圧縮した内容を path にそのまま書く。
+    checksum=True なら同じディレクトリの .checksums.json に記録する。
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    data = compress_bytes(data, compress)
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        _fsync_directory(directory)
+
+    digest = hashlib.sha256(data).hexdigest()
+    if checksum:
+        record_checksum(path, digest, len(data))
+    return path, digest, len(data)
+
+
+def atomic_write_json(path, obj, indent=2, compress=None, checksum=False, fsync=True):
+    """JSONをアトミックに書き込む"""
+    text = json.dumps(obj, ensure_ascii=False, indent=indent)
+    return atomic_write(path, text, compress=compress, checksum=checksum, fsync=fsync)
+
+
+def compress_bytes(data, compress):
+    if not compress:
+        return data
+    if compress == 'gzip':
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compress == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstandardがインストールされていないためzstd圧縮できません")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    raise ValueError(f"未対応の圧縮形式: {compress}")
+
+
+def decompress_bytes(data):
+    """先頭バイトで圧縮形式を判定して展開（非圧縮ならそのまま）"""
+    if data[:2] == GZIP_MAGIC:
+        return gzip.decompress(data)
+    if data[:4] == ZSTD_MAGIC:
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstandardがインストールされていないためzstd圧縮ファイルを読めません")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return data
+
+
+def existing_variant(path):
+    """path そのもの・圧縮版（.zst / .gz）のうち存在するもの（複数あれば新しいもの）、なければ None"""
+    candidates = [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+    found = []
+    for candidate in candidates:
+        try:
+            found.append((os.stat(candidate).st_mtime_ns, candidate))
+        except OSError:
+            continue
+    if not found:
+        return None
+    return max(found)[1]
+
+
+def read_json(path):
+    """圧縮版も含めてJSONを読み込む（なければ FileNotFoundError）"""
+    actual_path = existing_variant(path)
+    if actual_path is None:
+        raise FileNotFoundError(path)
+    with open(actual_path, 'rb') as f:
+        return json.loads(decompress_bytes(f.read()).decode('utf-8'))
+
+
+# ---- チェックサム ----
+
+def _manifest_path(path):
+    return os.path.join(os.path.dirname(path) or '.', CHECKSUM_MANIFEST)
+
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def record_checksum(path, digest, size):
+    """成果物のsha256・サイズ・更新時刻をディレクトリのマニフェストに記録（複数プロセスからの更新はロックで直列化）"""
+    from utils import file_lock
+
+    manifest_path = _manifest_path(path)
+    stat = os.stat(path)
+    with _manifest_lock, file_lock(manifest_path):
+        manifest = _load_manifest(manifest_path)
+        manifest[os.path.basename(path)] = {'sha256': digest, 'size': size, 'mtime_ns': stat.st_mtime_ns}
+        atomic_write_json(manifest_path, manifest, indent=None)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_artifact(path, full=False):
+    """記録済みのチェックサムと照合（True: 一致 / False: 欠け・不一致 / None: 記録なし）
+
+    サイズと更新時刻が記録どおりなら中身は読まない（full=True なら常にハッシュを計算）。
+    """
+    entry = _load_manifest(_manifest_path(path)).get(os.path.basename(path))
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if stat.st_size != entry['size']:
+        return False
+    if not full and stat.st_mtime_ns == entry['mtime_ns']:
+        return True
+    return file_sha256(path) == entry['sha256']
+
+
+def load_json_safe(path, default=None):
+    """JSONを読み込む（ファイルがない・壊れている場合は default を返して処理を続ける）"""
+    actual_path = existing_variant(path)
+    if actual_path is None:
+        return default
+    if verify_artifact(actual_path) is False:
+        print(f"チェックサム不一致（書き込み途中で中断された可能性）: {actual_path}")
+    try:
+        with open(actual_path, 'rb') as f:
+            return json.loads(decompress_bytes(f.read()).decode('utf-8'))
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError, EOFError) as e:
+        print(f"JSON読み込みエラー（スキップ）: {path} ({str(e)})")
+        return default
@@ -0,0 +1,206 @@
+import os
+import pickle
+import threading
+
+from utils import find_account_directory, merge_broadcast_json
+from pipeline_modules.atomic_io import existing_variant, read_json
+from pipeline_modules.storage import storage_settings, write_json
+
+# セクション名 → ファイル名の接尾辞（{lv}{suffix}）
+SECTION_FILES = {
+    'data': '_data.json',
+    'transcript': '_transcript.json',
+    'comments': '_comments.json',
+    'comment_ranking': '_comment_ranking.json'
+}
+
+
+class _NotLoaded:
+    """未読み込みを表す番兵（プロセス間で受け渡しても同一オブジェクトに戻る）"""
+
+    def __reduce__(self):
+        return '_NOT_LOADED'
+
+
+_NOT_LOADED = _NotLoaded()
+_create_lock = threading.Lock()
+
+
+class BroadcastDocument:
+    """1放送分のJSON（統合データ・文字起こし・コメント）をメモリ上で共有し、変更分だけ書き出す"""
+
+    def __init__(self, platform_directory, account_id, lv_value, broadcast_dir=None, storage=None):
+        self.platform_directory = platform_directory
+        self.account_id = account_id
+        self.lv_value = lv_value
+        self._broadcast_dir = broadcast_dir
+        self.storage = storage or storage_settings(None)   # data 以外のセクションの保存形式
+
+        self._lock = threading.RLock()
+        self._sections = {name: _NOT_LOADED for name in SECTION_FILES}
+        self._dirty_keys = set()        # data セクションはキー単位で追跡（他プロセスの書き込みを潰さない）
+        self._dirty_sections = set()    # その他のセクションは丸ごと書き出し
+        self._touched_keys = set()
+        self._touched_sections = set()
+
+    # ---- プロセス間受け渡し ----
+
+    def __getstate__(self):
+        # 他のスレッドのステップが更新中でも崩れないよう、ロックを持ったまま丸ごとシリアライズする
+        with self._lock:
+            state = self.__dict__.copy()
+            del state['_lock']
+            return {'snapshot': pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)}
+
+    def __setstate__(self, state):
+        self.__dict__.update(pickle.loads(state['snapshot']))
+        self._lock = threading.RLock()
+        # 子プロセスでは受け取った後の変更だけを親に返す
+        self._touched_keys = set()
+        self._touched_sections = set()
+
+    # ---- 読み込み ----
+
+    @property
+    def broadcast_dir(self):
+        if self._broadcast_dir is None:
+            account_dir = find_account_directory(self.platform_directory, self.account_id)
+            self._broadcast_dir = os.path.join(account_dir, self.lv_value)
+        return self._broadcast_dir
+
+    def path(self, section):
+        """セクションのファイルパス（圧縮保存時は実際のファイルは .zst / .gz 付き）"""
+        return os.path.join(self.broadcast_dir, f"{self.lv_value}{SECTION_FILES[section]}")
+
+    def stored_path(self, section):
+        """実際に保存されているファイルのパス（なければ None）"""
+        return existing_variant(self.path(section))
+
+    def exists(self, section):
+        with self._lock:
+            if self._sections[section] is not _NOT_LOADED:
+                return True
+        return self.stored_path(section) is not None
+
+    def load(self, section, required=True):
+        """セクションを取得（初回のみファイルから読み込み、以降はメモリ上のオブジェクトを返す）"""
+        with self._lock:
+            value = self._sections[section]
+            if value is not _NOT_LOADED:
+                return value
+
+            path = self.path(section)
+            if self.stored_path(section) is None:
+                if required:
+                    raise Exception(f"{os.path.basename(path)}が見つかりません: {path}")
+                return None
+
+            value = read_json(path)
+            self._sections[section] = value
+            return value
+
+    @property
+    def data(self):
+        """統合JSON（{lv}_data.json）"""
+        return self.load('data')
+
+    def get(self, key, default=None):
+        """統合JSONの値を取得"""
+        return self.data.get(key, default)
+
+    # ---- 更新 ----
+
+    def update_data(self, updates):
+        """統合JSONのキーを更新（flushで該当キーのみマージ保存）"""
+        with self._lock:
+            data = self._sections['data']
+            if data is _NOT_LOADED:
+                data = self.load('data', required=False)
+                if data is None:
+                    data = {}
+                    self._sections['data'] = data
+            data.update(updates)
+            self._dirty_keys.update(updates.keys())
+            self._touched_keys.update(updates.keys())
+
+    def set_section(self, section, value):
+        """セクションを丸ごと置き換え"""
+        if section == 'data':
+            raise ValueError("統合JSONは update_data で更新してください")
+        with self._lock:
+            self._sections[section] = value
+            self.mark_dirty(section)
+
+    def mark_dirty(self, section):
+        """load で得たオブジェクトを直接書き換えた場合に呼ぶ"""
+        with self._lock:
+            self._dirty_sections.add(section)
+            self._touched_sections.add(section)
+
+    def adopt(self, section, value):
+        """保存済みの内容をメモリに取り込む（書き出し不要）"""
+        with self._lock:
+            self._sections[section] = value
+
+    # ---- 書き出し ----
+
+    def is_dirty(self):
+        with self._lock:
+            return bool(self._dirty_keys or self._dirty_sections)
+
+    def flush(self):
+        """変更のあったセクションをアトミックに書き出し、書き出したファイル一覧を返す"""
+        with self._lock:
+            if not self._dirty_keys and not self._dirty_sections:
+                return []
+
+            written = []
+            os.makedirs(self.broadcast_dir, exist_ok=True)
+
+            if self._dirty_keys:
+                data = self._sections['data']
+                updates = {key: data[key] for key in self._dirty_keys if key in data}
+                if merge_broadcast_json(self.broadcast_dir, self.lv_value, updates):
+                    written.append(self.path('data'))
+                    self._dirty_keys.clear()
+
+            for section in list(self._dirty_sections):
+                written.append(write_json(self.path(section), self._sections[section], self.storage, checksum=True))
+                self._dirty_sections.discard(section)
+
+            return written
+
+    def export_changes(self):
+        """このプロセスで行った変更を取り出す（子プロセス→親プロセスへの受け渡し用）"""
+        with self._lock:
+            data = self._sections['data']
+            return {
+                'data': {key: data[key] for key in self._touched_keys if data is not _NOT_LOADED and key in data},
+                'sections': {name: self._sections[name] for name in self._touched_sections}
+            }
+
+    def apply_changes(self, changes):
+        """子プロセスで保存済みの変更をメモリに反映（書き出しは不要）"""
+        if not changes:
+            return
+        with self._lock:
+            data = self._sections['data']
+            if changes['data'] and data is not _NOT_LOADED:
+                data.update(changes['data'])
+            for name, value in changes['sections'].items():
+                self._sections[name] = value
+
+
+def get_broadcast_document(pipeline_data):
+    """pipeline_data に共有の放送ドキュメントを取得（なければ作成）"""
+    doc = pipeline_data.get('broadcast_doc')
+    if doc is None:
+        with _create_lock:
+            doc = pipeline_data.get('broadcast_doc')
+            if doc is None:
+                doc = BroadcastDocument(
+                    pipeline_data['platform_directory'], pipeline_data['account_id'], pipeline_data['lv_value'],
+                    storage=storage_settings(pipeline_data.get('config'))
+                )
+                pipeline_data['broadcast_doc'] = doc
+    return doc
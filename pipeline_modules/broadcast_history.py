@@ -0,0 +1,146 @@
+import os
+import json
+import bisect
+import threading
+from datetime import datetime
+
+from utils import save_json_atomic, file_lock
+from pipeline_modules.fs_index import get_account_index
+
+HISTORY_FILENAME = "broadcast_history.json"
+
+_lock = threading.Lock()
+
+
+def _to_int(value):
+    """start_time等の数値文字列をintに変換（不正値は0）"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class BroadcastHistory:
+    """アカウント単位の放送年表（start_time順）と要約の索引"""
+
+    def __init__(self, account_dir):
+        self.account_dir = account_dir
+        self.path = os.path.join(account_dir, HISTORY_FILENAME)
+        self.entries = []
+        self.load()
+
+    def load(self):
+        """年表を読み込み（未作成なら既存の放送ディレクトリから一度だけ構築）"""
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('broadcasts', [])
+                return
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"放送年表の読み込みに失敗、再構築します: {str(e)}")
+        self.rebuild()
+
+    def rebuild(self):
+        """既存の統合JSONから年表を再構築"""
+        account_index = get_account_index(self.account_dir)
+        entries = []
+        for lv_value in account_index.broadcast_ids():
+            data = self._load_broadcast_data(lv_value)
+            if data is None:
+                continue
+            entries.append(self._make_entry(lv_value, data))
+
+        entries.sort(key=lambda e: e['start_time'])
+        self.entries = entries
+        self.save()
+        print(f"放送年表を構築: {len(entries)}件")
+
+    def save(self):
+        """年表を保存"""
+        save_json_atomic(self.path, {
+            'updated_at': datetime.now().isoformat(),
+            'broadcasts': self.entries
+        })
+
+    def _load_broadcast_data(self, lv_value):
+        """放送の統合JSONを読み込み（なければ None）"""
+        data_file = get_account_index(self.account_dir).data_json(lv_value)
+        if not data_file:
+            return None
+        try:
+            with open(data_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _make_entry(self, lv_value, data):
+        return {
+            'lv_value': lv_value,
+            'start_time': _to_int(data.get('start_time')),
+            'live_title': data.get('live_title', ''),
+            'summary_text': data.get('summary_text', '')
+        }
+
+    def record(self, lv_value, **fields):
+        """放送情報を登録・更新（start_time順を維持）"""
+        # 同じアカウントの別放送のパイプライン（別プロセス）とも読み直し〜保存を排他する
+        with _lock, file_lock(self.path):
+            # 他プロセスの更新を取りこぼさないよう最新を読み直してから更新
+            self.load()
+            entry = next((e for e in self.entries if e['lv_value'] == lv_value), None)
+            if entry is None:
+                base = fields
+                if not _to_int(fields.get('start_time')):
+                    # 要約だけ先に届いた場合は統合JSONから開始時刻を補う（0のまま入れると年表の先頭に並んでしまう）
+                    base = dict(self._load_broadcast_data(lv_value) or {})
+                    base.update(fields)
+                    if not _to_int(base.get('start_time')):
+                        print(f"放送年表: 開始時刻が不明なため登録を保留します: {lv_value}")
+                        return
+                entry = self._make_entry(lv_value, base)
+                self.entries.append(entry)
+            for key, value in fields.items():
+                if key == 'start_time':
+                    value = _to_int(value)
+                    if not value:
+                        # 不明な開始時刻で既存の値を潰さない
+                        continue
+                entry[key] = value
+            self.entries.sort(key=lambda e: e['start_time'])
+            self.save()
+
+    def _index_before(self, lv_value, start_time=None):
+        """指定放送より前の放送が並ぶ位置（この位置の直前までが過去の放送）"""
+        if start_time is None:
+            entry = next((e for e in self.entries if e['lv_value'] == lv_value), None)
+            start_time = entry['start_time'] if entry else None
+        if not start_time:
+            # 開始時刻が不明な場合は年表の末尾を基準にする
+            return len(self.entries)
+        keys = [e['start_time'] for e in self.entries]
+        return bisect.bisect_left(keys, _to_int(start_time))
+
+    def previous(self, lv_value, start_time=None, with_summary=True):
+        """直前の放送（with_summary=Trueなら要約のある直近の放送）を取得"""
+        for entry in reversed(self.entries[:self._index_before(lv_value, start_time)]):
+            if entry['lv_value'] == lv_value:
+                continue
+            if not with_summary or entry.get('summary_text'):
+                return entry
+        return None
+
+    def recent_summaries(self, count, lv_value=None, start_time=None):
+        """指定放送より前の直近count件の要約（新しい順）"""
+        end = self._index_before(lv_value, start_time) if lv_value else len(self.entries)
+        results = []
+        for entry in reversed(self.entries[:end]):
+            if entry['lv_value'] != lv_value and entry.get('summary_text'):
+                results.append(entry)
+                if len(results) >= count:
+                    break
+        return results
+
+
+def get_broadcast_history(account_dir):
+    """アカウントの放送年表を取得"""
+    return BroadcastHistory(account_dir)
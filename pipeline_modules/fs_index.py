@@ -0,0 +1,308 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+
+class _IndexEventHandler(FileSystemEventHandler):
+    def __init__(self, index):
+        self.index = index
+
+    def on_any_event(self, event):
+        self.index.apply_event(event)
+
+
+class DirectoryIndex:
+    """1ディレクトリ分のファイル名インデックス（watchdogで差分更新）"""
+
+    def __init__(self, directory, watch=True, poll_interval=1.0, live_rescan_interval=10.0):
+        self.directory = os.path.abspath(directory)
+        self.watch = watch
+        self.poll_interval = poll_interval
+        self.live_rescan_interval = live_rescan_interval   # 監視中でもイベント取りこぼしに備えて読み直す間隔
+        self.entries = {}  # name -> is_dir
+        self.version = 0
+        self.condition = threading.Condition()
+        self.observer = None
+        self.loaded = False
+        self.scanned_at = 0.0
+        self.dir_mtime_ns = None   # スキャン時のディレクトリ更新時刻（監視しない場合の変化検知用）
+
+    def start(self):
+        """初回スキャンとwatchdog監視を開始"""
+        self.rescan()
+        if self.watch and WATCHDOG_AVAILABLE and self.observer is None and os.path.isdir(self.directory):
+            try:
+                self.observer = Observer()
+                self.observer.schedule(_IndexEventHandler(self), self.directory, recursive=False)
+                self.observer.daemon = True
+                self.observer.start()
+            except Exception as e:
+                print(f"ディレクトリ監視開始エラー（ポーリングで継続）: {self.directory} - {str(e)}")
+                self.observer = None
+        return self
+
+    def stop(self):
+        """watchdog監視を停止"""
+        if self.observer:
+            self.observer.stop()
+            self.observer.join(timeout=5)
+            self.observer = None
+
+    def _directory_mtime_ns(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def rescan(self):
+        """ディレクトリを読み直してインデックスを再構築"""
+        entries = {}
+        # 読み込み前に取得（読み込み中の追加は次回の比較で検知される）
+        dir_mtime_ns = self._directory_mtime_ns()
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        entries[entry.name] = entry.is_dir()
+                    except OSError:
+                        continue
+        with self.condition:
+            self.entries = entries
+            self.loaded = True
+            self.scanned_at = time.monotonic()
+            self.dir_mtime_ns = dir_mtime_ns
+            self.version += 1
+            self.condition.notify_all()
+
+    def is_live(self):
+        """watchdogでリアルタイム更新されているか"""
+        return self.observer is not None
+
+    def names(self, predicate=None, kind='file'):
+        """インデックス上の名前一覧（ソート済み、kind: 'file' / 'dir' / 'any'）"""
+        if not self.loaded:
+            self.rescan()
+        elif not self.is_live() and self._directory_mtime_ns() != self.dir_mtime_ns:
+            # 監視していないインデックスはファイルの追加・削除（ディレクトリの更新時刻の変化）で読み直す
+            self.rescan()
+        with self.condition:
+            items = list(self.entries.items())
+        return sorted(name for name, is_dir in items
+                      if (kind == 'any' or is_dir == (kind == 'dir')) and (predicate is None or predicate(name)))
+
+    def find(self, predicate, kind='file', refresh_on_miss=True):
+        """条件に合う最初の名前をフルパスで返す（見つからなければNone）"""
+        matches = self.names(predicate, kind)
+        if matches and not self.is_live() and not os.path.exists(os.path.join(self.directory, matches[0])):
+            # スナップショットが古い（削除済み）
+            matches = []
+        if not matches and refresh_on_miss and time.monotonic() - self.scanned_at > 0.5:
+            # 作成直後でイベント未到着の場合もあるため、見つからない時だけ読み直す
+            self.rescan()
+            matches = self.names(predicate, kind)
+        return os.path.join(self.directory, matches[0]) if matches else None
+
+    def wait_for(self, predicate, timeout, kind='file'):
+        """条件に合うファイルが現れるまで待機（タイムアウト時はNone）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            version = self.version
+            found = self.find(predicate, kind, refresh_on_miss=False)
+            if found:
+                return found
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # イベントを取りこぼしていても見つけられるよう、諦める前に一度読み直す
+                self.rescan()
+                return self.find(predicate, kind, refresh_on_miss=False)
+            self.wait_for_change(version, remaining)
+
+    def wait_for_change(self, since_version, timeout):
+        """インデックスに変化があるまで待機（変化があればTrue）"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.version == since_version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(min(remaining, self.poll_interval))
+                if self.version != since_version:
+                    break
+                if not self.is_live():
+                    # watchdogが使えない場合は間隔をあけて読み直す
+                    self.rescan()
+                elif (self._directory_mtime_ns() != self.dir_mtime_ns
+                      or time.monotonic() - self.scanned_at >= self.live_rescan_interval):
+                    # 監視中でもイベントは取りこぼし得る（ネットワークドライブ、バッファ溢れ、監視開始前の作成）。
+                    # ディレクトリの更新時刻が変わった時と一定間隔ごとに読み直す
+                    self.rescan()
+            return True
+
+    def apply_event(self, event):
+        """watchdogのイベントをインデックスに反映"""
+        if event.event_type == 'created':
+            self._on_added(event.src_path, event.is_directory)
+        elif event.event_type == 'deleted':
+            self._on_removed(event.src_path)
+        elif event.event_type == 'moved':
+            self._on_removed(event.src_path)
+            self._on_added(event.dest_path, event.is_directory)
+        elif event.event_type == 'modified' and not event.is_directory:
+            self._on_touched(event.src_path)
+
+    def _on_added(self, path, is_dir):
+        if os.path.abspath(os.path.dirname(path)) != self.directory:
+            return
+        with self.condition:
+            self.entries[os.path.basename(path)] = is_dir
+            self.version += 1
+            self.condition.notify_all()
+
+    def _on_removed(self, path):
+        if os.path.abspath(os.path.dirname(path)) != self.directory:
+            return
+        with self.condition:
+            self.entries.pop(os.path.basename(path), None)
+            self.version += 1
+            self.condition.notify_all()
+
+    def _on_touched(self, path):
+        if os.path.abspath(os.path.dirname(path)) != self.directory:
+            return
+        with self.condition:
+            self.entries.setdefault(os.path.basename(path), False)
+            self.version += 1
+            self.condition.notify_all()
+
+
+MAX_UNWATCHED_INDEXES = 256   # 監視しない（放送ごとの）インデックスの保持上限
+MAX_ACCOUNT_INDEXES = 64
+
+_indexes = OrderedDict()   # 最近使った順（監視しないものは上限を超えたら古い順に破棄）
+_indexes_lock = threading.Lock()
+
+
+def _evict_unwatched():
+    """監視しないインデックスを上限まで古い順に破棄（監視中のものは待機中の呼び出し元があるため残す）"""
+    unwatched = [key for key, index in _indexes.items() if not index.is_live()]
+    for key in unwatched[:max(0, len(unwatched) - MAX_UNWATCHED_INDEXES)]:
+        del _indexes[key]
+
+
+def get_directory_index(directory, watch=True):
+    """プロセス内で共有するディレクトリインデックスを取得"""
+    directory = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = DirectoryIndex(directory, watch=watch).start()
+            _indexes[directory] = index
+            _evict_unwatched()
+        else:
+            _indexes.move_to_end(directory)
+        return index
+
+
+def release_directory_index(directory):
+    """インデックスを破棄して監視を止める（放送の処理が終わった時など）"""
+    with _indexes_lock:
+        index = _indexes.pop(os.path.abspath(directory), None)
+    if index:
+        index.stop()
+
+
+def stop_all_indexes():
+    """全インデックスの監視を停止"""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+        _indexes.clear()
+    for index in indexes:
+        index.stop()
+
+
+def find_child_directory(parent, prefix):
+    """親ディレクトリ直下で prefix から始まるディレクトリを検索"""
+    if not parent or not os.path.isdir(parent):
+        return None
+    return get_directory_index(parent).find(lambda name: name.startswith(prefix), kind='dir')
+
+
+class AccountIndex:
+    """アカウント単位の成果物インデックス（(account_id, lv) → MP4/XML/JSON/HTML）"""
+
+    def __init__(self, account_dir, ncv_dir=None):
+        self.account_dir = os.path.abspath(account_dir)
+        self.ncv_dir = os.path.abspath(ncv_dir) if ncv_dir else None
+
+    def _account(self):
+        return get_directory_index(self.account_dir)
+
+    def _broadcast(self, lv_value):
+        # 放送ディレクトリは数が多いので監視せず、スナップショット＋ミス時再読込
+        return get_directory_index(os.path.join(self.account_dir, lv_value), watch=False)
+
+    def mp4_files(self, lv_value):
+        """lv_valueを含むMP4ファイル一覧"""
+        names = self._account().names(lambda name: name.endswith('.mp4') and lv_value in name)
+        return [os.path.join(self.account_dir, name) for name in names]
+
+    def mp4(self, lv_value):
+        """lv_valueを含むMP4ファイル"""
+        return self._account().find(lambda name: name.endswith('.mp4') and lv_value in name)
+
+    def xml(self, lv_value):
+        """lv_valueを含むNCVのXMLファイル"""
+        if not self.ncv_dir:
+            return None
+        return get_directory_index(self.ncv_dir).find(lambda name: name.endswith('.xml') and lv_value in name)
+
+    def data_json(self, lv_value):
+        """統合JSONファイル"""
+        return self._broadcast(lv_value).find(lambda name: name == f"{lv_value}_data.json")
+
+    def html(self, lv_value):
+        """放送ページHTMLファイル"""
+        return self._broadcast(lv_value).find(lambda name: name.startswith(lv_value) and name.endswith('.html'))
+
+    def broadcast_ids(self):
+        """放送ディレクトリ（lvで始まる）の一覧"""
+        return self._account().names(lambda name: name.startswith('lv'), kind='dir')
+
+    def artifacts(self, lv_value):
+        """放送の成果物パスをまとめて取得"""
+        return {
+            'mp4': self.mp4(lv_value),
+            'xml': self.xml(lv_value),
+            'data_json': self.data_json(lv_value),
+            'html': self.html(lv_value)
+        }
+
+
+_account_indexes = OrderedDict()
+
+
+def get_account_index(account_dir, ncv_dir=None):
+    """プロセス内（パイプライン実行中）で共有するアカウントインデックスを取得"""
+    key = os.path.abspath(account_dir)
+    with _indexes_lock:
+        index = _account_indexes.get(key)
+        if index is None:
+            index = AccountIndex(account_dir, ncv_dir)
+            _account_indexes[key] = index
+            while len(_account_indexes) > MAX_ACCOUNT_INDEXES:
+                _account_indexes.popitem(last=False)
+        else:
+            _account_indexes.move_to_end(key)
+            if ncv_dir and not index.ncv_dir:
+                index.ncv_dir = os.path.abspath(ncv_dir)
+        return index
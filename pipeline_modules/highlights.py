@@ -0,0 +1,121 @@
+import re
+
+import numpy as np
+
+DEFAULT_HIGHLIGHT_SETTINGS = {
+    "window_seconds": 300,        # 比較対象にする直前の区間
+    "threshold": 2.5,             # 合成zスコアがこれ以上のピークを見どころとする
+    "max_highlights": 10,
+    "min_gap_seconds": 60,        # 見どころ同士の最小間隔
+    "keywords": ["草", "888", "８８８", "神", "!?", "？！", "きた", "キタ"],
+    # 正規表現で数える反応（単独の w は英単語やURLにも含まれるので、文末の笑いと全角の連続だけ）
+    "keyword_patterns": [r"(?<![A-Za-z])[wWｗＷ]+\s*$", r"[ｗＷ]{2,}"],
+    "weights": {"comments": 1.0, "keywords": 1.0, "sentiment": 0.5}
+}
+
+
+def highlight_settings(config):
+    """設定の highlight_settings を既定値に重ねて返す"""
+    settings = dict(DEFAULT_HIGHLIGHT_SETTINGS)
+    settings.update((config or {}).get('highlight_settings', {}))
+    settings['weights'] = {**DEFAULT_HIGHLIGHT_SETTINGS['weights'], **settings.get('weights', {})}
+    return settings
+
+
+def rolling_zscore(values, window):
+    """各ブロックを直前 window ブロックの平均・標準偏差と比べたzスコア（累積和で一括計算）"""
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    if count == 0:
+        return values
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    squares = np.concatenate(([0.0], np.cumsum(values * values)))
+    index = np.arange(count)
+    start = np.maximum(0, index - window)
+    sizes = np.maximum(index - start, 1)
+    mean = (sums[index] - sums[start]) / sizes
+    variance = np.maximum((squares[index] - squares[start]) / sizes - mean * mean, 0.0)
+    # 静かな区間の直後で標準偏差が0に近いと少しの変化でも跳ねるので、全体のばらつきを下限にする
+    floor = max(float(values.std()), 1e-6)
+    scores = (values - mean) / np.maximum(np.sqrt(variance), floor)
+    # 先頭ブロックは比べる過去がないので0（平均0と比べると常に跳ねて冒頭が見どころになってしまう）
+    scores[0] = 0.0
+    return scores
+
+
+def keyword_counts(comments, block_count, keywords, block_seconds, patterns=()):
+    """ブロックごとの反応キーワード（文字列そのまま、または patterns の正規表現）入りコメント数"""
+    alternatives = [re.escape(keyword) for keyword in keywords] + [f"(?:{pattern})" for pattern in patterns]
+    if not comments or not alternatives:
+        return np.zeros(block_count, dtype=np.int64)
+    pattern = re.compile('|'.join(alternatives))
+    blocks = np.fromiter((comment.get('timeline_block', 0) or 0 for comment in comments), dtype=np.int64, count=len(comments))
+    hits = np.fromiter((pattern.search(comment.get('text', '')) is not None for comment in comments), dtype=bool, count=len(comments))
+    index = np.floor_divide(blocks, block_seconds)
+    valid = hits & (index >= 0) & (index < block_count)
+    return np.bincount(index[valid], minlength=block_count)
+
+
+def sentiment_shift(positive, negative, segment_count):
+    """ブロック間の感情（positive - negative）の変化量（文字起こしのないブロックは直前の値を引き継ぐ）"""
+    sentiment = np.asarray(positive, dtype=np.float64) - np.asarray(negative, dtype=np.float64)
+    if len(sentiment) == 0:
+        return sentiment
+    index = np.where(np.asarray(segment_count) > 0, np.arange(len(sentiment)), 0)
+    filled = sentiment[np.maximum.accumulate(index)]
+    return np.abs(np.diff(filled, prepend=filled[0]))
+
+
+def detect_highlights(series, comments, config=None, block_seconds=10):
+    """コメント密度・キーワード・感情変化から見どころを検出し (見どころリスト, 0〜100のヒート値) を返す"""
+    settings = highlight_settings(config)
+    starts = np.asarray(series['start_seconds'])
+    block_count = len(starts)
+    if block_count == 0:
+        return [], np.zeros(0, dtype=np.int64)
+
+    window = max(1, int(settings['window_seconds']) // block_seconds)
+    comment_count = np.asarray(series['comment_count'], dtype=np.float64)
+    keyword_count = keyword_counts(
+        comments, block_count, settings['keywords'], block_seconds, settings.get('keyword_patterns') or ()
+    )
+    shift = sentiment_shift(series['positive_score'], series['negative_score'], series['segment_count'])
+
+    weights = settings['weights']
+    score = (
+        weights['comments'] * rolling_zscore(comment_count, window)
+        + weights['keywords'] * rolling_zscore(keyword_count, window)
+        + weights['sentiment'] * rolling_zscore(shift, window)
+    )
+
+    # 前後より高い（局所最大）かつ閾値以上でコメントのあるブロックが候補
+    padded = np.concatenate(([-np.inf], score, [-np.inf]))
+    is_peak = (score >= padded[:-2]) & (score > padded[2:])
+    candidates = np.flatnonzero(is_peak & (score >= settings['threshold']) & (comment_count > 0))
+    candidates = candidates[np.argsort(-score[candidates], kind='stable')]
+
+    min_gap = max(1, int(settings['min_gap_seconds']) // block_seconds)
+    selected = []
+    for index in candidates.tolist():
+        if all(abs(index - other) >= min_gap for other in selected):
+            selected.append(index)
+            if len(selected) >= settings['max_highlights']:
+                break
+
+    highlights = []
+    for rank, index in enumerate(selected, 1):
+        start = int(starts[index])
+        highlights.append({
+            'rank': rank,
+            'start_seconds': start,
+            'time': f"{start // 3600:02d}:{start // 60 % 60:02d}:{start % 60:02d}",
+            'score': round(float(score[index]), 2),
+            'comment_count': int(comment_count[index]),
+            'keyword_count': int(keyword_count[index]),
+            'sentiment_shift': round(float(shift[index]), 3)
+        })
+
+    positive = np.clip(score, 0.0, None)
+    peak = positive.max()
+    heat = np.rint(positive / peak * 100).astype(np.int64) if peak > 0 else np.zeros(block_count, dtype=np.int64)
+    return highlights, heat
@@ -0,0 +1,336 @@
+import os
+import json
+import time
+import uuid
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+
+from utils import save_json_atomic, get_gpu_info
+
+QUEUE_FILE = os.path.join('data', 'pipeline_queue.json')
+GLOBAL_CONFIG_FILE = os.path.join('config', 'global_config.json')
+
+# config/global_config.json の "pipeline_queue" で上書き
+DEFAULT_QUEUE_SETTINGS = {
+    "gpu_slots": 0,                 # 0: GPUメモリから自動計算
+    "gpu_memory_per_job_mb": 5000,  # Whisper large-v3 (float16) 1本あたりの目安
+    "cpu_cores": 0,                 # 0: os.cpu_count()
+    "cpu_cores_per_job": 2,
+    "aging_minutes": 10,            # 待ち時間がこの分数ごとに優先度+1（低優先度の取り残し防止）
+    "api_budgets": {
+        "openai": {"max_concurrent": 2, "per_hour": 30},
+        "google": {"max_concurrent": 2, "per_hour": 30},
+        "suno": {"max_concurrent": 1, "per_hour": 10}
+    }
+}
+
+
+def load_queue_settings():
+    """ジョブキューの設定（グローバル設定に無い項目は既定値）"""
+    settings = json.loads(json.dumps(DEFAULT_QUEUE_SETTINGS))
+    try:
+        with open(GLOBAL_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            overrides = json.load(f).get('pipeline_queue', {})
+    except (OSError, json.JSONDecodeError):
+        overrides = {}
+
+    budgets = overrides.pop('api_budgets', {})
+    settings.update(overrides)
+    for provider, budget in budgets.items():
+        settings['api_budgets'].setdefault(provider, {}).update(budget)
+    return settings
+
+
+def job_requirements(config, settings, gpu_available):
+    """ユーザー設定から1ジョブが使う資源を見積もる（GPU枠・CPUコア・API）"""
+    ai_features = config.get('ai_features', {})
+    api_settings = config.get('api_settings', {})
+    audio_settings = config.get('audio_settings', {})
+    cpu_total = settings['cpu_cores'] or os.cpu_count() or 1
+
+    gpu = 0
+    cpu = settings['cpu_cores_per_job']
+    if ai_features.get('enable_summary_text', True):
+        if gpu_available and audio_settings.get('use_gpu', True):
+            gpu = 1
+        else:
+            # CPUでWhisperを回す場合はそのスレッド数ぶん確保
+            cpu = max(cpu, audio_settings.get('cpu_threads', 8))
+    cpu = min(cpu, cpu_total)
+
+    apis = set()
+    if ai_features.get('enable_summary_text', True):
+        summary_model = api_settings.get('summary_ai_model', api_settings.get('ai_model', 'openai-gpt4o'))
+        apis.add('google' if summary_model.startswith('google') else 'openai')
+        conversation_model = api_settings.get('conversation_ai_model', api_settings.get('ai_model', 'openai-gpt4o'))
+        if ai_features.get('enable_ai_conversation', True):
+            apis.add('google' if conversation_model.startswith('google') else 'openai')
+        if ai_features.get('enable_summary_image', True):
+            apis.add('openai')
+        if ai_features.get('enable_ai_music', True):
+            apis.add('suno')
+
+    return {'gpu': gpu, 'cpu': cpu, 'apis': sorted(apis)}
+
+
+class PipelineJobQueue:
+    """全アカウント共通のパイプライン実行キュー（GPU枠・CPUコア・API予算に収まる順に起動）"""
+
+    def __init__(self, launcher, logger=None, queue_file=QUEUE_FILE, settings=None, keep_finished=20):
+        self.launcher = launcher    # launcher(job) → 起動済みの PipelineJobHandle（すぐに戻る）
+        self.logger = logger
+        self.queue_file = queue_file
+        self.settings = settings or load_queue_settings()
+
+        self.condition = threading.Condition()
+        self.jobs = {}                  # job_id → ジョブ（待機中・実行中）
+        self.api_starts = {}            # provider → 直近1時間の開始時刻
+        self.last_started = {}          # account → 最後に起動した時刻（公平性用）
+        self.running = False
+        self.dispatcher = None
+        self.handles = {}                               # job_id → PipelineJobHandle（実行中）
+        self.finished = deque(maxlen=keep_finished)     # 終了したジョブのハンドル（UIで出力を確認する用）
+
+        self._load()
+
+    def log(self, message):
+        print(f"[job_queue] {message}", flush=True)
+        if self.logger:
+            self.logger.log(message)
+
+    # ---- 永続化 ----
+
+    def _load(self):
+        """前回終了時のキューを復元（実行中だったジョブは待機に戻す。完了済みステップは再開時に省略される）"""
+        if not os.path.exists(self.queue_file):
+            return
+        try:
+            with open(self.queue_file, 'r', encoding='utf-8') as f:
+                jobs = json.load(f).get('jobs', [])
+        except (OSError, json.JSONDecodeError) as e:
+            self.log(f"キューの読み込みに失敗（空で開始）: {str(e)}")
+            return
+
+        for job in jobs:
+            if job.get('status') == 'running':
+                job['status'] = 'queued'
+                job['restarts'] = job.get('restarts', 0) + 1
+            self.jobs[job['job_id']] = job
+        if self.jobs:
+            self.log(f"前回のキューを復元: {len(self.jobs)}件")
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.queue_file), exist_ok=True)
+            jobs = sorted(self.jobs.values(), key=lambda job: job['enqueued_at'])
+            save_json_atomic(self.queue_file, {'updated_at': datetime.now().isoformat(), 'jobs': jobs})
+        except OSError as e:
+            self.log(f"キューの保存に失敗: {str(e)}")
+
+    # ---- 投入 ----
+
+    def enqueue(self, user_name, config, lv_value):
+        """パイプライン実行を予約（同じ放送が待機中・実行中なら何もしない）してジョブIDを返す"""
+        basic = config['basic_settings']
+        with self.condition:
+            for job in self.jobs.values():
+                if job['account_id'] == basic['account_id'] and job['lv_value'] == lv_value:
+                    self.log(f"[{user_name}] 既にキューにあります: {lv_value}")
+                    return job['job_id']
+
+            job = {
+                'job_id': uuid.uuid4().hex[:12],
+                'user_name': user_name,
+                'account_id': basic['account_id'],
+                'platform': basic['platform'],
+                'platform_directory': basic['platform_directory'],
+                'ncv_directory': basic['ncv_directory'],
+                'lv_value': lv_value,
+                'priority': config.get('pipeline_settings', {}).get('priority', 0),
+                'requires': job_requirements(config, self.settings, self._gpu_capacity() > 0),
+                'status': 'queued',
+                'enqueued_at': time.time()
+            }
+            self.jobs[job['job_id']] = job
+            self._save()
+            self.condition.notify_all()
+
+        self.log(f"[{user_name}] キュー投入: {lv_value} (待機 {self.pending_count()}件)")
+        return job['job_id']
+
+    def pending_count(self):
+        with self.condition:
+            return sum(1 for job in self.jobs.values() if job['status'] == 'queued')
+
+    def snapshot(self):
+        """待機中・実行中のジョブ一覧（表示用のコピー）"""
+        with self.condition:
+            return [dict(job) for job in sorted(self.jobs.values(), key=lambda job: job['enqueued_at'])]
+
+    def job_views(self):
+        """UI表示用：待機中・実行中・最近終了したジョブ（実行中と終了分は進捗付き）"""
+        with self.condition:
+            views = []
+            for job in sorted(self.jobs.values(), key=lambda job: job['enqueued_at']):
+                handle = self.handles.get(job['job_id'])
+                if handle:
+                    views.append(handle.summary())
+                else:
+                    views.append({'job_id': job['job_id'], 'user_name': job['user_name'], 'lv_value': job['lv_value'],
+                                  'state': job['status'], 'progress': {}})
+            views.extend(handle.summary() for handle in reversed(self.finished))
+            return views
+
+    def handle(self, job_id):
+        """実行中または最近終了したジョブのハンドル"""
+        with self.condition:
+            if job_id in self.handles:
+                return self.handles[job_id]
+            for handle in self.finished:
+                if handle.job.get('job_id') == job_id:
+                    return handle
+        return None
+
+    # ---- 資源管理 ----
+
+    def _gpu_capacity(self):
+        """同時に使えるGPU枠（GPU情報が未取得ならtorchは読み込まず1枠とみなす）"""
+        if self.settings['gpu_slots']:
+            return self.settings['gpu_slots']
+        info = get_gpu_info(probe=False)
+        if info is None:
+            return 1
+        if not info.get('available'):
+            return 0
+        memory_mb = info.get('memory_mb')
+        if not memory_mb:
+            return 1
+        return max(1, memory_mb // self.settings['gpu_memory_per_job_mb'])
+
+    def _in_use(self):
+        used = {'gpu': 0, 'cpu': 0, 'apis': {}}
+        for job in self.jobs.values():
+            if job['status'] != 'running':
+                continue
+            used['gpu'] += job['requires']['gpu']
+            used['cpu'] += job['requires']['cpu']
+            for provider in job['requires']['apis']:
+                used['apis'][provider] = used['apis'].get(provider, 0) + 1
+        return used
+
+    def _fits(self, job, used, now):
+        """ジョブの必要資源が空いているか（API予算は同時実行数と直近1時間の開始数）"""
+        requires = job['requires']
+        cpu_total = self.settings['cpu_cores'] or os.cpu_count() or 1
+        # GPUがない環境ではWhisperもCPUで動くのでGPU枠は見ない
+        gpu_capacity = self._gpu_capacity()
+        if gpu_capacity and used['gpu'] + requires['gpu'] > gpu_capacity:
+            return False
+        # CPUは何も動いていなければ必ず1件は通す（見積もりが総コア数を超えても詰まらせない）
+        if used['cpu'] and used['cpu'] + requires['cpu'] > cpu_total:
+            return False
+        for provider in requires['apis']:
+            budget = self.settings['api_budgets'].get(provider, {})
+            max_concurrent = budget.get('max_concurrent', 0)
+            if max_concurrent and used['apis'].get(provider, 0) >= max_concurrent:
+                return False
+            per_hour = budget.get('per_hour', 0)
+            starts = self.api_starts.get(provider)
+            if per_hour and starts:
+                while starts and now - starts[0] > 3600:
+                    starts.popleft()
+                if len(starts) >= per_hour:
+                    return False
+        return True
+
+    def _order(self, now):
+        """起動順：優先度（待ち時間で加算）→ 実行中の少ないアカウント → 最後の起動が古いアカウント → 投入順"""
+        running_per_account = {}
+        for job in self.jobs.values():
+            if job['status'] == 'running':
+                running_per_account[job['account_id']] = running_per_account.get(job['account_id'], 0) + 1
+
+        aging = self.settings['aging_minutes'] * 60
+        def key(job):
+            waited = now - job['enqueued_at']
+            effective_priority = job['priority'] + (waited // aging if aging else 0)
+            return (
+                -effective_priority,
+                running_per_account.get(job['account_id'], 0),
+                self.last_started.get(job['account_id'], 0),
+                job['enqueued_at']
+            )
+        return sorted((job for job in self.jobs.values() if job['status'] == 'queued'), key=key)
+
+    # ---- 実行 ----
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return self
+            self.running = True
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name='pipeline-job-queue', daemon=True)
+        self.dispatcher.start()
+        return self
+
+    def stop(self):
+        """新規の起動を止める（実行中のパイプラインはそのまま、待機中のジョブは次回起動時に再開）"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def _dispatch_loop(self):
+        while True:
+            with self.condition:
+                if not self.running:
+                    return
+                now = time.time()
+                used = self._in_use()
+                started = []
+                for job in self._order(now):
+                    if not self._fits(job, used, now):
+                        continue
+                    job['status'] = 'running'
+                    job['started_at'] = now
+                    self.last_started[job['account_id']] = now
+                    for provider in job['requires']['apis']:
+                        self.api_starts.setdefault(provider, deque()).append(now)
+                    used = self._in_use()
+                    started.append(job)
+                if started:
+                    self._save()
+                # 完了・投入で起こされるまで待つ（API予算の期限切れも拾えるよう定期的に再判定）
+                if not started:
+                    self.condition.wait(timeout=30)
+
+            for job in started:
+                self._launch(job)
+
+    def _launch(self, job):
+        """ジョブを起動（終了待ちはせず、終了時のコールバックで資源を返す）"""
+        waited = job['started_at'] - job['enqueued_at']
+        self.log(f"[{job['user_name']}] パイプライン起動: {job['lv_value']} (待ち {waited:.0f}秒, "
+                 f"GPU {job['requires']['gpu']} / CPU {job['requires']['cpu']} / API {','.join(job['requires']['apis']) or 'なし'})")
+        try:
+            handle = self.launcher(job)
+        except Exception as e:
+            self.log(f"[{job['user_name']}] パイプライン起動エラー: {str(e)}")
+            traceback.print_exc()
+            self._finish(job, None)
+            return
+        with self.condition:
+            self.handles[job['job_id']] = handle
+        handle.add_done_callback(lambda handle: self._finish(job, handle))
+
+    def _finish(self, job, handle):
+        if handle is not None and handle.returncode != 0:
+            self.log(f"[{job['user_name']}] パイプライン異常終了: {job['lv_value']} (終了コード {handle.returncode})")
+        with self.condition:
+            self.jobs.pop(job['job_id'], None)
+            if handle is not None:
+                self.handles.pop(job['job_id'], None)
+                self.finished.append(handle)
+            self._save()
+            self.condition.notify_all()
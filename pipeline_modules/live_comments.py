@@ -0,0 +1,240 @@
+import os
+import re
+import json
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from utils import save_json_atomic
+from pipeline_modules.storage import write_json
+
+# 書き込み途中のXMLから完結したchat要素だけを拾う（閉じタグのないルート要素はパースできないため）
+CHAT_ELEMENT = re.compile(rb'<chat\b[^>]*?(?:/>|>.*?</chat>)', re.DOTALL)
+START_TIME_ELEMENT = re.compile(rb'<StartTime>\s*(\d+)\s*</StartTime>')
+READ_CHUNK = 4 * 1024 * 1024
+
+STORE_SUFFIX = '_live_comments.jsonl'
+STATE_SUFFIX = '_live_state.json'
+
+
+def chat_to_comment(chat, start_time):
+    """chat要素を comments.json の1件に変換（日時がない・配信開始前のものは None）"""
+    comment_date = int(chat.get('date', 0))
+    if comment_date == 0:
+        return None
+
+    # 配信開始からの秒数を計算（負の値は配信開始前）
+    broadcast_seconds = comment_date - start_time
+    if broadcast_seconds < 0:
+        return None
+
+    return {
+        "no": int(chat.get('no', 0)),
+        "user_id": chat.get('user_id', ''),
+        "user_name": chat.get('name', ''),
+        "text": chat.text or '',
+        "date": comment_date,
+        "broadcast_seconds": broadcast_seconds,
+        "timeline_block": (broadcast_seconds // 10) * 10,   # タイムブロック（10秒刻み）
+        "premium": int(chat.get('premium', 0)),
+        "anonymity": 'anonymity' in chat.attrib
+    }
+
+
+def build_ranking(user_stats):
+    """ユーザー別集計からランキングを作る（コメント数順）"""
+    ranking = sorted((dict(stat) for stat in user_stats.values()), key=lambda x: x['comment_count'], reverse=True)
+    for i, user in enumerate(ranking, 1):
+        user["rank"] = i
+    return ranking
+
+
+def add_to_user_stats(user_stats, comment):
+    """ユーザー別集計に1件加える（最初・最後のコメントは放送内時間で判定）"""
+    user_id = comment['user_id']
+    stat = user_stats.get(user_id)
+    if stat is None:
+        stat = user_stats[user_id] = {
+            "user_id": user_id,
+            "user_name": comment['user_name'],
+            "comment_count": 0,
+            "first_comment": comment['text'],
+            "first_comment_time": comment['broadcast_seconds'],
+            "last_comment": comment['text'],
+            "last_comment_time": comment['broadcast_seconds'],
+            "premium": comment['premium'],
+            "anonymity": comment['anonymity']
+        }
+    stat["comment_count"] += 1
+    if comment['broadcast_seconds'] < stat["first_comment_time"]:
+        stat["first_comment"] = comment['text']
+        stat["first_comment_time"] = comment['broadcast_seconds']
+    if comment['broadcast_seconds'] >= stat["last_comment_time"]:
+        stat["last_comment"] = comment['text']
+        stat["last_comment_time"] = comment['broadcast_seconds']
+
+
+class LiveCommentIngester:
+    """配信中に伸びていくNCVのXMLを追いかけ、コメントを追記保存しながらユーザー別・ブロック別に集計する"""
+
+    def __init__(self, xml_path, broadcast_dir, lv_value, start_time=None, storage=None):
+        self.xml_path = xml_path
+        self.broadcast_dir = broadcast_dir
+        self.lv_value = lv_value
+        self.store_path = os.path.join(broadcast_dir, f"{lv_value}{STORE_SUFFIX}")
+        self.state_path = os.path.join(broadcast_dir, f"{lv_value}{STATE_SUFFIX}")
+        self.storage = storage   # comments.json などの保存形式（None なら既定）
+        self.lock = threading.Lock()
+        self.state = self._load_state(start_time)
+
+    def _new_state(self, start_time):
+        return {
+            'xml_path': self.xml_path,
+            'start_time': start_time,
+            'offset': 0,            # XMLの読み込み済み位置（バイト）
+            'store_size': 0,        # 追記ファイルの確定済みサイズ
+            'comment_count': 0,
+            'users': {},
+            'histogram': {},        # timeline_block → コメント数
+            'updated_at': None
+        }
+
+    def _load_state(self, start_time):
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return self._new_state(start_time)
+
+        if os.path.normcase(os.path.abspath(state.get('xml_path', ''))) != os.path.normcase(os.path.abspath(self.xml_path)):
+            print(f"ライブコメントの記録が別のXMLのものなので作り直します: {state.get('xml_path')}")
+            return self._new_state(start_time)
+        if start_time is not None and state.get('start_time') not in (None, start_time):
+            print(f"ライブコメントの記録と開始時刻が異なるので作り直します: {state.get('start_time')} != {start_time}")
+            return self._new_state(start_time)
+        store_size = os.path.getsize(self.store_path) if os.path.exists(self.store_path) else 0
+        if store_size < state.get('store_size', 0):
+            print(f"ライブコメントの追記ファイルが欠けているので作り直します: {self.store_path}")
+            return self._new_state(start_time)
+        return state
+
+    def has_progress(self):
+        """途中まで読み込んだ記録があるか"""
+        return self.state['offset'] > 0
+
+    def _reset(self):
+        self.state = self._new_state(self.state.get('start_time'))
+        try:
+            os.remove(self.store_path)
+        except OSError:
+            pass
+
+    def poll(self):
+        """XMLの増えた分を読み込み、追加したコメント数を返す"""
+        with self.lock:
+            try:
+                size = os.path.getsize(self.xml_path)
+            except OSError:
+                return 0
+            if size < self.state['offset']:
+                # ファイルが作り直された
+                print(f"NCVのXMLが縮んだため最初から読み直します: {self.xml_path}")
+                self._reset()
+            if size == self.state['offset']:
+                return 0
+
+            added = 0
+            with open(self.xml_path, 'rb') as f:
+                f.seek(self.state['offset'])
+                pending = b''
+                while True:
+                    chunk = f.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    pending += chunk
+                    consumed, count = self._consume(pending)
+                    added += count
+                    pending = pending[consumed:]
+            return added
+
+    def _consume(self, data):
+        """完結したchat要素を取り込み、(処理済みバイト数, 追加件数) を返す"""
+        if self.state['start_time'] is None:
+            # 開始時刻はXML冒頭のLiveInfoから（まだ書かれていなければ次回）
+            match = START_TIME_ELEMENT.search(data)
+            if not match:
+                return 0, 0
+            self.state['start_time'] = int(match.group(1))
+
+        comments = []
+        end = 0
+        for match in CHAT_ELEMENT.finditer(data):
+            end = match.end()
+            try:
+                comment = chat_to_comment(ET.fromstring(match.group(0)), self.state['start_time'])
+            except (ET.ParseError, ValueError, TypeError) as e:
+                print(f"コメント解析エラー: {str(e)}")
+                continue
+            if comment is not None:
+                comments.append(comment)
+        if not end:
+            return 0, 0
+
+        self._append(comments, end)
+        return end, len(comments)
+
+    def _append(self, comments, consumed):
+        """追記ファイルに書いてから集計と読み込み位置を保存（途中で落ちても次回は確定済みの位置から）"""
+        os.makedirs(self.broadcast_dir, exist_ok=True)
+        if comments:
+            with open(self.store_path, 'ab') as f:
+                f.truncate(self.state['store_size'])   # 前回の確定後に書きかけた分は捨てる
+                f.seek(self.state['store_size'])
+                for comment in comments:
+                    f.write((json.dumps(comment, ensure_ascii=False) + '\n').encode('utf-8'))
+                self.state['store_size'] = f.tell()
+
+        histogram = self.state['histogram']
+        for comment in comments:
+            add_to_user_stats(self.state['users'], comment)
+            block = str(comment['timeline_block'])
+            histogram[block] = histogram.get(block, 0) + 1
+        self.state['comment_count'] += len(comments)
+        self.state['offset'] += consumed
+        self.state['updated_at'] = datetime.now().isoformat()
+        save_json_atomic(self.state_path, self.state, indent=None)
+
+    def comments(self):
+        """取り込んだコメント（放送内時間順）"""
+        comments = []
+        with open(self.store_path, 'rb') as f:
+            data = f.read(self.state['store_size'])
+        for line in data.splitlines():
+            if line:
+                comments.append(json.loads(line))
+        comments.sort(key=lambda x: x['broadcast_seconds'])
+        return comments
+
+    def ranking(self):
+        return build_ranking(self.state['users'])
+
+    def write_outputs(self):
+        """comments.json と comment_ranking.json を書き出す（step10 と同じ形式）"""
+        with self.lock:
+            comments = self.comments() if self.state['store_size'] else []
+            ranking = self.ranking()
+        now = datetime.now().isoformat()
+        write_json(os.path.join(self.broadcast_dir, f"{self.lv_value}_comments.json"), {
+            "lv_value": self.lv_value,
+            "total_comments": len(comments),
+            "created_at": now,
+            "comments": comments
+        }, self.storage, checksum=True)
+        write_json(os.path.join(self.broadcast_dir, f"{self.lv_value}_comment_ranking.json"), {
+            "lv_value": self.lv_value,
+            "total_users": len(ranking),
+            "created_at": now,
+            "ranking": ranking
+        }, self.storage, checksum=True)
+        print(f"ライブコメントを書き出し: {len(comments)}件, ランキング{len(ranking)}ユーザー")
+        return comments, ranking
@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+import subprocess
+import threading
+
+from utils import save_json_atomic
+
+CACHE_DIR = os.path.join('cache', 'media_probe')
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+def _file_key(path):
+    """キャッシュキー（絶対パス・サイズ・更新時刻）"""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _cache_path(abs_path):
+    digest = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, f"{digest}.json")
+
+
+def _load_disk_cache(key):
+    """ディスクキャッシュを読み込み（ファイルが変わっていればNone）"""
+    abs_path, size, mtime_ns = key
+    cache_path = _cache_path(abs_path)
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            info = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if info.get('path') != abs_path or info.get('size') != size or info.get('mtime_ns') != mtime_ns:
+        return None
+    return info
+
+
+def _store(key, info):
+    with _lock:
+        _memory_cache[key] = info
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        save_json_atomic(_cache_path(key[0]), info, indent=None)
+    except OSError as e:
+        print(f"メディア情報キャッシュ保存エラー: {str(e)}")
+
+
+def _run_ffprobe(path):
+    """ffprobeを1回実行してフォーマット・ストリーム情報を取得"""
+    cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json',
+        '-show_format', '-show_streams', path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+    if result.returncode != 0:
+        raise Exception(f"ffprobe失敗 (code={result.returncode}): {path}")
+    return json.loads(result.stdout or '{}')
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _build_info(key, probe):
+    abs_path, size, mtime_ns = key
+    fmt = probe.get('format', {})
+    streams = []
+    for stream in probe.get('streams', []):
+        streams.append({
+            'index': stream.get('index'),
+            'codec_type': stream.get('codec_type'),
+            'codec_name': stream.get('codec_name'),
+            'width': stream.get('width'),
+            'height': stream.get('height'),
+            'sample_rate': stream.get('sample_rate'),
+            'channels': stream.get('channels'),
+            'duration': _to_float(stream.get('duration'), None)
+        })
+
+    duration = _to_float(fmt.get('duration'))
+    if not duration:
+        duration = max((s['duration'] or 0.0 for s in streams), default=0.0)
+
+    return {
+        'path': abs_path,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'format_name': fmt.get('format_name', ''),
+        'bit_rate': fmt.get('bit_rate'),
+        'duration': duration,
+        'streams': streams,
+        'has_video': any(s['codec_type'] == 'video' for s in streams),
+        'has_audio': any(s['codec_type'] == 'audio' for s in streams)
+    }
+
+
+def probe_media(path):
+    """メディア情報を取得（(path, size, mtime)単位でキャッシュ）"""
+    key = _file_key(path)
+
+    with _lock:
+        info = _memory_cache.get(key)
+    if info is None:
+        info = _load_disk_cache(key)
+        if info is None:
+            info = _build_info(key, _run_ffprobe(path))
+            print(f"メディア情報取得: {os.path.basename(path)} (長さ: {info['duration']:.1f}秒)")
+        _store(key, info)
+
+    return info
+
+
+def get_duration(path):
+    """再生時間（秒）"""
+    return probe_media(path)['duration']
+
@@ -0,0 +1,161 @@
+import os
+import time
+import hashlib
+import threading
+
+import requests
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+# 一覧カード用の縮小サイズ（横幅px）と形式
+VARIANT_WIDTHS = (320, 640)
+VARIANT_FORMATS = ('avif', 'webp')
+CHUNK_SIZE = 64 * 1024
+
+
+class MediaStore:
+    """アカウント単位の内容アドレス型メディア置き場（{account_dir}/media/{hash[:2]}/{hash}.{ext}）"""
+
+    def __init__(self, account_dir):
+        self.account_dir = account_dir
+        self.media_dir = os.path.join(account_dir, 'media')
+
+    def relative_path(self, digest, ext, suffix=''):
+        """アカウントディレクトリからの相対パス（HTMLからの参照用に常に / 区切り）"""
+        return f"media/{digest[:2]}/{digest}{suffix}.{ext}"
+
+    def absolute_path(self, relative_path):
+        return os.path.join(self.account_dir, *relative_path.split('/'))
+
+    def download(self, url, ext, timeout=30):
+        """URLの内容をメモリに溜めずにストリーミング保存し、(相対パス, ハッシュ, バイト数) を返す"""
+        os.makedirs(self.media_dir, exist_ok=True)
+        tmp_path = os.path.join(self.media_dir, f".download.{os.getpid()}.{threading.get_ident()}.tmp")
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            with requests.get(url, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            digest.update(chunk)
+                            f.write(chunk)
+                            size += len(chunk)
+
+            hex_digest = digest.hexdigest()
+            relative_path = self.relative_path(hex_digest, ext)
+            final_path = self.absolute_path(relative_path)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if os.path.exists(final_path):
+                # 同じ内容は保存済み
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, final_path)
+            return relative_path, hex_digest, size
+
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def make_variants(self, relative_path, digest, widths=VARIANT_WIDTHS, formats=VARIANT_FORMATS):
+        """縮小版（WebP/AVIF）を生成し {形式: {横幅: 相対パス}} を返す（Pillowがなければ空）"""
+        if not PIL_AVAILABLE:
+            print("Pillowがないため縮小画像の生成をスキップ")
+            return {}
+
+        variants = {}
+        with Image.open(self.absolute_path(relative_path)) as source:
+            source.load()
+            for width in widths:
+                if width >= source.width:
+                    resized = source.copy()
+                else:
+                    height = round(source.height * width / source.width)
+                    resized = source.resize((width, height), Image.LANCZOS)
+                if resized.mode not in ('RGB', 'RGBA'):
+                    resized = resized.convert('RGB')
+
+                for fmt in formats:
+                    variant_path = self.relative_path(digest, fmt, f"_{width}")
+                    absolute = self.absolute_path(variant_path)
+                    if not os.path.exists(absolute):
+                        try:
+                            tmp_path = f"{absolute}.{os.getpid()}.tmp"
+                            resized.save(tmp_path, format=fmt.upper(), quality=80)
+                            os.replace(tmp_path, absolute)
+                        except (KeyError, OSError, ValueError) as e:
+                            # AVIFはPillowのビルドによっては未対応
+                            print(f"縮小画像生成スキップ ({fmt}, {width}px): {str(e)}")
+                            if os.path.exists(tmp_path):
+                                os.remove(tmp_path)
+                            continue
+                    variants.setdefault(fmt, {})[str(width)] = variant_path
+
+        print(f"縮小画像生成: {', '.join(f'{fmt}x{len(v)}' for fmt, v in variants.items()) or 'なし'}")
+        return variants
+
+
+def upload_to_imgur(image_path, api_key, title, retries=3, backoff=2.0):
+    """ファイルをmultipartでImgurにアップロード（失敗時は指数バックオフで再試行、最終的に失敗ならNone）"""
+    headers = {'Authorization': f'Client-ID {api_key}'}
+    data = {
+        'type': 'file',
+        'title': title,
+        'description': f'AI generated image for broadcast: {title}'
+    }
+
+    for attempt in range(1, retries + 1):
+        try:
+            with open(image_path, 'rb') as f:
+                response = requests.post(
+                    'https://api.imgur.com/3/image',
+                    headers=headers,
+                    data=data,
+                    files={'image': (os.path.basename(image_path), f)},
+                    timeout=60
+                )
+
+            if response.status_code == 200:
+                result = response.json()
+                if result.get('success'):
+                    imgur_url = result['data']['link']
+                    print(f"Imgur アップロード成功: {imgur_url}")
+                    return imgur_url
+                print(f"Imgur アップロード失敗: {result}")
+            elif response.status_code in (429, 500, 502, 503, 504):
+                print(f"Imgur API 一時エラー {response.status_code} ({attempt}/{retries})")
+            else:
+                # 認証エラーなどは再試行しても変わらない
+                print(f"Imgur API エラー {response.status_code}: {response.text}")
+                return None
+
+        except (requests.RequestException, OSError) as e:
+            print(f"Imgur アップロードエラー ({attempt}/{retries}): {str(e)}")
+
+        if attempt < retries:
+            time.sleep(backoff ** attempt)
+
+    return None
+
+
+def image_sources(image_generation, prefix=''):
+    """一覧カード用の画像指定（AVIF/WebPの縮小版、非対応ブラウザ向けにImgur、アップロード失敗時はローカル原寸）"""
+    image_generation = image_generation or {}
+    variants = image_generation.get('variants', {})
+    local_path = image_generation.get('local_path', '')
+
+    def srcset(fmt):
+        return ', '.join(f"{prefix}{path} {width}w" for width, path in sorted(variants.get(fmt, {}).items(), key=lambda x: int(x[0])))
+
+    return {
+        'src': image_generation.get('imgur_url') or (f"{prefix}{local_path}" if local_path else ''),
+        'avif': srcset('avif'),
+        'webp': srcset('webp')
+    }
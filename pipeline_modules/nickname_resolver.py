@@ -0,0 +1,291 @@
+import os
+import re
+import glob
+import html
+import json
+import time
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CACHE_DB = os.path.join('cache', 'nicknames.sqlite3')
+LEGACY_PICKLE_PATTERN = os.path.join('cache', 'user_nickname_*.pkl')
+LEGACY_JSON_DIR = 'user_cache'
+
+FRESH_SECONDS = 7 * 24 * 3600       # この期間内はそのまま使う
+STALE_SECONDS = 30 * 24 * 3600      # この期間内は古い値を返しつつ裏で再取得
+MISSING_SECONDS = 24 * 3600         # 存在しないユーザーを覚えておく期間
+MAX_CONCURRENCY = 4
+MIN_REQUEST_INTERVAL = 0.2          # 全スレッド共通のリクエスト間隔（秒）
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+NVAPI_URL = "https://nvapi.nicovideo.jp/v1/users/{user_id}"
+PROFILE_URL = "https://www.nicovideo.jp/user/{user_id}"
+META_USERNAME = re.compile(r'<meta[^>]+property="profile:username"[^>]+content="([^"]*)"', re.IGNORECASE)
+META_USERNAME_REVERSED = re.compile(r'<meta[^>]+content="([^"]*)"[^>]+property="profile:username"', re.IGNORECASE)
+
+_FETCH_FAILED = object()     # 通信エラー（キャッシュしない）
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+class UserNotFound(Exception):
+    """ユーザーが存在しない（否定キャッシュの対象）"""
+
+
+class NicknameResolver:
+    """ニコニコのユーザーID → ニックネーム（SQLiteキャッシュ1つにTTL・否定キャッシュ・期限切れ値の即時返却）"""
+
+    def __init__(self, db_path=CACHE_DB, max_concurrency=MAX_CONCURRENCY):
+        self.db_path = db_path
+        self.max_concurrency = max_concurrency
+
+        self.lock = threading.Lock()
+        self.rate_lock = threading.Lock()
+        self.next_request_at = 0.0
+        self.refreshing = set()
+        self.refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nickname-refresh')
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': USER_AGENT})
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        # 複数のパイプラインプロセスから同時に使うためWALモード
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS nicknames ("
+            " user_id TEXT PRIMARY KEY, nickname TEXT, status TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self._migrate_legacy_cache()
+
+    # ---- 旧キャッシュの取り込み ----
+
+    def _migrate_legacy_cache(self):
+        """ユーザーごとのpickle（cache/）とJSON（user_cache/）を取り込んで削除"""
+        rows = []
+        migrated_files = []
+        for path in glob.glob(LEGACY_PICKLE_PATTERN):
+            user_id = os.path.basename(path)[len('user_nickname_'):-len('.pkl')]
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+                if data.get('nickname'):
+                    rows.append((user_id, data['nickname'], 'ok', data['timestamp'].timestamp()))
+            except Exception as e:
+                print(f"旧ニックネームキャッシュ読み込みエラー: {path} ({str(e)})")
+            migrated_files.append(path)
+
+        for path in glob.glob(os.path.join(LEGACY_JSON_DIR, '*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('nickname'):
+                    fetched_at = datetime.fromisoformat(data['cached_at']).timestamp()
+                    rows.append((str(data.get('user_id') or os.path.basename(path)[:-5]), data['nickname'], 'ok', fetched_at))
+            except Exception as e:
+                print(f"旧ニックネームキャッシュ読み込みエラー: {path} ({str(e)})")
+            migrated_files.append(path)
+
+        if not migrated_files:
+            return
+
+        with self.lock:
+            # 既に新しい値があればそちらを優先
+            self.conn.executemany(
+                "INSERT INTO nicknames (user_id, nickname, status, fetched_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET nickname=excluded.nickname, status=excluded.status, "
+                "fetched_at=excluded.fetched_at WHERE excluded.fetched_at > nicknames.fetched_at",
+                rows
+            )
+            self.conn.commit()
+
+        for path in migrated_files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        try:
+            os.rmdir(LEGACY_JSON_DIR)
+        except OSError:
+            pass
+        print(f"旧ニックネームキャッシュを取り込み: {len(rows)}件（{len(migrated_files)}ファイル）")
+
+    # ---- キャッシュ ----
+
+    def _lookup(self, user_ids):
+        if not user_ids:
+            return {}
+        placeholders = ','.join('?' * len(user_ids))
+        with self.lock:
+            cursor = self.conn.execute(
+                f"SELECT user_id, nickname, status, fetched_at FROM nicknames WHERE user_id IN ({placeholders})",
+                list(user_ids)
+            )
+            return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def _store(self, results):
+        """取得結果をまとめて保存（通信エラーは保存しない）"""
+        now = time.time()
+        rows = [(user_id, nickname, 'ok' if nickname else 'missing', now) for user_id, nickname in results.items()]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO nicknames (user_id, nickname, status, fetched_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self.conn.commit()
+
+    # ---- 取得 ----
+
+    def _wait_for_slot(self):
+        """全スレッド共通の最小リクエスト間隔を守る"""
+        with self.rate_lock:
+            now = time.monotonic()
+            wait = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + MIN_REQUEST_INTERVAL
+        if wait > 0:
+            time.sleep(wait)
+
+    def fetch(self, user_id):
+        """ニックネームを取得（存在しなければ UserNotFound、通信エラーは requests の例外）"""
+        self._wait_for_slot()
+        response = self.session.get(
+            NVAPI_URL.format(user_id=user_id),
+            headers={'X-Frontend-Id': '6', 'X-Frontend-Version': '0'},
+            timeout=10
+        )
+        if response.status_code == 404:
+            raise UserNotFound(user_id)
+        if response.ok:
+            try:
+                nickname = response.json()['data']['user']['nickname']
+                if nickname:
+                    return nickname
+            except (ValueError, KeyError, TypeError):
+                pass
+
+        # APIで取れない場合はプロフィールページの<head>だけ読んでmetaタグから取得
+        self._wait_for_slot()
+        with self.session.get(PROFILE_URL.format(user_id=user_id), timeout=10, stream=True) as page:
+            if page.status_code == 404:
+                raise UserNotFound(user_id)
+            page.raise_for_status()
+            head = b''
+            for chunk in page.iter_content(chunk_size=16 * 1024):
+                head += chunk
+                if b'</head>' in head or len(head) > 512 * 1024:
+                    break
+        text = head.decode('utf-8', errors='replace')
+        match = META_USERNAME.search(text) or META_USERNAME_REVERSED.search(text)
+        if match and match.group(1):
+            return html.unescape(match.group(1))
+        return None
+
+    def _fetch_many(self, user_ids):
+        """並列数を制限して取得し {user_id: ニックネーム or None（存在しない）} を返す（通信エラーは含めない）"""
+        results = {}
+
+        def fetch_one(user_id):
+            try:
+                nickname = self.fetch(user_id)
+                if not nickname:
+                    # ページはあるが名前を読み取れない（ページ構成の変更など）場合は覚えない
+                    print(f"ユーザー {user_id} のニックネームが見つかりません")
+                    return user_id, _FETCH_FAILED
+                return user_id, nickname
+            except UserNotFound:
+                print(f"ユーザー {user_id} は存在しません")
+                return user_id, None
+            except requests.RequestException as e:
+                print(f"ユーザー {user_id} の情報取得エラー: {e}")
+                return user_id, _FETCH_FAILED
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(user_ids)) or 1) as executor:
+            for user_id, nickname in executor.map(fetch_one, user_ids):
+                if nickname is not _FETCH_FAILED:
+                    results[user_id] = nickname
+        self._store(results)
+        return results
+
+    def _refresh_in_background(self, user_ids):
+        """期限切れの値を返した分を裏で再取得"""
+        with self.lock:
+            user_ids = [user_id for user_id in user_ids if user_id not in self.refreshing]
+            self.refreshing.update(user_ids)
+        if not user_ids:
+            return
+
+        def refresh():
+            try:
+                self._fetch_many(user_ids)
+            finally:
+                with self.lock:
+                    self.refreshing.difference_update(user_ids)
+        self.refresher.submit(refresh)
+
+    def resolve_many(self, user_ids, fresh_seconds=FRESH_SECONDS):
+        """複数ユーザーのニックネームをまとめて取得し {user_id: ニックネーム or None} を返す"""
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids if user_id))
+        cached = self._lookup(user_ids)
+        now = time.time()
+
+        resolved = {}
+        to_fetch = []
+        to_refresh = []
+        for user_id in user_ids:
+            entry = cached.get(user_id)
+            if entry is None:
+                to_fetch.append(user_id)
+                continue
+            nickname, status, fetched_at = entry
+            age = now - fetched_at
+            if status == 'missing':
+                if age < MISSING_SECONDS:
+                    resolved[user_id] = None
+                else:
+                    to_fetch.append(user_id)
+            elif age < fresh_seconds:
+                resolved[user_id] = nickname
+            elif age < STALE_SECONDS:
+                resolved[user_id] = nickname
+                to_refresh.append(user_id)
+            else:
+                to_fetch.append(user_id)
+
+        if to_fetch:
+            print(f"ニックネーム取得: {len(to_fetch)}件（キャッシュ {len(resolved)}件）")
+            fetched = self._fetch_many(to_fetch)
+            for user_id in to_fetch:
+                if user_id in fetched:
+                    resolved[user_id] = fetched[user_id]
+                else:
+                    # 通信エラー時は期限切れでも残っている値を使う
+                    entry = cached.get(user_id)
+                    resolved[user_id] = entry[0] if entry and entry[1] == 'ok' else None
+        if to_refresh:
+            self._refresh_in_background(to_refresh)
+        return resolved
+
+    def resolve(self, user_id, fresh_seconds=FRESH_SECONDS):
+        """1ユーザーのニックネーム（取得できなければNone）"""
+        return self.resolve_many([user_id], fresh_seconds).get(str(user_id))
+
+
+
+def get_nickname_resolver():
+    """プロセス内で共有するリゾルバ"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = NicknameResolver()
+    return _resolver
@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import time
+import itertools
+import threading
+import subprocess
+from collections import deque
+
+# pipeline.py が標準出力に書く進捗行（"PROGRESS {json}"）
+PROGRESS_PREFIX = 'PROGRESS '
+OUTPUT_BUFFER_LINES = 2000
+
+
+def emit_progress(event):
+    """進捗イベントを1行のJSONとして標準出力へ（監視側の PipelineJobHandle が読み取る）"""
+    # 他スレッドのprintと混ざらないよう改行まで1回で書く
+    sys.stdout.write(f"{PROGRESS_PREFIX}{json.dumps(event, ensure_ascii=False)}\n")
+    sys.stdout.flush()
+
+
+def pipeline_command(job):
+    """ジョブ情報から pipeline.py の起動コマンドを作る"""
+    return [
+        sys.executable,
+        'pipeline.py',
+        job['platform'],
+        job['account_id'],
+        job['platform_directory'],
+        job['ncv_directory'],
+        job['lv_value'],
+    ]
+
+
+class PipelineJobHandle:
+    """実行中のパイプライン1件（出力は直近の行だけをリングバッファに保持し、UIから差分で読む）"""
+
+    def __init__(self, job, cmd=None, buffer_lines=OUTPUT_BUFFER_LINES, on_progress=None):
+        self.job = job
+        self.cmd = cmd or pipeline_command(job)
+        self.on_progress = on_progress
+
+        self.lock = threading.Lock()
+        self.lines = deque(maxlen=buffer_lines)   # (連番, 行)
+        self.last_seq = 0
+        self.progress = {}
+        self.process = None
+        self.returncode = None
+        self.started_at = None
+        self.finished_at = None
+        self.done_event = threading.Event()
+        self.callbacks = []
+
+    @property
+    def state(self):
+        if self.returncode is None:
+            return 'running' if self.process else 'starting'
+        return 'done' if self.returncode == 0 else 'failed'
+
+    def start(self):
+        """サブプロセスを起動して即座に戻る（出力は読み取りスレッドが受け取る）"""
+        env = os.environ.copy()
+        env['PYTHONUNBUFFERED'] = '1'
+        env['PYTHONIOENCODING'] = 'utf-8'   # 読み取り側と文字コードを合わせる
+        self.started_at = time.time()
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+            env=env
+        )
+        threading.Thread(target=self._read_output, name=f"pipeline-output-{self.job['lv_value']}", daemon=True).start()
+        return self
+
+    def _read_output(self):
+        try:
+            for line in iter(self.process.stdout.readline, ''):
+                line = line.rstrip('\r\n')
+                # 改行前の他の出力の後ろに進捗行が続く場合もある
+                index = line.find(PROGRESS_PREFIX)
+                if index >= 0 and line.endswith('}'):
+                    self._handle_progress(line[index + len(PROGRESS_PREFIX):])
+                    line = line[:index]
+                    if not line:
+                        continue
+                with self.lock:
+                    self.last_seq += 1
+                    self.lines.append((self.last_seq, line))
+        finally:
+            self.process.stdout.close()
+            self.returncode = self.process.wait()
+            self.finished_at = time.time()
+            with self.lock:
+                self.done_event.set()
+                callbacks = list(self.callbacks)
+            for callback in callbacks:
+                callback(self)
+
+    def _handle_progress(self, payload):
+        try:
+            event = json.loads(payload)
+        except json.JSONDecodeError:
+            return
+        with self.lock:
+            self.progress = event
+        if self.on_progress:
+            self.on_progress(self, event)
+
+    def add_done_callback(self, callback):
+        """終了時に callback(handle) を呼ぶ（終了済みなら即座に呼ぶ）"""
+        with self.lock:
+            if not self.done_event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout=None):
+        self.done_event.wait(timeout)
+        return self.returncode
+
+    def tail(self, since_seq=0, limit=None):
+        """since_seq より後の行を (行リスト, 最新の連番) で返す（バッファから消えた分は読み飛ばす）"""
+        with self.lock:
+            if not self.lines or since_seq >= self.last_seq:
+                return [], self.last_seq
+            first_seq = self.lines[0][0]
+            start = max(0, since_seq - first_seq + 1)
+            lines = [line for _, line in itertools.islice(self.lines, start, None)]
+            last_seq = self.last_seq
+        if limit is not None:
+            lines = lines[-limit:]
+        return lines, last_seq
+
+    def summary(self):
+        """表示用の状態（ジョブ情報と最新の進捗）"""
+        with self.lock:
+            progress = dict(self.progress)
+        return {
+            'job_id': self.job.get('job_id'),
+            'user_name': self.job['user_name'],
+            'lv_value': self.job['lv_value'],
+            'state': self.state,
+            'returncode': self.returncode,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'progress': progress
+        }
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_DB = os.path.join('cache', 'special_user_analysis.sqlite3')
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_PROVIDER_CONCURRENCY = {'openai': 2, 'google': 2}
+DEFAULT_PROMPT_MAX_TOKENS = 6000
+ANALYSIS_FAILED = object()   # run_analyses で分析に失敗したユーザーの結果
+
+_cache = None
+_cache_lock = threading.Lock()
+_provider_lock = threading.Lock()
+_provider_semaphores = {}
+
+
+def estimate_tokens(text):
+    """トークン数の概算（日本語などの非ASCII文字は1文字1トークン、ASCIIは4文字1トークン程度）"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4 + 1
+
+
+def build_comment_lines(comments, format_line, max_tokens=DEFAULT_PROMPT_MAX_TOKENS):
+    """プロンプトに入れるコメント行と注記を返す（上限を超える場合は同じコメントをまとめ、時間順に間引く）"""
+    lines = [format_line(comment) for comment in comments]
+    if sum(estimate_tokens(line) for line in lines) <= max_tokens:
+        return lines, ""
+
+    # 1. 同じ文面の連投を1行にまとめる（最初の投稿位置と回数）
+    grouped = {}
+    for comment in comments:
+        text = comment.get('text', '')
+        if text in grouped:
+            grouped[text][1] += 1
+        else:
+            grouped[text] = [comment, 1]
+    lines = [
+        format_line(comment) + (f" (×{count})" if count > 1 else "")
+        for comment, count in grouped.values()
+    ]
+    costs = [estimate_tokens(line) for line in lines]
+    total = sum(costs)
+    if total <= max_tokens:
+        return lines, f"※同じ内容のコメントはまとめています（全{len(comments)}件 → {len(lines)}行）"
+
+    # 2. 放送全体の傾向が残るよう、時間順に等間隔で抜き出す
+    average = total / len(lines)
+    keep = max(1, int(max_tokens / average))
+    step = len(lines) / keep
+    indexes = sorted({int(i * step) for i in range(keep)} | {len(lines) - 1})
+    sampled = []
+    used = 0
+    for index in indexes:
+        if used + costs[index] > max_tokens and sampled:
+            break
+        sampled.append(lines[index])
+        used += costs[index]
+    return sampled, f"※コメントが多いため全{len(comments)}件から{len(sampled)}件を時間順に抜粋しています"
+
+
+def comment_set_key(*parts, comments=()):
+    """分析結果のキャッシュキー（プロンプト設定とコメントの集合から決まる）"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    for comment in comments:
+        digest.update(json.dumps(
+            [comment.get('no', ''), comment.get('date', ''), comment.get('broadcast_seconds', 0), comment.get('text', '')],
+            ensure_ascii=False
+        ).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """AI分析結果のキャッシュ（同じコメント集合・同じ設定なら再利用）"""
+
+    def __init__(self, db_path=CACHE_DB):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " cache_key TEXT PRIMARY KEY, provider TEXT, result TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def get(self, cache_key):
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM analyses WHERE cache_key = ?", (cache_key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, cache_key, provider, result):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO analyses (cache_key, provider, result, created_at) VALUES (?, ?, ?, ?)",
+                (cache_key, provider, result, time.time())
+            )
+            self.conn.commit()
+
+
+def get_analysis_cache():
+    """プロセス内で共有するキャッシュ"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnalysisCache()
+    return _cache
+
+
+def provider_slot(provider, concurrency=None):
+    """プロバイダーごとの同時呼び出し数を制限するセマフォ"""
+    with _provider_lock:
+        semaphore = _provider_semaphores.get(provider)
+        if semaphore is None:
+            limit = (concurrency or DEFAULT_PROVIDER_CONCURRENCY).get(provider, 1)
+            semaphore = threading.BoundedSemaphore(max(1, int(limit)))
+            _provider_semaphores[provider] = semaphore
+        return semaphore
+
+
+def cached_analysis(provider, cache_key, call, concurrency=None):
+    """キャッシュにあればそれを返し、なければプロバイダーの枠内で call() を実行して保存"""
+    cache = get_analysis_cache()
+    result = cache.get(cache_key)
+    if result is not None:
+        print(f"AI分析キャッシュ使用: {provider} {cache_key[:12]}")
+        return result
+    with provider_slot(provider, concurrency):
+        result = call()
+    if result:
+        cache.put(cache_key, provider, result)
+    return result
+
+
+def run_analyses(users, analyze, max_workers=DEFAULT_MAX_WORKERS):
+    """ユーザーごとの analyze(user_data) を並列実行し {user_id: 結果} を返す（失敗したユーザーは ANALYSIS_FAILED）"""
+    results = {}
+    if not users:
+        return results
+
+    def run_one(user_data):
+        try:
+            return user_data['user_id'], analyze(user_data)
+        except Exception as e:
+            print(f"スペシャルユーザー分析エラー: {user_data['user_id']} ({str(e)})")
+            return user_data['user_id'], ANALYSIS_FAILED
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(users))), thread_name_prefix='special-user-analysis') as executor:
+        for user_id, result in executor.map(run_one, users):
+            results[user_id] = ANALYSIS_FAILED if result is None else result
+    return results
@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import threading
+from datetime import datetime
+
+from pipeline_modules.fs_index import get_account_index
+from pipeline_modules.atomic_io import atomic_write, read_json
+
+_lock = threading.Lock()
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class SpecialUserHistory:
+    """スペシャルユーザーごとの出演履歴（{user_id}_history.jsonl に追記、同じ放送は最後の行が有効）"""
+
+    def __init__(self, output_dir, user_id):
+        self.output_dir = output_dir
+        self.user_id = user_id
+        self.path = os.path.join(output_dir, f"{user_id}_history.jsonl")
+        self.entries = {}       # lv_value → 最新の記録
+        self.line_count = 0
+        self.rebuilt = False    # 今回の読み込みで履歴ファイルを新規に構築したか
+        self.load()
+
+    def load(self):
+        """履歴を読み込み（未作成なら既存の個別ページと放送データから一度だけ構築）"""
+        if not os.path.exists(self.path):
+            self.rebuild()
+            self.rebuilt = True
+            return
+
+        entries = {}
+        line_count = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 書き込み途中で止まった最終行などは無視
+                    continue
+                entries[entry['lv_value']] = entry
+                line_count += 1
+        self.entries = entries
+        self.line_count = line_count
+
+    def rebuild(self):
+        """既存の個別ページ（{user_id}_{lv}_detail.html）から対象放送を拾い、comments.jsonから履歴を作る"""
+        account_dir = os.path.dirname(self.output_dir)
+        pattern = re.compile(rf"^{re.escape(self.user_id)}_(lv\d+)_detail\.html$")
+        lv_values = []
+        if os.path.isdir(self.output_dir):
+            for name in os.listdir(self.output_dir):
+                match = pattern.match(name)
+                if match:
+                    lv_values.append(match.group(1))
+
+        account_index = get_account_index(account_dir)
+        entries = {}
+        for lv_value in lv_values:
+            comments_path = os.path.join(account_dir, lv_value, f"{lv_value}_comments.json")
+            data_path = account_index.data_json(lv_value)
+            try:
+                comments_data = read_json(comments_path)
+                broadcast_data = {}
+                if data_path:
+                    with open(data_path, 'r', encoding='utf-8') as f:
+                        broadcast_data = json.load(f)
+            except (OSError, ValueError):
+                continue
+
+            comments = [
+                {
+                    'no': c.get('no', ''),
+                    'date': c.get('date', ''),
+                    'broadcast_seconds': c.get('broadcast_seconds', 0),
+                    'text': c.get('text', ''),
+                    'premium': c.get('premium', ''),
+                    'name': c.get('user_name', '')
+                }
+                for c in comments_data.get('comments', []) if c.get('user_id') == self.user_id
+            ]
+            if comments:
+                entries[lv_value] = self._make_entry(lv_value, broadcast_data, comments[0]['name'], comments)
+
+        self.entries = entries
+        self._rewrite()
+        if entries:
+            print(f"スペシャルユーザー履歴を構築: {self.user_id} ({len(entries)}件)")
+
+    def _make_entry(self, lv_value, broadcast_data, user_name, comments):
+        return {
+            'lv_value': lv_value,
+            'start_time': broadcast_data.get('start_time', ''),
+            'live_title': broadcast_data.get('live_title', ''),
+            'user_name': user_name,
+            'comments': comments
+        }
+
+    def _rewrite(self):
+        """有効な記録だけで書き直す（古い行の整理）"""
+        atomic_write(self.path, ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in self.ordered()))
+        self.line_count = len(self.entries)
+
+    def record(self, lv_value, broadcast_data, user_name, comments):
+        """放送の記録を追記し 'added' / 'updated' を返す（内容が同じならNone、何も書かない）"""
+        entry = self._make_entry(lv_value, broadcast_data, user_name, comments)
+        with _lock:
+            previous = self.entries.get(lv_value)
+            if previous is not None and all(previous.get(key) == value for key, value in entry.items()):
+                return None
+
+            entry['recorded_at'] = datetime.now().isoformat()
+            self.entries[lv_value] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.line_count += 1
+
+            # 再処理で無効になった行が増えたら整理
+            if self.line_count > 2 * len(self.entries) + 10:
+                self._rewrite()
+            return 'added' if previous is None else 'updated'
+
+    def ordered(self):
+        """放送開始時刻の古い順"""
+        return sorted(self.entries.values(), key=lambda e: (_to_int(e.get('start_time')), e['lv_value']))
+
+    def pages(self, page_size):
+        """ページ分割（page_sizeが0なら1ページ）"""
+        entries = self.ordered()
+        if not page_size or page_size <= 0:
+            return [entries]
+        return [entries[i:i + page_size] for i in range(0, len(entries), page_size)] or [[]]
+
+    def page_of(self, lv_value, page_size):
+        """放送が載るページ番号（1始まり）"""
+        if not page_size or page_size <= 0:
+            return 1
+        lv_values = [e['lv_value'] for e in self.ordered()]
+        return lv_values.index(lv_value) // page_size + 1
@@ -0,0 +1,128 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+from pipeline_modules.atomic_io import atomic_write
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+ASSET_DIRS = ('css', 'js', 'assets')
+STATIC_DIR_NAME = 'static'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 8
+
+# テンプレート内の相対参照（href="css/main.css" など）
+ASSET_LINK = re.compile(r'((?:href|src)\s*=\s*["\'])((?:css|js|assets)/[^"\'?#]+)')
+
+_lock = threading.Lock()
+_published = {}   # account_dir → StaticAssets（プロセス内で一度だけ公開）
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hashed_name(logical_path, digest):
+    """css/main.css → css/main.{hash8}.css"""
+    base, ext = os.path.splitext(logical_path)
+    return f"{base}.{digest[:HASH_LENGTH]}{ext}"
+
+
+class StaticAssets:
+    """アカウント共通の静的ファイル置き場（{account_dir}/static/ に内容ハッシュ付きの名前で1回だけ公開）"""
+
+    def __init__(self, account_dir, template_dir=TEMPLATE_DIR):
+        self.account_dir = account_dir
+        self.template_dir = template_dir
+        self.static_dir = os.path.join(account_dir, STATIC_DIR_NAME)
+        self.manifest_path = os.path.join(self.static_dir, MANIFEST_NAME)
+        self.assets = {}   # 論理パス → {'path': ハッシュ付きパス, 'size', 'mtime_ns', 'sha256'}
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('assets', {})
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_manifest(self):
+        atomic_write(self.manifest_path, json.dumps({'assets': self.assets}, ensure_ascii=False, indent=2, sort_keys=True))
+
+    def _source_files(self):
+        for asset_dir in ASSET_DIRS:
+            root_dir = os.path.join(self.template_dir, asset_dir)
+            for root, _, files in os.walk(root_dir):
+                for name in files:
+                    src_path = os.path.join(root, name)
+                    logical_path = os.path.relpath(src_path, self.template_dir).replace(os.sep, '/')
+                    yield logical_path, src_path
+
+    def publish(self):
+        """変更のあったファイルだけをハッシュ付きの名前でコピーし、マニフェストを更新"""
+        previous = self._load_manifest()
+        assets = {}
+        published = 0
+
+        for logical_path, src_path in self._source_files():
+            stat = os.stat(src_path)
+            entry = previous.get(logical_path)
+            target_path = None
+            if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+                # 元ファイルが変わっていなければハッシュ計算も省略
+                target_path = os.path.join(self.static_dir, *entry['path'].split('/'))
+                if os.path.exists(target_path):
+                    assets[logical_path] = entry
+                    continue
+
+            digest = _file_digest(src_path)
+            hashed_path = _hashed_name(logical_path, digest)
+            target_path = os.path.join(self.static_dir, *hashed_path.split('/'))
+            if not os.path.exists(target_path):
+                with open(src_path, 'rb') as src:
+                    atomic_write(target_path, src.read())
+                published += 1
+
+            assets[logical_path] = {
+                'path': hashed_path,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': digest
+            }
+
+        self.assets = assets
+        if assets != previous:
+            os.makedirs(self.static_dir, exist_ok=True)
+            self._save_manifest()
+        if published:
+            print(f"静的ファイル公開: {published}件 → {self.static_dir}")
+        return self
+
+    def url(self, logical_path, prefix='../'):
+        """ページから見た参照パス（prefix はページからアカウントディレクトリへの相対パス）"""
+        entry = self.assets.get(logical_path)
+        path = entry['path'] if entry else logical_path
+        return f"{prefix}{STATIC_DIR_NAME}/{path}"
+
+    def rewrite_links(self, html_content, prefix='../'):
+        """HTML内の css/ js/ assets/ への相対参照を公開済みのパスに置き換える"""
+        def replace(match):
+            if match.group(2) not in self.assets:
+                return match.group(0)
+            return match.group(1) + self.url(match.group(2), prefix)
+        return ASSET_LINK.sub(replace, html_content)
+
+
+def publish_static_assets(account_dir, template_dir=TEMPLATE_DIR):
+    """アカウントの静的ファイルを公開（同じプロセス内では2回目以降は公開済みのものを返す）"""
+    key = (os.path.abspath(account_dir), template_dir)
+    with _lock:
+        assets = _published.get(key)
+        if assets is None:
+            assets = StaticAssets(account_dir, template_dir).publish()
+            _published[key] = assets
+        return assets
@@ -0,0 +1,162 @@
+import signal
+import traceback
+import multiprocessing
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+try:
+    import resource  # POSIXのみ
+except ImportError:
+    resource = None
+
+# ステップの実行方式
+EXECUTOR_PROCESS = 'process'      # ステップごとに新しいプロセス（終了時にメモリをOSへ返す）
+EXECUTOR_INPROCESS = 'inprocess'  # パイプライン本体のスレッド（読み込み済みモデルを共有できる）
+EXECUTORS = (EXECUTOR_PROCESS, EXECUTOR_INPROCESS)
+
+POLL_INTERVAL = 0.5
+
+
+class StepLimitExceeded(Exception):
+    """ステップがメモリ・CPU時間の上限を超えたため強制終了した"""
+
+
+def _apply_cpu_limit(max_cpu_seconds):
+    """CPU時間の上限をOSに設定（POSIXのみ。超えるとSIGXCPUで終了）"""
+    if not max_cpu_seconds or resource is None:
+        return
+    try:
+        limit = int(max_cpu_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (limit, limit + 5))
+    except (ValueError, OSError) as e:
+        print(f"CPU時間上限の設定に失敗: {str(e)}")
+
+
+def _child_main(conn, target, step_name, pipeline_data, max_cpu_seconds):
+    """子プロセス側：ステップを実行して結果をパイプで親に返す"""
+    _apply_cpu_limit(max_cpu_seconds)
+    try:
+        message = ('ok', target(step_name, pipeline_data))
+    except BaseException as e:
+        traceback.print_exc()
+        message = ('error', e)
+
+    try:
+        conn.send(message)
+    except Exception as e:
+        # 結果や例外がpickleできない場合は内容を文字列で返す
+        if message[0] == 'ok':
+            conn.send(('error', RuntimeError(f"{step_name} の結果を親プロセスに返せません: {str(e)}")))
+        else:
+            conn.send(('error', RuntimeError(f"{type(message[1]).__name__}: {message[1]}")))
+    finally:
+        conn.close()
+
+
+def _process_tree(pid):
+    """子プロセス（ffmpegなど孫プロセスを含む）の一覧"""
+    try:
+        parent = psutil.Process(pid)
+        return [parent] + parent.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def _usage(pid):
+    """プロセスツリー全体の (RSS[MB], CPU時間[秒])"""
+    rss = 0
+    cpu = 0.0
+    for proc in _process_tree(pid):
+        try:
+            rss += proc.memory_info().rss
+            times = proc.cpu_times()
+            cpu += times.user + times.system
+        except psutil.Error:
+            continue
+    return rss / (1024 * 1024), cpu
+
+
+def _kill_tree(pid):
+    for proc in reversed(_process_tree(pid)):
+        try:
+            proc.kill()
+        except psutil.Error:
+            continue
+
+
+class IsolatedStepRunner:
+    """ステップを使い捨てのプロセスで実行し、メモリ（RSS）・CPU時間の上限を監視する"""
+
+    def __init__(self, log=print):
+        self.log = log
+        self.context = multiprocessing.get_context('spawn')
+        self._warned = False
+
+    def run(self, target, step_name, pipeline_data, limits=None):
+        """target(step_name, pipeline_data) を子プロセスで実行して戻り値を返す（上限超過・異常終了は例外）"""
+        limits = limits or {}
+        max_rss_mb = limits.get('max_rss_mb', 0)
+        max_cpu_seconds = limits.get('max_cpu_seconds', 0)
+        if (max_rss_mb or max_cpu_seconds) and not PSUTIL_AVAILABLE and not self._warned:
+            self._warned = True
+            self.log("psutilがないためメモリ上限を監視できません（CPU時間はPOSIXのみOS側で制限）")
+
+        parent_conn, child_conn = self.context.Pipe(duplex=False)
+        proc = self.context.Process(
+            target=_child_main,
+            args=(child_conn, target, step_name, pipeline_data, max_cpu_seconds),
+            name=f"step-{step_name}",
+            daemon=True
+        )
+        proc.start()
+        child_conn.close()
+
+        message = None
+        peak_rss = 0.0
+        try:
+            while True:
+                # 大きな結果でも子が書き込みで詰まらないよう、終了を待つ前に受信する
+                if parent_conn.poll(POLL_INTERVAL):
+                    try:
+                        message = parent_conn.recv()
+                    except EOFError:
+                        pass
+                    break
+                if not proc.is_alive():
+                    break
+
+                if PSUTIL_AVAILABLE and (max_rss_mb or max_cpu_seconds):
+                    rss_mb, cpu_seconds = _usage(proc.pid)
+                    peak_rss = max(peak_rss, rss_mb)
+                    exceeded = None
+                    if max_rss_mb and rss_mb > max_rss_mb:
+                        exceeded = f"メモリ {rss_mb:.0f}MB > 上限 {max_rss_mb}MB"
+                    elif max_cpu_seconds and cpu_seconds > max_cpu_seconds:
+                        exceeded = f"CPU時間 {cpu_seconds:.0f}秒 > 上限 {max_cpu_seconds}秒"
+                    if exceeded:
+                        _kill_tree(proc.pid)
+                        raise StepLimitExceeded(f"{step_name} を強制終了しました（{exceeded}）")
+
+            proc.join(timeout=30)
+        finally:
+            parent_conn.close()
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+
+        if peak_rss:
+            self.log(f"{step_name} 最大メモリ: {peak_rss:.0f}MB")
+
+        if message is None:
+            if max_cpu_seconds and proc.exitcode == -getattr(signal, 'SIGXCPU', 0):
+                raise StepLimitExceeded(f"{step_name} を強制終了しました（CPU時間が上限 {max_cpu_seconds}秒を超過）")
+            raise Exception(f"{step_name} のプロセスが異常終了しました（終了コード {proc.exitcode}）")
+        status, payload = message
+        if status == 'error':
+            raise payload
+        return payload
@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+from utils import save_json_atomic
+from pipeline_modules.fs_index import get_account_index
+from pipeline_modules.atomic_io import existing_variant
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROCESSORS_DIR = os.path.join(ROOT_DIR, 'processors')
+
+
+def _hash_value(value):
+    """JSON化できる値のハッシュ（キー順に依存しない）"""
+    encoded = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def _hash_file(path):
+    """ファイル内容のハッシュ（存在しなければNone）"""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_code_paths(paths):
+    """ステップが使うモジュール・テンプレート（リポジトリからの相対パス、ディレクトリは配下の全ファイル）のハッシュ"""
+    hashes = {}
+    for relative_path in paths:
+        path = os.path.join(ROOT_DIR, relative_path)
+        if os.path.isdir(path):
+            digest = hashlib.sha1()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    digest.update(os.path.relpath(file_path, path).replace(os.sep, '/').encode('utf-8'))
+                    digest.update((_hash_file(file_path) or '').encode('ascii'))
+            hashes[relative_path] = digest.hexdigest()
+        else:
+            hashes[relative_path] = _hash_file(path)
+    return hashes
+
+
+def _config_subset(config, keys):
+    """ドット区切りのキー一覧で設定の一部を取り出す"""
+    subset = {}
+    for key in keys:
+        value = config
+        for part in key.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        subset[key] = value
+    return subset
+
+
+class StepManifest:
+    """放送ごとのステップ実行記録（入力フィンガープリントと出力）で、変化のないステップを再実行しない"""
+
+    def __init__(self, broadcast_doc, dependencies, step_inputs, config,
+                 always_run=(), force_steps=(), force_all=False):
+        self.doc = broadcast_doc
+        self.dependencies = dependencies
+        self.step_inputs = step_inputs
+        self.config = config
+        self.always_run = set(always_run)
+        self.force_steps = set(force_steps)
+        self.force_all = force_all
+
+        self.lock = threading.Lock()
+        self.path = os.path.join(broadcast_doc.broadcast_dir, f"{broadcast_doc.lv_value}_pipeline_manifest.json")
+        self.steps = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('steps', {})
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"ステップ記録の読み込みに失敗（全ステップを再実行）: {str(e)}")
+            return {}
+
+    def _save(self):
+        save_json_atomic(self.path, {
+            'lv_value': self.doc.lv_value,
+            'updated_at': datetime.now().isoformat(),
+            'steps': self.steps
+        })
+
+    # ---- フィンガープリント ----
+
+    def _media_inputs(self, kinds):
+        """動画・XMLの入力情報（動画はサイズと更新時刻、XMLは内容ハッシュ）"""
+        inputs = {}
+        if 'mp4' in kinds:
+            account_dir = os.path.dirname(self.doc.broadcast_dir)
+            mp4_path = get_account_index(account_dir).mp4(self.doc.lv_value)
+            if mp4_path and os.path.exists(mp4_path):
+                stat = os.stat(mp4_path)
+                inputs['mp4'] = {'name': os.path.basename(mp4_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            else:
+                inputs['mp4'] = None
+        if 'xml' in kinds:
+            xml_path = self.doc.get('ncv_xml_path', '') if self.doc.exists('data') else ''
+            inputs['xml'] = _hash_file(xml_path)
+        return inputs
+
+    def fingerprint(self, step_name):
+        """ステップの入力フィンガープリント（コード・設定・入力ファイル・上流ステップ）"""
+        spec = self.step_inputs.get(step_name, {})
+        inputs = {
+            'source': _hash_file(os.path.join(PROCESSORS_DIR, f"{step_name}.py")),
+            'code': _hash_code_paths(spec.get('code', [])),
+            'config': _hash_value(_config_subset(self.config, spec.get('config', []))),
+            'media': self._media_inputs(spec.get('media', [])),
+            'upstream': {}
+        }
+        with self.lock:
+            for dep in self.dependencies.get(step_name, []):
+                # 上流が再実行されたら（入力が同じでも出力は作り直されるため）後続も再実行
+                entry = self.steps.get(dep, {})
+                inputs['upstream'][dep] = f"{entry.get('fingerprint') or entry.get('status')}@{entry.get('finished_at')}"
+        return _hash_value(inputs), inputs
+
+    # ---- 判定・記録 ----
+
+    def _outputs(self, step_name):
+        """ステップの出力ファイル（放送ディレクトリからの相対パス）"""
+        lv_value = self.doc.lv_value
+        outputs = [name.format(lv=lv_value) for name in self.step_inputs.get(step_name, {}).get('outputs', [])]
+        if step_name == 'step12_html_generator' and self.doc.exists('data'):
+            html_file = self.doc.get('html_file_path')
+            if html_file:
+                outputs.append(html_file)
+        return outputs
+
+    def is_fresh(self, step_name):
+        """前回の実行結果をそのまま使えるか（入力が同じで出力が残っている）"""
+        if self.force_all or step_name in self.force_steps or step_name in self.always_run:
+            return False
+
+        with self.lock:
+            entry = self.steps.get(step_name)
+        if not entry or entry.get('status') != 'ok':
+            return False
+
+        fingerprint, _ = self.fingerprint(step_name)
+        if fingerprint != entry.get('fingerprint'):
+            return False
+
+        for output in entry.get('outputs', []):
+            if existing_variant(os.path.join(self.doc.broadcast_dir, output)) is None:
+                print(f"出力ファイルがないため再実行: {step_name} ({output})")
+                return False
+        return True
+
+    def record(self, step_name, timing):
+        """ステップの実行結果を記録"""
+        status = timing['status']
+        entry = {'status': status, 'finished_at': datetime.now().isoformat(), 'seconds': timing.get('seconds', 0.0)}
+
+        if status == 'ok':
+            fingerprint, inputs = self.fingerprint(step_name)
+            entry.update({
+                'fingerprint': fingerprint,
+                'inputs': inputs,
+                'outputs': [o for o in self._outputs(step_name) if existing_variant(os.path.join(self.doc.broadcast_dir, o))]
+            })
+        elif status == 'cached':
+            # 前回の記録をそのまま残す
+            return
+        elif status in ('disabled', 'skipped'):
+            # 状態が変わらなければ記録を更新しない（後続ステップを再実行させない）
+            with self.lock:
+                if self.steps.get(step_name, {}).get('status') == status:
+                    return
+        elif status in ('error', 'failed'):
+            entry['error'] = timing.get('error', '')
+
+        with self.lock:
+            self.steps[step_name] = entry
+            try:
+                self._save()
+            except OSError as e:
+                print(f"ステップ記録の保存に失敗: {str(e)}")
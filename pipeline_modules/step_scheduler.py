@@ -0,0 +1,238 @@
+import time
+import importlib
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pipeline_modules.step_isolation import IsolatedStepRunner, EXECUTORS, EXECUTOR_PROCESS, EXECUTOR_INPROCESS
+
+
+def run_step(step_name, pipeline_data):
+    """ステップを1つ実行して (状態, 結果, 所要秒数, ドキュメント変更) を返す（プロセス実行時もこの関数を呼ぶ）"""
+    started = time.perf_counter()
+    module = importlib.import_module(f"processors.{step_name}")
+    if not hasattr(module, 'process'):
+        return 'no_process', None, time.perf_counter() - started, None
+    result = module.process(pipeline_data)
+
+    # ステップ単位で放送ドキュメントの変更をまとめて書き出す
+    changes = None
+    doc = pipeline_data.get('broadcast_doc')
+    if doc is not None:
+        doc.flush()
+        changes = doc.export_changes()
+    return 'ok', result, time.perf_counter() - started, changes
+
+
+class StepScheduler:
+    """依存関係グラフに従って、実行可能になったステップを並列に実行する"""
+
+    def __init__(self, dependencies, process_steps=(), max_workers=4, max_process_workers=2, log_prefix="",
+                 step_executors=None, step_limits=None, on_progress=None, critical_steps=()):
+        self.dependencies = dependencies
+        # 失敗すると後続ステップを実行しても意味がないステップ（後続はまとめて省略）
+        self.critical_steps = set(critical_steps)
+        self.on_progress = on_progress
+        self.max_workers = max_workers
+        self.max_process_workers = max_process_workers
+        self.log_prefix = log_prefix
+        self.step_limits = step_limits or {}
+
+        # 既定では process_steps を別プロセス、それ以外をスレッドで実行（設定で個別に上書き）
+        self.executors = {
+            step_name: EXECUTOR_PROCESS if step_name in process_steps else EXECUTOR_INPROCESS
+            for step_name in dependencies
+        }
+        for step_name, executor in (step_executors or {}).items():
+            if step_name not in dependencies:
+                raise ValueError(f"実行方式の指定先 {step_name} が定義されていません")
+            if executor not in EXECUTORS:
+                raise ValueError(f"{step_name} の実行方式 {executor} は不明です（{', '.join(EXECUTORS)}）")
+            self.executors[step_name] = executor
+        self.process_steps = {name for name, executor in self.executors.items() if executor == EXECUTOR_PROCESS}
+
+        # 未定義ステップへの依存は設定ミスなので起動時に検出
+        for step_name, deps in dependencies.items():
+            for dep in deps:
+                if dep not in dependencies:
+                    raise ValueError(f"{step_name} の依存先 {dep} が定義されていません")
+
+    def log(self, message):
+        print(f"{self.log_prefix}{message}", flush=True)
+
+    def _expected_seconds(self, checkpoint, timings):
+        """ステップごとの見込み所要秒数（前回の実行記録、なければ今回実行したステップの平均）"""
+        executed = [t['seconds'] for t in timings.values() if t['status'] == 'ok']
+        average = sum(executed) / len(executed) if executed else None
+        expected = {}
+        for step_name in self.dependencies:
+            previous = checkpoint.steps.get(step_name, {}) if checkpoint else {}
+            if previous.get('status') == 'ok' and previous.get('seconds'):
+                expected[step_name] = previous['seconds']
+            else:
+                expected[step_name] = average
+        return expected
+
+    def _report(self, step_name, status, timings, running, checkpoint, run_started):
+        """進捗イベントを通知（残り時間は未完了ステップの依存関係上の最長経路で見積もる）"""
+        if not self.on_progress:
+            return
+        now = time.perf_counter()
+        expected = self._expected_seconds(checkpoint, timings)
+        running_since = {name: started for name, started in running.values()}
+
+        finish_at = {}
+        def remaining(name):
+            if name in timings:
+                return 0.0
+            if name not in finish_at:
+                duration = expected[name]
+                if duration is None:
+                    finish_at[name] = None
+                    return None
+                if name in running_since:
+                    duration = max(0.0, duration - (now - running_since[name]))
+                upstream = [remaining(dep) for dep in self.dependencies[name]]
+                if any(value is None for value in upstream):
+                    finish_at[name] = None
+                else:
+                    finish_at[name] = max(upstream, default=0.0) + duration
+            return finish_at[name]
+
+        estimates = [remaining(name) for name in self.dependencies]
+        eta = None if any(value is None for value in estimates) else round(max(estimates, default=0.0), 1)
+        done = len(timings)
+        total = len(self.dependencies)
+        self.on_progress({
+            'step': step_name,
+            'status': status,
+            'done': done,
+            'total': total,
+            'percent': round(done * 100 / total, 1),
+            'running': sorted(running_since),
+            'step_seconds': timings.get(step_name, {}).get('seconds'),
+            'elapsed': round(now - run_started, 1),
+            'eta_seconds': eta
+        })
+
+    def run(self, pipeline_data, should_run, checkpoint=None):
+        """全ステップを実行し、ステップごとの所要時間を返す（checkpointがあれば入力が変わらないステップを省略）"""
+        timings = {}
+        pending = list(self.dependencies.keys())
+        finished = set()
+        blocked = set()   # 必須ステップの失敗で結果が得られなかったステップ（後続も実行しない）
+        running = {}
+        run_started = time.perf_counter()
+
+        # 設定で無効なステップは即完了扱い（後続ステップは待たせない）
+        for step_name in list(pending):
+            if not should_run(step_name):
+                self.log(f"スキップ: {step_name} (設定により無効)")
+                timings[step_name] = {'status': 'disabled', 'seconds': 0.0}
+                finished.add(step_name)
+                pending.remove(step_name)
+                if checkpoint:
+                    checkpoint.record(step_name, timings[step_name])
+                self._report(step_name, 'disabled', timings, running, checkpoint, run_started)
+
+        thread_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        # 別プロセス実行のステップは同時実行数を絞り、ステップごとに使い捨てのプロセスで実行
+        process_pool = None
+        if self.process_steps & set(pending):
+            process_pool = ThreadPoolExecutor(max_workers=self.max_process_workers)
+            runner = IsolatedStepRunner(log=self.log)
+
+        try:
+            while pending or running:
+                # 依存ステップがすべて終わったものを投入（省略したステップの後続もまとめて判定）
+                ready = True
+                while ready:
+                    ready = False
+                    for step_name in list(pending):
+                        if not all(dep in finished for dep in self.dependencies[step_name]):
+                            continue
+                        pending.remove(step_name)
+                        failed_deps = [dep for dep in self.dependencies[step_name] if dep in blocked]
+                        if failed_deps:
+                            self.log(f"スキップ: {step_name} (依存ステップが失敗: {', '.join(failed_deps)})")
+                            timings[step_name] = {'status': 'skipped', 'seconds': 0.0,
+                                                  'error': f"依存ステップが失敗: {', '.join(failed_deps)}"}
+                            blocked.add(step_name)
+                            finished.add(step_name)
+                            if checkpoint:
+                                checkpoint.record(step_name, timings[step_name])
+                            self._report(step_name, 'skipped', timings, running, checkpoint, run_started)
+                            ready = True
+                            continue
+                        if checkpoint and checkpoint.is_fresh(step_name):
+                            self.log(f"スキップ: {step_name} (入力に変更なし)")
+                            timings[step_name] = {'status': 'cached', 'seconds': 0.0}
+                            finished.add(step_name)
+                            self._report(step_name, 'cached', timings, running, checkpoint, run_started)
+                            ready = True
+                            continue
+                        self.log(f"実行中: {step_name}")
+                        if step_name in self.process_steps:
+                            future = process_pool.submit(
+                                runner.run, run_step, step_name, pipeline_data, self.step_limits.get(step_name)
+                            )
+                        else:
+                            future = thread_pool.submit(run_step, step_name, pipeline_data)
+                        running[future] = (step_name, time.perf_counter())
+                        self._report(step_name, 'running', timings, running, checkpoint, run_started)
+
+                if not running:
+                    if not pending:
+                        break
+                    # 依存が解決できない（循環参照）
+                    raise Exception(f"依存関係を解決できないステップがあります: {pending}")
+
+                done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_name, started = running.pop(future)
+                    timings[step_name] = self._collect(step_name, future, started, pipeline_data)
+                    if checkpoint:
+                        checkpoint.record(step_name, timings[step_name])
+                    # エラーが発生してもパイプラインは継続（必須ステップの失敗時はその後続だけ省略）
+                    if step_name in self.critical_steps and timings[step_name]['status'] in ('error', 'failed'):
+                        blocked.add(step_name)
+                    finished.add(step_name)
+                    self._report(step_name, timings[step_name]['status'], timings, running, checkpoint, run_started)
+        finally:
+            thread_pool.shutdown(wait=True)
+            if process_pool:
+                process_pool.shutdown(wait=True)
+
+        return timings
+
+    def _collect(self, step_name, future, started, pipeline_data):
+        """完了したステップの結果を取り込み、所要時間を記録"""
+        elapsed = time.perf_counter() - started
+        try:
+            status, result, step_seconds, changes = future.result()
+            if status == 'no_process':
+                self.log(f"スキップ: {step_name} (process関数なし)")
+                return {'status': 'skipped', 'seconds': round(elapsed, 3)}
+
+            # 別プロセスで実行したステップの変更を親のドキュメントに反映
+            doc = pipeline_data.get('broadcast_doc')
+            if step_name in self.process_steps and doc is not None:
+                doc.apply_changes(changes)
+
+            pipeline_data['results'][step_name] = result
+            if isinstance(result, dict) and result.get('status') == 'failed':
+                # 例外にはしないが結果が得られなかったステップ（次回の再開時に再実行する）
+                reason = result.get('reason', '')
+                self.log(f"失敗: {step_name} ({reason}, {step_seconds:.1f}秒)")
+                return {'status': 'failed', 'seconds': round(step_seconds, 3), 'error': reason}
+            self.log(f"完了: {step_name} ({step_seconds:.1f}秒)")
+            return {'status': 'ok', 'seconds': round(step_seconds, 3)}
+
+        except ImportError as e:
+            self.log(f"スキップ: {step_name} (モジュールなし)")
+            self.log(f"ImportError詳細: {e}")
+            return {'status': 'skipped', 'seconds': round(elapsed, 3)}
+        except Exception as e:
+            self.log(f"エラー: {step_name} - {str(e)}")
+            self.log(f"Exception詳細: {type(e).__name__}: {e}")
+            traceback.print_exception(type(e), e, e.__traceback__)
+            return {'status': 'error', 'seconds': round(elapsed, 3), 'error': str(e)}
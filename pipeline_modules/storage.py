@@ -0,0 +1,131 @@
+import os
+import re
+
+from pipeline_modules.atomic_io import (
+    atomic_write, atomic_write_json, compress_bytes, COMPRESSION_SUFFIXES, ZSTD_AVAILABLE
+)
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+DEFAULT_STORAGE_SETTINGS = {
+    "json_compression": "none",          # none / zstd / gzip（文字起こし・コメント・ランキング）
+    "json_indent": 2,                    # 非圧縮時の整形（None で1行）
+    "html_precompress": [],              # gzip / br（静的配信用に .html.gz / .html.br を併置）
+    "cleanup_intermediate_audio": False  # 文字起こし成功後に分割音声などを削除（全体音声は削除または付け替え）
+}
+
+HTML_PRECOMPRESS_SUFFIXES = {'gzip': '.gz', 'br': '.br'}
+
+_warned = set()
+
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        print(message)
+
+
+def storage_settings(config):
+    """設定の storage_settings を既定値に重ねて返す"""
+    settings = dict(DEFAULT_STORAGE_SETTINGS)
+    settings.update((config or {}).get('storage_settings', {}))
+    return settings
+
+
+def json_compression(settings):
+    """実際に使う圧縮形式（zstandardがなければgzipで代用、非圧縮なら None）"""
+    compression = (settings or {}).get('json_compression') or 'none'
+    if compression == 'none':
+        return None
+    if compression == 'zstd' and not ZSTD_AVAILABLE:
+        _warn_once("警告: json_compression=zstd ですがzstandardがインストールされていないためgzipで保存します")
+        return 'gzip'
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"未対応の圧縮形式: {compression}")
+    return compression
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def write_json(path, obj, settings=None, checksum=False):
+    """設定に従ってJSONを書き出し（圧縮時は path + .zst / .gz）、他の形式の古いファイルは削除して実際のパスを返す"""
+    settings = settings or DEFAULT_STORAGE_SETTINGS
+    compression = json_compression(settings)
+    target = path + COMPRESSION_SUFFIXES[compression] if compression else path
+    # 圧縮する場合は整形しない（空白は圧縮後の大きさにほぼ効かず、展開後のメモリだけ増える）
+    indent = None if compression else settings.get('json_indent', 2)
+    atomic_write_json(target, obj, indent=indent, compress=compression, checksum=checksum)
+
+    for stale in [path] + [path + suffix for suffix in COMPRESSION_SUFFIXES.values()]:
+        if stale != target:
+            _remove_quietly(stale)
+    return target
+
+
+def write_html(path, content, settings=None, checksum=False):
+    """HTMLを書き出し、設定があれば事前圧縮版（.gz / .br）も併置する"""
+    settings = settings or DEFAULT_STORAGE_SETTINGS
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    atomic_write(path, data, checksum=checksum)
+
+    precompress = settings.get('html_precompress') or []
+    for encoding, suffix in HTML_PRECOMPRESS_SUFFIXES.items():
+        sibling = path + suffix
+        if encoding not in precompress:
+            # 設定から外した形式の古い圧縮版が残ると、本体と内容が食い違ったまま配信される
+            _remove_quietly(sibling)
+            continue
+        if encoding == 'br':
+            if not BROTLI_AVAILABLE:
+                _warn_once("警告: brotliがインストールされていないため .br の生成をスキップします")
+                continue
+            atomic_write(sibling, brotli.compress(data, quality=11, mode=brotli.MODE_TEXT), fsync=False)
+        else:
+            atomic_write(sibling, compress_bytes(data, 'gzip'), fsync=False)
+    return path
+
+
+def cleanup_intermediate_audio(broadcast_dir, lv_value):
+    """文字起こし後の中間音声を整理し、削除したバイト数を返す
+
+    分割チャンクは文字起こし専用なので削除する。プレイヤーは {lv}_silent_audio.mp3 を参照するため、
+    無音追加版がなければ全体音声をその名前に付け替え、あれば全体音声を削除する。
+    """
+    chunk_pattern = re.compile(rf"^{re.escape(lv_value)}_audio_chunk_\d+\.mp3$")
+    full_audio_path = os.path.join(broadcast_dir, f"{lv_value}_full_audio.mp3")
+    silent_audio_path = os.path.join(broadcast_dir, f"{lv_value}_silent_audio.mp3")
+
+    freed = 0
+    try:
+        names = os.listdir(broadcast_dir)
+    except OSError:
+        return 0
+    for name in names:
+        if chunk_pattern.match(name):
+            chunk_path = os.path.join(broadcast_dir, name)
+            size = os.path.getsize(chunk_path)
+            if _remove_quietly(chunk_path):
+                freed += size
+
+    if os.path.exists(full_audio_path):
+        if os.path.exists(silent_audio_path):
+            size = os.path.getsize(full_audio_path)
+            if _remove_quietly(full_audio_path):
+                freed += size
+        else:
+            os.replace(full_audio_path, silent_audio_path)
+
+    if freed:
+        print(f"中間音声を削除: {freed / 1024 / 1024:.1f}MB")
+    return freed
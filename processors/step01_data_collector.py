@@ -1,14 +1,17 @@
 import os
 import re
-import json
 import time
 import xml.etree.ElementTree as ET
 import requests
 from datetime import datetime
-import subprocess
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import find_account_directory
+from utils import find_account_directory, save_json_atomic
+from pipeline_modules.atomic_io import atomic_write
+from pipeline_modules.fs_index import get_directory_index, get_account_index
+from pipeline_modules.broadcast_history import get_broadcast_history
+from pipeline_modules.broadcast_document import get_broadcast_document
+from pipeline_modules.media_probe import get_duration
 
 
 def process(pipeline_data):
@@ -43,7 +46,7 @@ def process(pipeline_data):
         video_duration = get_video_duration(pipeline_data)
         
         # 6. 前回放送の要約文取得
-        previous_summary = get_previous_broadcast_summary(platform_directory, account_id, lv_value)
+        previous_summary = get_previous_broadcast_summary(platform_directory, account_id, lv_value, ncv_data.get('start_time'))
         
         # 7. 統合JSON作成（beginTimeを追加）
         broadcast_data = create_broadcast_json(
@@ -51,6 +54,14 @@ def process(pipeline_data):
             previous_summary, broadcast_dir, ncv_xml_path, platform_xml_path, account_dir
         )
         
+        # 書き出し済みの統合JSONを後続ステップと共有（再読み込みを省く）
+        get_broadcast_document(pipeline_data).adopt('data', dict(broadcast_data))
+        
+        # 8. 放送年表に登録
+        get_broadcast_history(account_dir).record(
+            lv_value, start_time=ncv_data.get('start_time'), live_title=ncv_data.get('live_title', '')
+        )
+        
         print(f"Step01 完了: {lv_value}")
         return broadcast_data
         
@@ -64,16 +75,16 @@ def get_server_time_from_filename(platform_directory, account_id, lv_value):
         account_dir = find_account_directory(platform_directory, account_id)
         
         # 対象の動画ファイルを検索
-        for filename in os.listdir(account_dir):
-            if filename.endswith('.mp4') and lv_value in filename:
-                # ファイル名からUNIX時刻を直接抽出
-                pattern = r'^(\d+)_lv\d+_'
-                match = re.search(pattern, filename)
-                
-                if match:
-                    server_time = match.group(1)
-                    print(f"動画ファイル名からserver_time取得: {server_time}")
-                    return "", server_time
+        for mp4_path in get_account_index(account_dir).mp4_files(lv_value):
+            filename = os.path.basename(mp4_path)
+            # ファイル名からUNIX時刻を直接抽出
+            pattern = r'^(\d+)_lv\d+_'
+            match = re.search(pattern, filename)
+            
+            if match:
+                server_time = match.group(1)
+                print(f"動画ファイル名からserver_time取得: {server_time}")
+                return "", server_time
         
         print(f"対象の動画ファイルが見つかりません: {lv_value}")
         return "", ""
@@ -98,8 +109,7 @@ def fetch_and_save_html(lv_value, broadcast_dir):
         
         # HTMLを保存
         html_path = os.path.join(broadcast_dir, f"{lv_value}.html")
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        atomic_write(html_path, html_content, checksum=True)
         
         # beginTimeを抽出
         begin_time = extract_begin_time(html_content)
@@ -137,49 +147,46 @@ def extract_begin_time(html_content):
         print(f"beginTime抽出エラー: {str(e)}")
         return None
 
-def wait_and_parse_ncv_xml(ncv_directory, lv_value, account_id="", display_name=""):
+def wait_and_parse_ncv_xml(ncv_directory, lv_value, account_id="", display_name="", timeout=60):
     """NCVのXMLファイル監視・解析（新しいディレクトリ構造対応）"""
     
-    print(f"DEBUGLOG: ncv_directory引数: {ncv_directory}")
-    print(f"DEBUGLOG: account_id: {account_id}")
-    print(f"DEBUGLOG: display_name: {display_name}")
-    
     # 新しいディレクトリ構造を考慮
     if account_id:
         from utils import find_ncv_directory
         actual_ncv_dir = find_ncv_directory(ncv_directory, account_id, display_name)
-        print(f"DEBUGLOG: find_ncv_directory結果: {actual_ncv_dir}")
     else:
         actual_ncv_dir = ncv_directory
-        print(f"DEBUGLOG: actual_ncv_dir (フォールバック): {actual_ncv_dir}")
     
-    print(f"DEBUGLOG: 実際の探索ディレクトリ: {actual_ncv_dir}")
-    print(f"DEBUGLOG: ディレクトリ存在確認: {os.path.exists(actual_ncv_dir)}")
+    print(f"NCV XML探索ディレクトリ: {actual_ncv_dir}")
     
-    if os.path.exists(actual_ncv_dir):
-        files = os.listdir(actual_ncv_dir)
-        print(f"DEBUGLOG: ディレクトリ内のファイル一覧: {files}")
-        xml_files = [f for f in files if f.endswith('.xml')]
-        print(f"DEBUGLOG: XMLファイル一覧: {xml_files}")
-        lv_xml_files = [f for f in xml_files if lv_value in f]
-        print(f"DEBUGLOG: lv値を含むXMLファイル: {lv_xml_files}")
-    else:
-        print(f"DEBUGLOG: 探索ディレクトリが存在しません: {actual_ncv_dir}")
+    # ファイル名インデックスで出現を待機（watchdogイベントで即時に解決）
+    index = get_directory_index(actual_ncv_dir)
+    deadline = time.monotonic() + timeout
+    xml_file = index.wait_for(lambda name: is_ncv_xml_name(name, lv_value), timeout)
+    if not xml_file:
+        raise Exception(f"NCVのXMLファイルが見つかりません: {lv_value}")
+    
+    print(f"XMLファイル発見: {xml_file}")
     
-    for i in range(60):
+    # 書き込み途中で解析に失敗した場合は、次の更新イベントを待って再試行
+    while True:
+        version = index.version
         try:
-            xml_file = find_xml_file_containing_lv(actual_ncv_dir, lv_value)
-            if xml_file:
-                print(f"DEBUGLOG: XMLファイル発見: {xml_file}")
-                ncv_data = parse_ncv_xml(xml_file)
-                return xml_file, ncv_data
-            else:
-                print(f"DEBUGLOG: XMLファイル未発見 (試行{i+1}/60)")
+            ncv_data = parse_ncv_xml(xml_file)
+            return xml_file, ncv_data
         except Exception as e:
-            print(f"XML解析エラー(試行{i+1}): {str(e)}")
-        time.sleep(1)
+            print(f"XML解析エラー（更新待ちで再試行）: {str(e)}")
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        index.wait_for_change(version, remaining)
     
-    raise Exception(f"NCVのXMLファイルが見つかりません: {lv_value}")
+    raise Exception(f"NCVのXMLファイルを解析できません: {xml_file}")
+
+def is_ncv_xml_name(filename, lv_value):
+    """lv_valueを含むXMLファイル名か判定"""
+    return filename.endswith('.xml') and lv_value in filename
 
 def get_server_time_from_xml(platform_directory, lv_value, account_id):
     """監視ディレクトリのXMLからserver_time取得（ファイル名部分一致対応）"""
@@ -214,14 +221,11 @@ def find_xml_file_containing_lv(directory, lv_value):
     try:
         if not os.path.exists(directory):
             return None
-            
-        for filename in os.listdir(directory):
-            if filename.endswith('.xml') and lv_value in filename:
-                xml_path = os.path.join(directory, filename)
-                print(f"XMLファイル発見: {xml_path}")
-                return xml_path
         
-        return None
+        xml_path = get_directory_index(directory).find(lambda name: is_ncv_xml_name(name, lv_value))
+        if xml_path:
+            print(f"XMLファイル発見: {xml_path}")
+        return xml_path
         
     except Exception as e:
         print(f"XMLファイル検索エラー: {str(e)}")
@@ -327,20 +331,11 @@ def get_video_duration(pipeline_data):
         # アカウントディレクトリからMP4ファイルを探す
         account_dir = find_account_directory(platform_directory, account_id)
         
-        mp4_files = []
-        for file in os.listdir(account_dir):
-            if file.endswith('.mp4') and lv_value in file:
-                mp4_files.append(os.path.join(account_dir, file))
+        mp4_files = get_account_index(account_dir).mp4_files(lv_value)
         
         if mp4_files:
-            # ffprobeで動画時間取得
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-show_entries', 
-                'format=duration', '-of', 'csv=p=0', mp4_files[0]
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                return float(result.stdout.strip())
+            # ffprobeで動画時間取得（メディア情報キャッシュ経由、後続ステップも同じ結果を利用）
+            return get_duration(mp4_files[0])
         
         return 0.0
         
@@ -349,30 +344,15 @@ def get_video_duration(pipeline_data):
         return 0.0
     
 
-def get_previous_broadcast_summary(platform_directory, account_id, current_lv_value):
-    """前回放送の要約文取得"""
+def get_previous_broadcast_summary(platform_directory, account_id, current_lv_value, start_time=None):
+    """前回放送の要約文取得（放送年表から直近の要約を引く）"""
     try:
         account_dir = find_account_directory(platform_directory, account_id)
         
-        # 現在のlv値から数値部分を抽出
-        current_num = int(re.search(r'lv(\d+)', current_lv_value).group(1))
-        
-        # 一つ前の放送を探す
-        for i in range(1, 100):
-            prev_lv = f"lv{current_num - i}"
-            prev_dir = os.path.join(account_dir, prev_lv)
-            
-            if os.path.exists(prev_dir):
-                # JSONファイルを探す
-                for file in os.listdir(prev_dir):
-                    if file.endswith('.json'):
-                        json_path = os.path.join(prev_dir, file)
-                        with open(json_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            summary = data.get('summary_text', '')
-                            if summary:
-                                print(f"前回放送の要約取得: {prev_lv}")
-                                return summary
+        previous = get_broadcast_history(account_dir).previous(current_lv_value, start_time)
+        if previous:
+            print(f"前回放送の要約取得: {previous['lv_value']}")
+            return previous['summary_text']
         
         return ""
         
@@ -428,8 +408,7 @@ def create_broadcast_json(lv_value, ncv_data, server_time, begin_time, video_dur
     
     # JSON保存
     json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
+    save_json_atomic(json_path, broadcast_data, checksum=True)
     
     print(f"JSON保存完了: {json_path}")
     return broadcast_data
@@ -1,18 +1,17 @@
 import os
-import json
 import math
 import sys
-import torch
-from moviepy.editor import VideoFileClip
-from pydub import AudioSegment
-from faster_whisper import WhisperModel
 
 # utils.pyからfind_account_directoryをインポート
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.fs_index import get_account_index
+from pipeline_modules.media_probe import probe_media
+from pipeline_modules.broadcast_document import get_broadcast_document
+from pipeline_modules.storage import storage_settings, cleanup_intermediate_audio
 
-def save_transcript_json(broadcast_dir, lv_value, transcripts):
-    """transcript.json保存（空でも必ず保存）"""
+def save_transcript_json(doc, lv_value, transcripts):
+    """transcript.jsonを放送ドキュメントに設定（空でも必ず設定）"""
     try:
         from datetime import datetime
         
@@ -44,21 +43,19 @@ def save_transcript_json(broadcast_dir, lv_value, transcripts):
                 "transcripts": transcripts
             }
         
-        # ディレクトリが存在しない場合は作成
-        os.makedirs(broadcast_dir, exist_ok=True)
+        # 書き出しはステップ終了時にまとめて行う
+        doc.set_section('transcript', transcript_data)
         
-        json_path = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"transcript.json保存完了: {json_path} (セグメント数: {len(transcript_data['transcripts'])})")
+        print(f"transcript.json設定完了 (セグメント数: {len(transcript_data['transcripts'])})")
         
     except Exception as e:
-        print(f"transcript.json保存エラー: {str(e)}")
+        print(f"transcript.json設定エラー: {str(e)}")
         raise
 
 def get_optimal_device_config():
     """最適なデバイスと設定を取得"""
+    import torch
+
     if torch.cuda.is_available():
         device = "cuda"
         compute_type = "float16"
@@ -77,24 +74,18 @@ def find_mp4_file(account_dir, lv_value):
     if not os.path.exists(account_dir):
         return None
     
-    for filename in os.listdir(account_dir):
-        if filename.endswith('.mp4') and lv_value in filename:
-            mp4_path = os.path.join(account_dir, filename)
-            print(f"MP4ファイル発見: {mp4_path}")
-            return mp4_path
-    
-    return None
+    mp4_path = get_account_index(account_dir).mp4(lv_value)
+    if mp4_path:
+        print(f"MP4ファイル発見: {mp4_path}")
+    return mp4_path
 
-def get_time_diff_from_json(broadcast_dir, lv_value):
-    """JSONファイルからtime_diff_seconds取得"""
+def get_time_diff_from_json(doc):
+    """統合JSONからtime_diff_seconds取得"""
     try:
-        json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-        if os.path.exists(json_path):
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                parsec = data.get('time_diff_seconds', 0)
-                print(f"時間差（parsec）: {parsec}秒")
-                return parsec
+        if doc.exists('data'):
+            parsec = doc.get('time_diff_seconds', 0)
+            print(f"時間差（parsec）: {parsec}秒")
+            return parsec
         
         print("JSONファイルが見つからないため、parsecを0に設定")
         return 0
@@ -108,7 +99,18 @@ def extract_and_split_audio(mp4_path, broadcast_dir, lv_value, parsec=0):
     try:
         print(f"音声抽出開始: {mp4_path}")
         
-        # 動画読み込み
+        # 音声トラックの有無と長さはキャッシュ済みのメディア情報で先に判定（動画を開かずに済む）
+        media_info = probe_media(mp4_path)
+        if not media_info['has_audio']:
+            print("警告: 動画に音声トラックがありません - 空の文字起こしを生成します")
+            return []
+        if media_info['duration'] < 1.0:
+            print("警告: 音声が短すぎます（1秒未満） - 空の文字起こしを生成します")
+            return []
+        
+        # 動画読み込み（moviepy/pydubは読み込みが重いので使う時だけimport）
+        from moviepy.editor import VideoFileClip
+        from pydub import AudioSegment
         video = VideoFileClip(mp4_path)
         
         # 音声トラック存在チェック
@@ -205,6 +207,7 @@ def transcribe_audio_files(audio_files, parsec, config=None):
             return []  # 空のリストを返す（後でJSONが生成される）
         
         print("Whisperモデル読み込み中...")
+        from faster_whisper import WhisperModel
         
         # 設定から音声処理パラメータを取得
         if config:
@@ -293,6 +296,7 @@ def transcribe_audio_files_cpu_fallback(audio_files, parsec):
     """CPU フォールバック処理"""
     try:
         print("CPUモードで再実行中...")
+        from faster_whisper import WhisperModel
         model = WhisperModel(
             "large-v2",  # CPU用はやや軽量モデル
             device="cpu",
@@ -361,10 +365,12 @@ def process(pipeline_data):
     # 2. 放送ディレクトリ取得
     broadcast_dir = os.path.join(account_dir, lv_value)
     os.makedirs(broadcast_dir, exist_ok=True)
+    doc = get_broadcast_document(pipeline_data)
     
-    # 3. **最初に強制的に空のJSONを作成（保険）**
-    transcript_file_path = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-    save_transcript_json(broadcast_dir, lv_value, [])
+    # 3. **最初に強制的に空のJSONを作成（保険、ここだけは即時に書き出す）**
+    transcript_file_path = doc.path('transcript')
+    save_transcript_json(doc, lv_value, [])
+    doc.flush()
     print(f"空のtranscript.jsonを作成: {transcript_file_path}")
     
     try:
@@ -372,10 +378,10 @@ def process(pipeline_data):
         mp4_path = find_mp4_file(account_dir, lv_value)
         if not mp4_path:
             print(f"MP4ファイルが見つかりません: {lv_value} - 空のJSONを維持")
-            return {"transcript_file": transcript_file_path}
+            return {"transcript_file": transcript_file_path, "reason": "no_mp4", "status": "failed"}
         
         # 5. JSONからparsec取得
-        parsec = get_time_diff_from_json(broadcast_dir, lv_value)
+        parsec = get_time_diff_from_json(doc)
         
         # 6. 音声抽出・分割
         audio_files = extract_and_split_audio(mp4_path, broadcast_dir, lv_value, parsec)
@@ -385,10 +391,15 @@ def process(pipeline_data):
         
         # 8. 実際のデータでJSONを上書き（成功時のみ）
         if transcripts:
-            save_transcript_json(broadcast_dir, lv_value, transcripts)
+            save_transcript_json(doc, lv_value, transcripts)
             print(f"transcript.jsonを実際のデータで更新: {len(transcripts)}セグメント")
+            
+            # 9. 分割チャンクなど文字起こし用の中間音声を整理（再実行時はMP4から作り直す）
+            if storage_settings(pipeline_data.get('config')).get('cleanup_intermediate_audio', False):
+                cleanup_intermediate_audio(broadcast_dir, lv_value)
         else:
             print("文字起こし結果が空のため、空のJSONを維持")
+            return {"transcript_file": transcript_file_path, "reason": "empty_transcript", "status": "failed"}
         
         print(f"Step02 完了: {lv_value}")
         return {"transcript_file": transcript_file_path}
@@ -396,4 +407,4 @@ def process(pipeline_data):
     except Exception as e:
         print(f"Step02 処理エラー: {str(e)} - 空のJSONを維持します")
         # 既に空のJSONが作成済みなので、そのまま返す
-        return {"transcript_file": transcript_file_path}
\ No newline at end of file
+        return {"transcript_file": transcript_file_path, "reason": str(e), "status": "failed"}
\ No newline at end of file
@@ -1,13 +1,9 @@
-import torch
-import torch.nn.functional as F
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import numpy as np
-import json
 import os
 import sys
+import numpy as np
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
 
 def process(pipeline_data):
     """Step03: 感情分析"""
@@ -16,23 +12,22 @@ def process(pipeline_data):
         
         print(f"Step03 開始: {lv_value}")
         
-        # 1. アカウントディレクトリ検索（utils.pyの関数を使用）
-        account_dir = find_account_directory(pipeline_data['platform_directory'], pipeline_data['account_id'])
-        broadcast_dir = os.path.join(account_dir, lv_value)
+        # 1. 放送ドキュメント取得
+        doc = get_broadcast_document(pipeline_data)
         
-        # 2. transcript.json読み込み
-        transcript_path = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-        if not os.path.exists(transcript_path):
+        # 2. transcript.json確認
+        transcript_path = doc.path('transcript')
+        if not doc.exists('transcript'):
             raise Exception(f"transcript.jsonが見つかりません: {transcript_path}")
         
         # 3. 感情分析モデル初期化
         sentiment_analyzer = load_sentiment_model()
         
         # 4. 感情分析実行
-        stats = analyze_and_update_transcript(transcript_path, sentiment_analyzer)
+        stats = analyze_and_update_transcript(doc, sentiment_analyzer)
         
         # 5. 統合JSONに統計情報を追加
-        update_broadcast_json(broadcast_dir, lv_value, stats)
+        update_broadcast_json(doc, stats)
         
         print(f"Step03 完了: {lv_value}")
         return {"updated_transcript": transcript_path, "sentiment_stats": stats}
@@ -45,6 +40,8 @@ def load_sentiment_model():
     """感情分析モデルを読み込み"""
     try:
         print("感情分析モデル読み込み中...")
+        # transformers/torchは読み込みが重いのでモデル読み込み時にimport
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
         tokenizer = AutoTokenizer.from_pretrained(
             "lxyuan/distilbert-base-multilingual-cased-sentiments-student"
         )
@@ -58,12 +55,10 @@ def load_sentiment_model():
         print(f"モデル読み込みエラー: {str(e)}")
         raise
 
-def analyze_and_update_transcript(transcript_path, sentiment_analyzer):
+def analyze_and_update_transcript(doc, sentiment_analyzer):
     """transcript.jsonを読み込み、感情分析してスコアを更新"""
     try:
-        # JSONファイル読み込み
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            transcript_data = json.load(f)
+        transcript_data = doc.load('transcript')
         
         transcripts = transcript_data.get('transcripts', [])
         print(f"感情分析対象: {len(transcripts)}セグメント")
@@ -86,11 +81,10 @@ def analyze_and_update_transcript(transcript_path, sentiment_analyzer):
         # 統計情報計算
         stats = calculate_sentiment_stats(transcripts)
         
-        # 更新されたJSONを保存（統計情報は含めない）
-        with open(transcript_path, 'w', encoding='utf-8') as f:
-            json.dump(transcript_data, f, ensure_ascii=False, indent=2)
+        # 更新を記録（統計情報は含めない、書き出しはステップ終了時）
+        doc.mark_dirty('transcript')
         
-        print(f"感情分析完了: {transcript_path}")
+        print(f"感情分析完了: {doc.path('transcript')}")
         print(f"平均スコア - Center: {stats['avg_center']:.3f}, Positive: {stats['avg_positive']:.3f}, Negative: {stats['avg_negative']:.3f}")
         
         return stats
@@ -100,7 +94,7 @@ def analyze_and_update_transcript(transcript_path, sentiment_analyzer):
         raise
 
 def calculate_sentiment_stats(transcripts):
-    """感情分析の統計情報を計算"""
+    """感情分析の統計情報を計算（スコアを配列にしてまとめて集計）"""
     if not transcripts:
         return {
             'avg_center': 0.0,
@@ -115,77 +109,48 @@ def calculate_sentiment_stats(transcripts):
             'total_segments': 0
         }
     
-    center_scores = []
-    positive_scores = []
-    negative_scores = []
+    count = len(transcripts)
+    timestamps = np.fromiter((segment.get('timestamp', 0) for segment in transcripts), dtype=np.int64, count=count)
+    # 列は [center, positive, negative]
+    scores = np.array(
+        [[segment.get('center_score', 0.0), segment.get('positive_score', 0.0), segment.get('negative_score', 0.0)]
+         for segment in transcripts],
+        dtype=np.float64
+    )
     
-    max_center = 0.0
-    max_positive = 0.0
-    max_negative = 0.0
-    max_center_time = 0
-    max_positive_time = 0
-    max_negative_time = 0
-    
-    for segment in transcripts:
-        center = segment.get('center_score', 0.0)
-        positive = segment.get('positive_score', 0.0)
-        negative = segment.get('negative_score', 0.0)
-        timestamp = segment.get('timestamp', 0)
-        
-        center_scores.append(center)
-        positive_scores.append(positive)
-        negative_scores.append(negative)
-        
-        # 最大値更新
-        if center > max_center:
-            max_center = center
-            max_center_time = timestamp
-        
-        if positive > max_positive:
-            max_positive = positive
-            max_positive_time = timestamp
-        
-        if negative > max_negative:
-            max_negative = negative
-            max_negative_time = timestamp
+    averages = scores.mean(axis=0)
+    # 最初に最大値を取ったセグメントの時刻（0以下しかなければ 0.0 / 0秒）
+    max_indexes = scores.argmax(axis=0)
+    maxima = scores[max_indexes, np.arange(3)]
+    max_times = np.where(maxima > 0, timestamps[max_indexes], 0)
+    maxima = np.maximum(maxima, 0.0)
     
     return {
-        'avg_center': sum(center_scores) / len(center_scores),
-        'avg_positive': sum(positive_scores) / len(positive_scores),
-        'avg_negative': sum(negative_scores) / len(negative_scores),
-        'max_center': max_center,
-        'max_positive': max_positive,
-        'max_negative': max_negative,
-        'max_center_time': max_center_time,
-        'max_positive_time': max_positive_time,
-        'max_negative_time': max_negative_time,
-        'total_segments': len(transcripts)
+        'avg_center': float(averages[0]),
+        'avg_positive': float(averages[1]),
+        'avg_negative': float(averages[2]),
+        'max_center': float(maxima[0]),
+        'max_positive': float(maxima[1]),
+        'max_negative': float(maxima[2]),
+        'max_center_time': int(max_times[0]),
+        'max_positive_time': int(max_times[1]),
+        'max_negative_time': int(max_times[2]),
+        'total_segments': count
     }
 
-def update_broadcast_json(broadcast_dir, lv_value, sentiment_stats):
+def update_broadcast_json(doc, sentiment_stats):
     """統合JSONに感情分析統計を追加"""
     try:
-        json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-        
-        if os.path.exists(json_path):
-            with open(json_path, 'r', encoding='utf-8') as f:
-                broadcast_data = json.load(f)
-            
-            # 感情分析統計を追加
-            broadcast_data['sentiment_stats'] = sentiment_stats
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
-            
-            print(f"統合JSONに感情統計を追加: {json_path}")
-        else:
-            print(f"統合JSONが見つかりません: {json_path}")
+        # 感情分析統計を追加
+        doc.update_data({'sentiment_stats': sentiment_stats})
+        print(f"統合JSONに感情統計を追加: {doc.lv_value}_data.json")
             
     except Exception as e:
         print(f"統合JSON更新エラー: {str(e)}")
 
 class SentimentAnalysis:
     def __init__(self, model, tokenizer):
+        import torch
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = model.to(self.device)
         self.model.eval()
@@ -200,6 +165,8 @@ class SentimentAnalysis:
             inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
             inputs = inputs.to(self.device)
             
+            import torch
+            import torch.nn.functional as F
             with torch.no_grad():
                 outputs = self.model(**inputs)
                 probabilities = F.softmax(outputs.logits, dim=1)
@@ -1,12 +1,10 @@
-import json
 import os
 import collections
-from janome.tokenizer import Tokenizer
 import sys
 
-# utils.pyからfind_account_directoryをインポート
+# プロジェクトルートのモジュールをインポート
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
 
 def process(pipeline_data):
     """Step04: 単語頻度分析"""
@@ -15,20 +13,18 @@ def process(pipeline_data):
         
         print(f"Step04 開始: {lv_value}")
         
-        # 1. アカウントディレクトリ検索
-        account_dir = find_account_directory(pipeline_data['platform_directory'], pipeline_data['account_id'])
-        broadcast_dir = os.path.join(account_dir, lv_value)
+        # 1. 放送ドキュメント取得
+        doc = get_broadcast_document(pipeline_data)
         
-        # 2. transcript.json読み込み
-        transcript_path = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-        if not os.path.exists(transcript_path):
-            raise Exception(f"transcript.jsonが見つかりません: {transcript_path}")
+        # 2. transcript.json確認
+        if not doc.exists('transcript'):
+            raise Exception(f"transcript.jsonが見つかりません: {doc.path('transcript')}")
         
         # 3. 単語頻度分析実行
-        word_ranking = analyze_word_frequency(transcript_path)
+        word_ranking = analyze_word_frequency(doc.load('transcript'))
         
         # 4. 統合JSONに結果を追加
-        update_broadcast_json(broadcast_dir, lv_value, word_ranking)
+        update_broadcast_json(doc, word_ranking)
         
         print(f"Step04 完了: {lv_value} - 分析単語数: {len(word_ranking)}")
         return {"word_ranking_count": len(word_ranking)}
@@ -37,14 +33,12 @@ def process(pipeline_data):
         print(f"Step04 エラー: {str(e)}")
         raise
 
-def analyze_word_frequency(transcript_path):
+def analyze_word_frequency(transcript_data):
     """Janomeを使用して単語の出現頻度を分析"""
     try:
         # transcript.jsonから文字起こしテキストを取得
-        with open(transcript_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            transcripts = data.get("transcripts", [])
-            text_segments = [segment["text"] for segment in transcripts if segment.get("text")]
+        transcripts = transcript_data.get("transcripts", [])
+        text_segments = [segment["text"] for segment in transcripts if segment.get("text")]
         
         if not text_segments:
             print("分析対象のテキストが見つかりません")
@@ -52,6 +46,7 @@ def analyze_word_frequency(transcript_path):
         
         print(f"分析対象セグメント数: {len(text_segments)}")
         
+        from janome.tokenizer import Tokenizer
         tokenizer = Tokenizer()
         word_count = collections.Counter()
         
@@ -87,23 +82,11 @@ def analyze_word_frequency(transcript_path):
         print(f"単語頻度分析エラー: {str(e)}")
         raise
 
-def update_broadcast_json(broadcast_dir, lv_value, word_ranking):
+def update_broadcast_json(doc, word_ranking):
     """統合JSONに単語ランキングを追加"""
     try:
-        json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-        
-        if os.path.exists(json_path):
-            with open(json_path, 'r', encoding='utf-8') as f:
-                broadcast_data = json.load(f)
-            
-            broadcast_data['word_ranking'] = word_ranking
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
-            
-            print(f"統合JSONに単語ランキングを追加: {json_path}")
-        else:
-            print(f"統合JSONが見つかりません: {json_path}")
+        doc.update_data({'word_ranking': word_ranking})
+        print(f"統合JSONに単語ランキングを追加: {doc.lv_value}_data.json")
             
     except Exception as e:
         print(f"統合JSON更新エラー: {str(e)}")
@@ -1,11 +1,11 @@
-import json
 import os
-import openai
-import google.generativeai as genai
 from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.broadcast_history import get_broadcast_history
+from pipeline_modules.broadcast_document import get_broadcast_document
+from pipeline_modules.atomic_io import atomic_write
 
 def process(pipeline_data):
     """Step05: AI要約生成"""
@@ -20,7 +20,7 @@ def process(pipeline_data):
         broadcast_dir = os.path.join(account_dir, lv_value)
         
         # 2. transcript.jsonから本文抽出
-        transcript_text = extract_transcript_text(broadcast_dir, lv_value)
+        transcript_text = extract_transcript_text(get_broadcast_document(pipeline_data))
         if not transcript_text.strip():
             print("文字起こしテキストが空です")
             return {"summary": ""}
@@ -30,11 +30,14 @@ def process(pipeline_data):
         summary = generate_summary(transcript_text, config, ai_model)
         
         # 4. 統合JSONに要約を追加
-        update_broadcast_json(broadcast_dir, lv_value, summary)
+        update_broadcast_json(get_broadcast_document(pipeline_data), summary)
         
         # 5. 要約テキストファイル保存
         save_summary_text(broadcast_dir, lv_value, summary)
         
+        # 6. 放送年表の要約を更新（次回放送の前回要約として参照される）
+        get_broadcast_history(account_dir).record(lv_value, summary_text=summary)
+        
         print(f"Step05 完了: {lv_value} - 要約文字数: {len(summary)}")
         return {"summary": summary, "model_used": ai_model}
         
@@ -42,15 +45,13 @@ def process(pipeline_data):
         print(f"Step05 エラー: {str(e)}")
         raise
 
-def extract_transcript_text(broadcast_dir, lv_value):
+def extract_transcript_text(doc):
     """transcript.jsonから本文のみを抽出"""
     try:
-        transcript_path = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-        if not os.path.exists(transcript_path):
-            raise Exception(f"transcript.jsonが見つかりません: {transcript_path}")
+        if not doc.exists('transcript'):
+            raise Exception(f"transcript.jsonが見つかりません: {doc.path('transcript')}")
         
-        with open(transcript_path, 'r', encoding='utf-8') as f:
-            transcript_data = json.load(f)
+        transcript_data = doc.load('transcript')
         
         transcripts = transcript_data.get('transcripts', [])
         
@@ -194,6 +195,7 @@ def call_openai_api(prompt, config):
         # デバッグログ
         print(f"[DEBUG] OpenAI API呼び出し開始: モデル=gpt-4o, prompt文字数={len(prompt)}")
 
+        import openai
         client = openai.OpenAI(api_key=api_key)
         response = client.chat.completions.create(
             model="gpt-4o",
@@ -232,6 +234,7 @@ def call_google_api(prompt, config):
         # デバッグログ
         print(f"[DEBUG] Google API呼び出し開始: モデル=gemini-2.0-flash-exp, prompt文字数={len(prompt)}")
 
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
         model = genai.GenerativeModel('gemini-2.0-flash-exp')
         
@@ -263,25 +266,16 @@ def call_google_api(prompt, config):
         raise
 
 
-def update_broadcast_json(broadcast_dir, lv_value, summary):
+def update_broadcast_json(doc, summary):
     """統合JSONに要約を追加"""
     try:
-        json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-        
-        if os.path.exists(json_path):
-            with open(json_path, 'r', encoding='utf-8') as f:
-                broadcast_data = json.load(f)
-            
-            # 要約を追加
-            broadcast_data['summary_text'] = summary
-            broadcast_data['summary_generated_at'] = datetime.now().isoformat()
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
-            
-            print(f"統合JSONに要約を追加: {json_path}")
-        else:
-            print(f"統合JSONが見つかりません: {json_path}")
+        # 要約を追加
+        updates = {
+            'summary_text': summary,
+            'summary_generated_at': datetime.now().isoformat()
+        }
+        doc.update_data(updates)
+        print(f"統合JSONに要約を追加: {doc.lv_value}_data.json")
             
     except Exception as e:
         print(f"統合JSON更新エラー: {str(e)}")
@@ -291,8 +285,7 @@ def save_summary_text(broadcast_dir, lv_value, summary):
     try:
         summary_path = os.path.join(broadcast_dir, f"{lv_value}_summary.txt")
         
-        with open(summary_path, 'w', encoding='utf-8') as f:
-            f.write(summary)
+        atomic_write(summary_path, summary, checksum=True)
         
         print(f"要約テキストファイル保存: {summary_path}")
         
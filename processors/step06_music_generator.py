@@ -1,11 +1,15 @@
 import json
 import os
+import asyncio
+import threading
+import functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import requests
 import time
 from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
 
 def process(pipeline_data):
     """Step06: AI音楽生成"""
@@ -20,26 +24,22 @@ def process(pipeline_data):
             print("AI音楽生成機能が無効です。処理をスキップします。")
             return {"music_generated": False, "reason": "feature_disabled"}
         
-        # 2. アカウントディレクトリ検索
-        account_dir = find_account_directory(pipeline_data['platform_directory'], pipeline_data['account_id'])
-        broadcast_dir = os.path.join(account_dir, lv_value)
+        # 2. 統合JSONファイル読み込み
+        broadcast_data = load_broadcast_data(pipeline_data)
         
-        # 3. 統合JSONファイル読み込み
-        broadcast_data = load_broadcast_data(broadcast_dir, lv_value)
-        
-        # 4. 要約テキストの確認
+        # 3. 要約テキストの確認
         summary_text = broadcast_data.get('summary_text', '')
         if not summary_text.strip():
             print("要約テキストが見つかりません。音楽生成をスキップします。")
             return {"music_generated": False, "reason": "no_summary"}
         
-        # 5. Suno API設定確認
+        # 4. Suno API設定確認
         suno_api_key = config["api_settings"].get("suno_api_key", "")
         if not suno_api_key:
             print("Suno API Keyが設定されていません。音楽生成をスキップします。")
             return {"music_generated": False, "reason": "no_api_key"}
         
-        # 6. 音楽生成
+        # 5. 音楽生成
         music_settings = config.get("music_settings", {})
         music_result = generate_music_from_summary(
             broadcast_data.get('live_title', 'タイトル不明'),
@@ -47,59 +47,55 @@ def process(pipeline_data):
             suno_api_key,
             style=music_settings.get("style", "J-Pop, Upbeat"),
             model=music_settings.get("model", "V4"),
-            instrumental=music_settings.get("instrumental", False)
+            instrumental=music_settings.get("instrumental", False),
+            music_settings=music_settings
         )
 
         
         if music_result:
-            # 7. 統合JSONに結果を追加
-            broadcast_data['music_generation'] = music_result
-            save_broadcast_data(broadcast_dir, lv_value, broadcast_data)
+            # 6. 統合JSONに結果を追加
+            get_broadcast_document(pipeline_data).update_data({'music_generation': music_result})
             
             print(f"Step06 完了: {lv_value} - 音楽生成成功")
             return {"music_generated": True, "task_id": music_result.get("task_id")}
         else:
             print(f"Step06 完了: {lv_value} - 音楽生成失敗")
-            return {"music_generated": False, "reason": "generation_failed"}
+            return {"music_generated": False, "reason": "generation_failed", "status": "failed"}
         
     except Exception as e:
         print(f"Step06 エラー: {str(e)}")
         raise
 
-def load_broadcast_data(broadcast_dir, lv_value):
-    """統合JSONファイルを読み込み"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    if os.path.exists(json_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    raise Exception(f"統合JSONファイルが見つかりません: {json_path}")
-
-def save_broadcast_data(broadcast_dir, lv_value, broadcast_data):
-    """統合JSONファイルを保存"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
+def load_broadcast_data(pipeline_data):
+    """統合JSONを取得（放送ドキュメント経由、ファイルの読み込みはパイプライン内で1回）"""
+    return get_broadcast_document(pipeline_data).data
 
-def generate_music_from_summary(title, summary, api_key, style="J-Pop", model="V4", instrumental=False):
+def generate_music_from_summary(title, summary, api_key, style="J-Pop", model="V4", instrumental=False, music_settings=None):
     """要約から音楽を生成"""
     try:
         print(f"音楽生成開始: {title}")
         print(f"要約: {summary[:100]}...")
         
-        suno_api = SunoAPI(api_key)
+        music_settings = music_settings or {}
+        suno_api = SunoAPI(
+            api_key,
+            callback_url=music_settings.get("callback_url", ""),
+            callback_port=music_settings.get("callback_port", 0),
+            poll_timeout=music_settings.get("poll_timeout", 240)
+        )
         
         # 要約テキストをそのまま歌詞として使用
         lyrics = create_music_prompt(summary)
         
-        # 音楽生成実行
-        result = suno_api.generate_music(
+        # 音楽生成実行（待機中はスレッドを占有せずイベントループで待つ）
+        result = asyncio.run(suno_api.generate_music(
             prompt=lyrics,
             custom_mode=True,
             instrumental=instrumental,  # ← ここも引数で受け取った値を使用
             model=model,                # ← ここも引数で受け取った値を使用
             style=style,                # ← ここも引数で受け取った値を使用
             title=title
-        )
+        ))
         
         if result:
             return {
@@ -128,8 +124,69 @@ def create_music_prompt(summary):
     lyrics = summary[:3000] if len(summary) > 3000 else summary
     return lyrics
 
+class SunoCallbackServer:
+    """Sunoからの完了通知を受け取るローカルHTTPサーバー（届いたらすぐに結果を取りに行く）"""
+    
+    def __init__(self, port):
+        self.port = port
+        self.server = None
+        self.thread = None
+        self.waiters = {}
+        self.lock = threading.Lock()
+    
+    def start(self):
+        callback_server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    payload = {}
+                self.send_response(200)
+                self.end_headers()
+                callback_server.notify(payload)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('0.0.0.0', self.port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"コールバック待受開始: ポート{self.port}")
+        return self
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    
+    def register(self, task_id, loop, event):
+        with self.lock:
+            self.waiters[task_id] = (loop, event)
+    
+    def unregister(self, task_id):
+        with self.lock:
+            self.waiters.pop(task_id, None)
+    
+    def notify(self, payload):
+        """通知のtaskIdに対応する待機を起こす（内容の解釈はポーリング側で行う）"""
+        data = payload.get('data') or {}
+        task_id = data.get('task_id') or data.get('taskId')
+        print(f"コールバック受信: {task_id} ({data.get('callbackType', '')})")
+        with self.lock:
+            waiter = self.waiters.get(task_id)
+        if waiter:
+            loop, event = waiter
+            loop.call_soon_threadsafe(event.set)
+
 class SunoAPI:
-    def __init__(self, api_key):
+    FAILED_STATUSES = ["CREATE_TASK_FAILED", "GENERATE_AUDIO_FAILED", "CALLBACK_EXCEPTION", "SENSITIVE_WORD_ERROR"]
+    
+    def __init__(self, api_key, callback_url="", callback_port=0,
+                 poll_timeout=240, initial_interval=5, max_interval=30, backoff=1.5):
         self.api_key = api_key
         self.base_url = "https://api.sunoapi.org/api/v1"
         self.generate_url = f"{self.base_url}/generate"
@@ -138,26 +195,43 @@ class SunoAPI:
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
+        self.callback_url = callback_url
+        self.callback_port = callback_port
+        self.poll_timeout = poll_timeout
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        
+        self.session = requests.Session()
         self.last_request_time = 0
+        self.rate_lock = None
     
-    def _rate_limit(self):
+    async def _rate_limit(self):
         """レート制限: 0.5秒間隔"""
-        current_time = time.time()
-        if current_time - self.last_request_time < 0.5:
-            time.sleep(0.5)
-        self.last_request_time = time.time()
+        if self.rate_lock is None:
+            self.rate_lock = asyncio.Lock()
+        async with self.rate_lock:
+            wait = 0.5 - (time.time() - self.last_request_time)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last_request_time = time.time()
     
-    def generate_music(self, prompt, custom_mode=False, instrumental=False, 
+    async def _request(self, method, url, **kwargs):
+        """HTTPリクエストをスレッドプールで実行（イベントループは止めない）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.session.request, method, url, **kwargs))
+    
+    async def generate_music(self, prompt, custom_mode=False, instrumental=False, 
                       model="V4", style=None, title=None):
         """音楽生成"""
-        self._rate_limit()
+        await self._rate_limit()
         
         data = {
             "customMode": custom_mode,
             "instrumental": instrumental,
             "model": model,
             "prompt": prompt,
-            "callBackUrl": "https://example.com/callback"
+            "callBackUrl": self.callback_url or "https://example.com/callback"
         }
         
         if custom_mode and style:
@@ -165,8 +239,17 @@ class SunoAPI:
         if custom_mode and title:
             data["title"] = title
         
+        # 通知を受け取れる場合は送信前に待受を始める（直後に完了通知が来ても取りこぼさない）
+        callback_server = None
+        if self.callback_url and self.callback_port:
+            try:
+                callback_server = SunoCallbackServer(self.callback_port).start()
+            except OSError as e:
+                print(f"コールバック待受失敗（ポーリングのみで待機）: {e}")
+        
         try:
-            response = requests.post(
+            response = await self._request(
+                "POST",
                 self.generate_url,
                 headers=self.headers,
                 json=data,
@@ -183,7 +266,7 @@ class SunoAPI:
                 print(f"音楽生成開始 - TaskID: {task_id}")
                 
                 # 完了まで待機してURLを取得
-                songs = self._wait_for_completion(task_id)
+                songs = await self._wait_for_completion(task_id, callback_server)
                 if songs:
                     return {
                         "task_id": task_id,
@@ -205,50 +288,80 @@ class SunoAPI:
         except Exception as e:
             print(f"リクエスト失敗: {e}")
             return None
+        finally:
+            if callback_server:
+                callback_server.stop()
     
-    def _wait_for_completion(self, task_id):
-        """タスク完了まで待機して楽曲情報を取得"""
+    async def _wait_for_completion(self, task_id, callback_server=None):
+        """タスク完了まで待機して楽曲情報を取得（指数バックオフ、通知が来たら即確認）"""
         print("生成を待機中...")
         
-        for attempt in range(24):  # 最大4分待機
-            time.sleep(10)
-            print(f"   {(attempt+1)*10}秒経過...")
-            
-            self._rate_limit()
-            try:
-                response = requests.get(
-                    self.details_url,
-                    headers=self.headers,
-                    params={"taskId": task_id},
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    print(f"詳細取得エラー: {response.status_code}")
-                    continue
-                
-                details_data = response.json()
-                status = details_data.get("data", {}).get("status")
-                print(f"現在のステータス: {status}")
+        loop = asyncio.get_running_loop()
+        callback_event = asyncio.Event()
+        if callback_server:
+            callback_server.register(task_id, loop, callback_event)
+        
+        started = time.time()
+        interval = self.initial_interval
+        try:
+            while time.time() - started < self.poll_timeout:
+                remaining = self.poll_timeout - (time.time() - started)
+                try:
+                    await asyncio.wait_for(callback_event.wait(), timeout=min(interval, remaining))
+                    callback_event.clear()
+                except asyncio.TimeoutError:
+                    pass
+                interval = min(interval * self.backoff, self.max_interval)
+                print(f"   {time.time() - started:.0f}秒経過...")
                 
-                if status == "SUCCESS":
-                    print("生成完了!")
-                    songs = self._extract_valid_songs(details_data)
-                    return songs
+                await self._rate_limit()
+                try:
+                    response = await self._request(
+                        "GET",
+                        self.details_url,
+                        headers=self.headers,
+                        params={"taskId": task_id},
+                        timeout=30
+                    )
                     
-                elif status in ["CREATE_TASK_FAILED", "GENERATE_AUDIO_FAILED", "CALLBACK_EXCEPTION", "SENSITIVE_WORD_ERROR"]:
-                    print(f"タスク失敗: {status}")
-                    return None
+                    if response.status_code != 200:
+                        print(f"詳細取得エラー: {response.status_code}")
+                        continue
                     
-            except Exception as e:
-                print(f"ステータス確認失敗: {e}")
-                continue
+                    details_data = response.json()
+                    status = details_data.get("data", {}).get("status")
+                    print(f"現在のステータス: {status}")
+                    
+                    if status == "SUCCESS":
+                        print("生成完了!")
+                        songs = await self._extract_valid_songs(details_data)
+                        return songs
+                        
+                    elif status in self.FAILED_STATUSES:
+                        print(f"タスク失敗: {status}")
+                        return None
+                        
+                except Exception as e:
+                    print(f"ステータス確認失敗: {e}")
+                    continue
+        finally:
+            if callback_server:
+                callback_server.unregister(task_id)
         
         print("タイムアウト")
         return None
     
-    def _extract_valid_songs(self, details_data):
-        """楽曲データから有効なURLを持つ楽曲を抽出"""
+    async def _check_url(self, url, semaphore):
+        """音声URLが取得可能か確認"""
+        async with semaphore:
+            try:
+                head_response = await self._request("HEAD", url, timeout=5)
+                return head_response.status_code == 200
+            except Exception:
+                return False
+    
+    async def _extract_valid_songs(self, details_data):
+        """楽曲データから有効なURLを持つ楽曲を抽出（全URLを並列に確認）"""
         response_data = details_data.get("data", {})
         songs = response_data.get("response", {}).get("sunoData", [])
         
@@ -256,25 +369,26 @@ class SunoAPI:
             return []
         
         print(f"{len(songs)}曲が生成されました")
-        valid_songs = []
         
-        for i, song in enumerate(songs, 1):
-            audio_urls = [
+        audio_urls_per_song = [
+            [url for url in (
                 song.get('audioUrl'),
                 song.get('sourceAudioUrl'), 
                 song.get('streamAudioUrl'),
                 song.get('sourceStreamAudioUrl')
-            ]
-            
-            valid_audio_urls = []
-            for url in audio_urls:
-                if url:
-                    try:
-                        head_response = requests.head(url, timeout=5)
-                        if head_response.status_code == 200:
-                            valid_audio_urls.append(url)
-                    except:
-                        pass
+            ) if url]
+            for song in songs
+        ]
+        
+        semaphore = asyncio.Semaphore(8)
+        checks = await asyncio.gather(*[
+            asyncio.gather(*[self._check_url(url, semaphore) for url in urls])
+            for urls in audio_urls_per_song
+        ])
+        
+        valid_songs = []
+        for song, urls, results in zip(songs, audio_urls_per_song, checks):
+            valid_audio_urls = [url for url, ok in zip(urls, results) if ok]
             
             if valid_audio_urls:
                 song_info = {
@@ -289,4 +403,4 @@ class SunoAPI:
                 }
                 valid_songs.append(song_info)
         
-        return valid_songs
\ No newline at end of file
+        return valid_songs
@@ -1,12 +1,11 @@
-import json
 import os
-import openai
-import requests
-import base64
+import threading
 from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
+from pipeline_modules.media_store import MediaStore, upload_to_imgur
 
 def process(pipeline_data):
     """Step07: AI画像生成"""
@@ -23,10 +22,9 @@ def process(pipeline_data):
         
         # 2. アカウントディレクトリ検索
         account_dir = find_account_directory(pipeline_data['platform_directory'], pipeline_data['account_id'])
-        broadcast_dir = os.path.join(account_dir, lv_value)
         
         # 3. 統合JSONファイル読み込み
-        broadcast_data = load_broadcast_data(broadcast_dir, lv_value)
+        broadcast_data = load_broadcast_data(pipeline_data)
         
         # 4. 要約テキストの確認
         summary_text = broadcast_data.get('summary_text', '')
@@ -40,11 +38,10 @@ def process(pipeline_data):
             print("OpenAI API Keyが設定されていません。画像生成をスキップします。")
             return {"image_generated": False, "reason": "no_openai_key"}
         
-        # 6. Imgur API設定確認
+        # 6. Imgur API設定確認（未設定ならローカル保存のみ）
         imgur_api_key = config["api_settings"].get("imgur_api_key", "")
         if not imgur_api_key:
-            print("Imgur API Keyが設定されていません。画像生成をスキップします。")
-            return {"image_generated": False, "reason": "no_imgur_key"}
+            print("Imgur API Keyが設定されていません。ローカル保存のみ行います。")
         
         # 7. 画像生成
         image_result = generate_image_from_summary(
@@ -52,40 +49,30 @@ def process(pipeline_data):
             summary_text,
             openai_api_key,
             imgur_api_key,
-            config["ai_prompts"].get("image_prompt", "次の文章は、ある生放送の要約です。この生放送の抽象的なイメージを生成してください:")
+            config["ai_prompts"].get("image_prompt", "次の文章は、ある生放送の要約です。この生放送の抽象的なイメージを生成してください:"),
+            account_dir
         )
         
         if image_result:
             # 8. 統合JSONに結果を追加
-            broadcast_data['image_generation'] = image_result
-            save_broadcast_data(broadcast_dir, lv_value, broadcast_data)
+            get_broadcast_document(pipeline_data).update_data({'image_generation': image_result})
             
             print(f"Step07 完了: {lv_value} - 画像生成成功")
-            return {"image_generated": True, "image_url": image_result.get("imgur_url")}
+            return {"image_generated": True, "image_url": image_result.get("imgur_url") or image_result.get("local_path")}
         else:
             print(f"Step07 完了: {lv_value} - 画像生成失敗")
-            return {"image_generated": False, "reason": "generation_failed"}
+            return {"image_generated": False, "reason": "generation_failed", "status": "failed"}
         
     except Exception as e:
         print(f"Step07 エラー: {str(e)}")
         raise
 
-def load_broadcast_data(broadcast_dir, lv_value):
-    """統合JSONファイルを読み込み"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    if os.path.exists(json_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    raise Exception(f"統合JSONファイルが見つかりません: {json_path}")
+def load_broadcast_data(pipeline_data):
+    """統合JSONを取得（放送ドキュメント経由、ファイルの読み込みはパイプライン内で1回）"""
+    return get_broadcast_document(pipeline_data).data
 
-def save_broadcast_data(broadcast_dir, lv_value, broadcast_data):
-    """統合JSONファイルを保存"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
-
-def generate_image_from_summary(title, summary, openai_api_key, imgur_api_key, image_prompt):
-    """要約から画像を生成してImgurにアップロード"""
+def generate_image_from_summary(title, summary, openai_api_key, imgur_api_key, image_prompt, account_dir):
+    """要約から画像を生成してローカルに保存し、Imgurにアップロード"""
     try:
         print(f"画像生成開始: {title}")
         print(f"要約: {summary[:100]}...")
@@ -99,19 +86,42 @@ def generate_image_from_summary(title, summary, openai_api_key, imgur_api_key, i
         if not image_url:
             return None
         
-        # 3. 画像をダウンロード
-        image_data = download_image(image_url)
-        if not image_data:
-            return None
-        
-        # 4. Imgurにアップロード
-        imgur_url = upload_to_imgur(image_data, imgur_api_key, title)
-        if not imgur_url:
-            return None
+        # 3. 画像をローカルの内容アドレス型ストアへストリーミング保存
+        store = MediaStore(account_dir)
+        local_path, digest, size = store.download(image_url, 'png')
+        print(f"画像保存成功: {local_path} ({size} bytes)")
+        
+        # 4. Imgurへのアップロードを裏で開始（縮小画像の生成と並行）
+        upload_result = {}
+        upload_thread = None
+        if imgur_api_key:
+            upload_thread = threading.Thread(
+                target=lambda: upload_result.update(url=upload_to_imgur(store.absolute_path(local_path), imgur_api_key, title)),
+                daemon=True
+            )
+            upload_thread.start()
+        
+        # 5. 一覧カード用の縮小画像を生成
+        try:
+            variants = store.make_variants(local_path, digest)
+        except Exception as e:
+            print(f"縮小画像生成エラー: {str(e)}")
+            variants = {}
+        
+        # 6. アップロード完了を待つ（失敗してもローカルの画像を使う）
+        if upload_thread:
+            upload_thread.join()
+        imgur_url = upload_result.get('url') or ''
+        if imgur_api_key and not imgur_url:
+            print("Imgur アップロードに失敗したため、ローカルの画像を使用します")
         
         return {
             "dalle_url": image_url,
             "imgur_url": imgur_url,
+            "local_path": local_path,
+            "sha256": digest,
+            "size": size,
+            "variants": variants,
             "dalle_prompt": dalle_prompt,
             "generated_at": datetime.now().isoformat(),
             "title": title
@@ -153,6 +163,7 @@ def create_dalle_prompt(title, summary, base_prompt):
 def generate_dalle_image(prompt, api_key):
     """DALL-E 3で画像生成"""
     try:
+        import openai
         client = openai.OpenAI(api_key=api_key)
         
         response = client.images.generate(
@@ -170,56 +181,3 @@ def generate_dalle_image(prompt, api_key):
     except Exception as e:
         print(f"DALL-E 画像生成エラー: {str(e)}")
         return None
-
-def download_image(url):
-    """画像をダウンロード"""
-    try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        print(f"画像ダウンロード成功: {len(response.content)} bytes")
-        return response.content
-        
-    except Exception as e:
-        print(f"画像ダウンロードエラー: {str(e)}")
-        return None
-
-def upload_to_imgur(image_data, api_key, title):
-    """ImgurにアップロードしてURLを取得"""
-    try:
-        headers = {
-            'Authorization': f'Client-ID {api_key}',
-        }
-        
-        # Base64エンコード
-        image_b64 = base64.b64encode(image_data).decode('utf-8')
-        
-        data = {
-            'image': image_b64,
-            'type': 'base64',
-            'title': title,
-            'description': f'AI generated image for broadcast: {title}'
-        }
-        
-        response = requests.post(
-            'https://api.imgur.com/3/image',
-            headers=headers,
-            data=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result['success']:
-                imgur_url = result['data']['link']
-                print(f"Imgur アップロード成功: {imgur_url}")
-                return imgur_url
-            else:
-                print(f"Imgur アップロード失敗: {result}")
-                return None
-        else:
-            print(f"Imgur API エラー {response.status_code}: {response.text}")
-            return None
-            
-    except Exception as e:
-        print(f"Imgur アップロードエラー: {str(e)}")
-        return None
\ No newline at end of file
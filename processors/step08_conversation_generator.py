@@ -1,11 +1,10 @@
 import json
 import os
-import openai
-import google.generativeai as genai
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
 
 def process(pipeline_data):
     """Step08: AI会話生成"""
@@ -20,14 +19,10 @@ def process(pipeline_data):
             print("AI会話生成機能が無効です。処理をスキップします。")
             return {"conversation_generated": False, "reason": "feature_disabled"}
         
-        # 2. アカウントディレクトリ検索
-        account_dir = find_account_directory(pipeline_data['platform_directory'], pipeline_data['account_id'])
-        broadcast_dir = os.path.join(account_dir, lv_value)
+        # 2. 統合JSONファイル読み込み
+        broadcast_data = load_broadcast_data(pipeline_data)
         
-        # 3. 統合JSONファイル読み込み
-        broadcast_data = load_broadcast_data(broadcast_dir, lv_value)
-        
-        # 4. API設定確認（会話専用モデルを使用）
+        # 3. API設定確認（会話専用モデルを使用）
         ai_model = config["api_settings"].get("conversation_ai_model", config["api_settings"].get("ai_model", "openai-gpt4o"))
         
         if ai_model == "openai-gpt4o":
@@ -44,24 +39,28 @@ def process(pipeline_data):
             print(f"未対応のAIモデル: {ai_model}")
             return {"conversation_generated": False, "reason": "unsupported_model"}
         
-        # 5. 開始前会話生成
-        intro_chat = generate_intro_conversation(broadcast_data, config, ai_model)
-        
-        # 6. 終了後会話生成
-        outro_chat = generate_outro_conversation(broadcast_data, config, ai_model)
+        # 4. 開始前会話・終了後会話を並列に生成（互いに独立したAPI呼び出し）
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            intro_future = executor.submit(generate_intro_conversation, broadcast_data, config, ai_model)
+            outro_future = executor.submit(generate_outro_conversation, broadcast_data, config, ai_model)
+            intro_chat = intro_future.result()
+            outro_chat = outro_future.result()
         
-        # 7. 統合JSONに結果を追加
+        # 5. 統合JSONに結果を追加
+        updates = {}
         if intro_chat:
-            broadcast_data['intro_chat'] = intro_chat
+            updates['intro_chat'] = intro_chat
         if outro_chat:
-            broadcast_data['outro_chat'] = outro_chat
+            updates['outro_chat'] = outro_chat
         
         # 会話生成時刻を記録
-        broadcast_data['conversation_generated_at'] = datetime.now().isoformat()
+        updates['conversation_generated_at'] = datetime.now().isoformat()
         
-        save_broadcast_data(broadcast_dir, lv_value, broadcast_data)
+        get_broadcast_document(pipeline_data).update_data(updates)
         
         print(f"Step08 完了: {lv_value} - 開始前会話: {len(intro_chat) if intro_chat else 0}発言, 終了後会話: {len(outro_chat) if outro_chat else 0}発言")
+        if not intro_chat and not outro_chat:
+            return {"conversation_generated": False, "reason": "empty_conversation", "status": "failed"}
         return {
             "conversation_generated": True, 
             "intro_chat_count": len(intro_chat) if intro_chat else 0,
@@ -73,19 +72,9 @@ def process(pipeline_data):
         print(f"Step08 エラー: {str(e)}")
         raise
 
-def load_broadcast_data(broadcast_dir, lv_value):
-    """統合JSONファイルを読み込み"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    if os.path.exists(json_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    raise Exception(f"統合JSONファイルが見つかりません: {json_path}")
-
-def save_broadcast_data(broadcast_dir, lv_value, broadcast_data):
-    """統合JSONファイルを保存"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
+def load_broadcast_data(pipeline_data):
+    """統合JSONを取得（放送ドキュメント経由、ファイルの読み込みはパイプライン内で1回）"""
+    return get_broadcast_document(pipeline_data).data
 
 def generate_intro_conversation(broadcast_data, config, ai_model):
     """開始前会話生成"""
@@ -138,7 +127,7 @@ def generate_intro_conversation(broadcast_data, config, ai_model):
 【重要】会話は必ず{char1_name}から開始してください。"""
         
         # AI呼び出し
-        conversation = call_ai_api(system_prompt, user_prompt, config, ai_model)
+        conversation = call_ai_api(system_prompt, user_prompt, config, ai_model, (char1_name, char2_name))
         
         if conversation:
             print("開始前会話生成完了")
@@ -192,7 +181,7 @@ def generate_outro_conversation(broadcast_data, config, ai_model):
 上記の{broadcaster}さんの放送内容を振り返って、感想や印象に残ったことを語り合う会話を作成してください。"""
         
         # AI呼び出し
-        conversation = call_ai_api(system_prompt, user_prompt, config, ai_model)
+        conversation = call_ai_api(system_prompt, user_prompt, config, ai_model, (char1_name, char2_name))
         
         if conversation:
             print("終了後会話生成完了")
@@ -225,100 +214,118 @@ def create_system_prompt(char1_name, char1_personality, char2_name, char2_person
 JSON形式:
 {{"conversation": [{{"name": "キャラクター名", "dialogue": "セリフ"}}]}}"""
 
-def call_ai_api(system_prompt, user_prompt, config, ai_model):
-    """AI API呼び出し（OpenAIまたはGoogle）"""
+class ConversationFormatError(Exception):
+    """AI応答が会話JSONの形式を満たさない"""
+    pass
+
+def call_ai_api(system_prompt, user_prompt, config, ai_model, char_names=None):
+    """AI API呼び出し（OpenAIまたはGoogle、形式不正時は理由を添えて1回だけ再生成）"""
     try:
-        if ai_model == "openai-gpt4o":
-            return call_openai_api(system_prompt, user_prompt, config)
-        elif ai_model == "google-gemini-2.5-flash":
-            return call_google_api(system_prompt, user_prompt, config)
-        else:
-            raise Exception(f"未対応のAIモデル: {ai_model}")
+        correction = None
+        for attempt in range(2):
+            if ai_model == "openai-gpt4o":
+                response_text = call_openai_api(system_prompt, user_prompt, config, correction)
+            elif ai_model == "google-gemini-2.5-flash":
+                response_text = call_google_api(system_prompt, user_prompt, config, correction)
+            else:
+                raise Exception(f"未対応のAIモデル: {ai_model}")
+            
+            try:
+                return parse_conversation_json(response_text, char_names)
+            except ConversationFormatError as e:
+                print(f"会話データの形式が不正です ({attempt + 1}回目): {str(e)}")
+                print(f"応答テキスト: {response_text[:200]}...")
+                correction = (response_text, str(e))
+        
+        return []
             
     except Exception as e:
         print(f"AI API呼び出しエラー: {str(e)}")
         return []
 
-def call_openai_api(system_prompt, user_prompt, config):
-    """OpenAI API呼び出し"""
-    try:
-        api_key = config["api_settings"]["openai_api_key"]
-        client = openai.OpenAI(api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.8
-        )
-        
-        response_text = response.choices[0].message.content.strip()
-        return parse_conversation_json(response_text)
-        
-    except Exception as e:
-        print(f"OpenAI API呼び出しエラー: {str(e)}")
-        return []
+def create_correction_prompt(error_message):
+    """形式不正だった応答の再生成指示"""
+    return f"""直前の応答は次の理由で指定のJSON形式になっていません: {error_message}
+会話の内容は保ったまま、指定のJSON形式のみを出力し直してください。"""
 
-def call_google_api(system_prompt, user_prompt, config):
-    """Google Gemini API呼び出し"""
-    try:
-        api_key = config["api_settings"]["google_api_key"]
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
-        # システムプロンプトとユーザープロンプトを結合
-        combined_prompt = f"{system_prompt}\n\n{user_prompt}"
-        
-        response = model.generate_content(
-            combined_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=2000,
-                temperature=0.8
-            )
+def call_openai_api(system_prompt, user_prompt, config, correction=None):
+    """OpenAI API呼び出し（JSONモードで応答テキストを返す）"""
+    api_key = config["api_settings"]["openai_api_key"]
+    import openai
+    client = openai.OpenAI(api_key=api_key)
+    
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    if correction:
+        previous_response, error_message = correction
+        messages.append({"role": "assistant", "content": previous_response})
+        messages.append({"role": "user", "content": create_correction_prompt(error_message)})
+    
+    response = client.chat.completions.create(
+        model="gpt-4o",
+        messages=messages,
+        max_tokens=2000,
+        temperature=0.8,
+        response_format={"type": "json_object"}
+    )
+    
+    return (response.choices[0].message.content or '').strip()
+
+def call_google_api(system_prompt, user_prompt, config, correction=None):
+    """Google Gemini API呼び出し（JSON出力指定で応答テキストを返す）"""
+    api_key = config["api_settings"]["google_api_key"]
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    
+    # システムプロンプトとユーザープロンプトを結合
+    combined_prompt = f"{system_prompt}\n\n{user_prompt}"
+    if correction:
+        previous_response, error_message = correction
+        combined_prompt += f"\n\n直前の応答:\n{previous_response}\n\n{create_correction_prompt(error_message)}"
+    
+    response = model.generate_content(
+        combined_prompt,
+        generation_config=genai.types.GenerationConfig(
+            max_output_tokens=2000,
+            temperature=0.8,
+            response_mime_type="application/json"
         )
-        
-        response_text = response.text.strip()
-        return parse_conversation_json(response_text)
-        
-    except Exception as e:
-        print(f"Google API呼び出しエラー: {str(e)}")
-        return []
+    )
+    
+    return response.text.strip()
 
-def parse_conversation_json(response_text):
-    """AI応答からJSON会話データを解析"""
+def parse_conversation_json(response_text, char_names=None):
+    """AI応答からJSON会話データを解析・検証（不正な場合はConversationFormatError）"""
+    # JSONマーカーを除去
+    response_text = response_text.replace('```json', '').replace('```', '').strip()
+    
     try:
-        # JSONマーカーを除去
-        response_text = response_text.replace('```json', '').replace('```', '').strip()
-        
-        # JSON解析
         conversation_data = json.loads(response_text)
-        
-        # 会話データの検証
-        if isinstance(conversation_data, dict) and 'conversation' in conversation_data:
-            conversation_list = conversation_data['conversation']
-            if isinstance(conversation_list, list):
-                # 各会話項目を検証
-                valid_conversation = []
-                for item in conversation_list:
-                    if isinstance(item, dict) and 'name' in item and 'dialogue' in item:
-                        valid_conversation.append({
-                            'name': str(item['name']),
-                            'dialogue': str(item['dialogue'])
-                        })
-                
-                print(f"会話解析成功: {len(valid_conversation)}発言")
-                return valid_conversation
-        
-        print("会話データの形式が不正です")
-        return []
-        
     except json.JSONDecodeError as e:
-        print(f"JSON解析エラー: {str(e)}")
-        print(f"応答テキスト: {response_text[:200]}...")
-        return []
-    except Exception as e:
-        print(f"会話解析エラー: {str(e)}")
-        return []
\ No newline at end of file
+        raise ConversationFormatError(f"JSONとして解析できません ({str(e)})")
+    
+    # {"conversation": [{"name": ..., "dialogue": ...}]} の形式を検証
+    if not isinstance(conversation_data, dict) or not isinstance(conversation_data.get('conversation'), list):
+        raise ConversationFormatError('"conversation" 配列がありません')
+    
+    conversation_list = conversation_data['conversation']
+    if not conversation_list:
+        raise ConversationFormatError('"conversation" が空です')
+    
+    valid_conversation = []
+    for i, item in enumerate(conversation_list):
+        if not isinstance(item, dict):
+            raise ConversationFormatError(f"{i + 1}番目の発言がオブジェクトではありません")
+        name = item.get('name')
+        dialogue = item.get('dialogue')
+        if not isinstance(name, str) or not isinstance(dialogue, str) or not dialogue.strip():
+            raise ConversationFormatError(f'{i + 1}番目の発言に "name" または "dialogue" がありません')
+        if char_names and name not in char_names:
+            raise ConversationFormatError(f"{i + 1}番目の発言者 \"{name}\" はキャラクター名（{'、'.join(char_names)}）ではありません")
+        valid_conversation.append({'name': name, 'dialogue': dialogue})
+    
+    print(f"会話解析成功: {len(valid_conversation)}発言")
+    return valid_conversation
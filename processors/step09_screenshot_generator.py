@@ -1,10 +1,12 @@
 import os
-import json
 from datetime import datetime
 import subprocess
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.fs_index import get_account_index
+from pipeline_modules.media_probe import probe_media
+from pipeline_modules.broadcast_document import get_broadcast_document
 import math
 
 def process(pipeline_data):
@@ -30,9 +32,11 @@ def process(pipeline_data):
             raise Exception(f"MP4ファイルが見つかりません: {lv_value}")
         
         # 4. 統合JSONから動画時間とtime_diff_seconds取得
-        broadcast_data = load_broadcast_data(broadcast_dir, lv_value)
+        broadcast_data = load_broadcast_data(pipeline_data)
         video_duration = broadcast_data.get('video_duration', 0.0)
         time_diff_seconds = broadcast_data.get('time_diff_seconds', 0)
+        if not video_duration:
+            video_duration = probe_media(mp4_path)['duration']
         
         # 5. スクリーンショットディレクトリ作成
         screenshot_dir = os.path.join(broadcast_dir, "screenshot", lv_value)
@@ -57,21 +61,14 @@ def find_mp4_file(account_dir, lv_value):
     if not os.path.exists(account_dir):
         return None
     
-    for filename in os.listdir(account_dir):
-        if filename.endswith('.mp4') and lv_value in filename:
-            mp4_path = os.path.join(account_dir, filename)
-            print(f"MP4ファイル発見: {mp4_path}")
-            return mp4_path
-    
-    return None
+    mp4_path = get_account_index(account_dir).mp4(lv_value)
+    if mp4_path:
+        print(f"MP4ファイル発見: {mp4_path}")
+    return mp4_path
 
-def load_broadcast_data(broadcast_dir, lv_value):
-    """統合JSONファイルを読み込み"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    if os.path.exists(json_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    raise Exception(f"統合JSONファイルが見つかりません: {json_path}")
+def load_broadcast_data(pipeline_data):
+    """統合JSONを取得（放送ドキュメント経由、ファイルの読み込みはパイプライン内で1回）"""
+    return get_broadcast_document(pipeline_data).data
 
 def generate_screenshots(mp4_path, screenshot_dir, video_duration, time_diff_seconds):
     """録画ファイルから10秒刻みでスクリーンショット生成"""
@@ -90,7 +87,7 @@ def generate_screenshots(mp4_path, screenshot_dir, video_duration, time_diff_sec
             
             output_path = os.path.join(screenshot_dir, f"{recording_seconds}.jpg")
             
-            # ffmpegでスクリーンショット生成（80x60にリサイズ）
+            # ffmpegでスクリーンショット生成（80x60にリサイズ、-i の前の -ss で先頭からのデコードを省き、時刻は正確）
             cmd = [
                 'ffmpeg', '-y',
                 '-ss', str(recording_seconds),
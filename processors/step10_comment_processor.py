@@ -1,10 +1,11 @@
 import os
-import json
 import xml.etree.ElementTree as ET
 from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
+from pipeline_modules.live_comments import LiveCommentIngester, chat_to_comment, add_to_user_stats, build_ranking
 
 def process(pipeline_data):
     """Step10: コメントデータ処理"""
@@ -18,22 +19,33 @@ def process(pipeline_data):
         broadcast_dir = os.path.join(account_dir, lv_value)
         
         # 2. 統合JSONからNCVのXMLパスとStartTimeを取得
-        broadcast_data = load_broadcast_data(broadcast_dir, lv_value)
+        broadcast_data = load_broadcast_data(pipeline_data)
         ncv_xml_path = broadcast_data.get('ncv_xml_path', '')
         start_time = int(broadcast_data.get('start_time', 0))
         
         if not ncv_xml_path or not os.path.exists(ncv_xml_path):
             raise Exception(f"NCVのXMLファイルが見つかりません: {ncv_xml_path}")
         
-        # 3. XMLからコメントデータを解析
-        comments_data = parse_comments_from_xml(ncv_xml_path, start_time)
-        
-        # 4. コメントランキングを生成
-        ranking_data = generate_comment_ranking(comments_data)
+        # 3. 配信中に取り込み済みなら続きだけ読み、なければXMLからコメントデータを解析
+        ingester = LiveCommentIngester(ncv_xml_path, broadcast_dir, lv_value, start_time)
+        if ingester.has_progress():
+            added = ingester.poll()
+            comments_data = ingester.comments() if ingester.state['store_size'] else []
+            print(f"配信中に取り込んだコメントを使用: {len(comments_data)}件（終了後の追加 {added}件）")
+            
+            # 4. コメントランキング（取り込み時に集計済み）
+            ranking_data = ingester.ranking()
+            print(f"コメントランキング: {len(ranking_data)}ユーザー")
+        else:
+            comments_data = parse_comments_from_xml(ncv_xml_path, start_time)
+            
+            # 4. コメントランキングを生成
+            ranking_data = generate_comment_ranking(comments_data)
         
         # 5. ファイル保存
-        comments_file = save_comments_json(broadcast_dir, lv_value, comments_data)
-        ranking_file = save_ranking_json(broadcast_dir, lv_value, ranking_data)
+        doc = get_broadcast_document(pipeline_data)
+        comments_file = save_comments_json(doc, lv_value, comments_data)
+        ranking_file = save_ranking_json(doc, lv_value, ranking_data)
         
         print(f"Step10 完了: {lv_value} - コメント数: {len(comments_data)}, ランキング: {len(ranking_data)}")
         return {
@@ -47,13 +59,9 @@ def process(pipeline_data):
         print(f"Step10 エラー: {str(e)}")
         raise
 
-def load_broadcast_data(broadcast_dir, lv_value):
-    """統合JSONファイルを読み込み"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    if os.path.exists(json_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    raise Exception(f"統合JSONファイルが見つかりません: {json_path}")
+def load_broadcast_data(pipeline_data):
+    """統合JSONを取得（放送ドキュメント経由、ファイルの読み込みはパイプライン内で1回）"""
+    return get_broadcast_document(pipeline_data).data
 
 def parse_comments_from_xml(xml_path, start_time):
     """NCVのXMLからコメントデータを解析"""
@@ -74,34 +82,10 @@ def parse_comments_from_xml(xml_path, start_time):
         
         for chat in chat_elements:
             try:
-                comment_date = int(chat.get('date', 0))
-                if comment_date == 0:
-                    continue
-                
-                # 配信開始からの秒数を計算
-                broadcast_seconds = comment_date - start_time
-                
-                # 負の値（配信開始前）はスキップ
-                if broadcast_seconds < 0:
-                    continue
-                
-                # タイムブロック計算（10秒刻み）
-                timeline_block = (broadcast_seconds // 10) * 10
-                
-                # コメントデータを構築
-                comment_data = {
-                    "no": int(chat.get('no', 0)),
-                    "user_id": chat.get('user_id', ''),
-                    "user_name": chat.get('name', ''),
-                    "text": chat.text or '',
-                    "date": comment_date,
-                    "broadcast_seconds": broadcast_seconds,
-                    "timeline_block": timeline_block,
-                    "premium": int(chat.get('premium', 0)),
-                    "anonymity": 'anonymity' in chat.attrib
-                }
-                
-                comments.append(comment_data)
+                # コメントデータを構築（日時なし・配信開始前はスキップ）
+                comment_data = chat_to_comment(chat, start_time)
+                if comment_data is not None:
+                    comments.append(comment_data)
                 
             except (ValueError, TypeError) as e:
                 print(f"コメント解析エラー: {str(e)}")
@@ -120,43 +104,13 @@ def parse_comments_from_xml(xml_path, start_time):
 def generate_comment_ranking(comments_data):
     """コメントランキングを生成"""
     try:
+        # ユーザー別にコメントを集計（配信中の取り込みと同じ集計方法）
         user_stats = {}
-        
-        # ユーザー別にコメントを集計
         for comment in comments_data:
-            user_id = comment['user_id']
-            
-            if user_id not in user_stats:
-                user_stats[user_id] = {
-                    "user_id": user_id,
-                    "user_name": comment['user_name'],
-                    "comment_count": 0,
-                    "first_comment": "",
-                    "first_comment_time": 0,
-                    "last_comment": "",
-                    "last_comment_time": 0,
-                    "premium": comment['premium'],
-                    "anonymity": comment['anonymity']
-                }
-            
-            user_stat = user_stats[user_id]
-            user_stat["comment_count"] += 1
-            
-            # 初回コメント
-            if user_stat["comment_count"] == 1:
-                user_stat["first_comment"] = comment['text']
-                user_stat["first_comment_time"] = comment['broadcast_seconds']
-            
-            # 最新コメント（常に更新）
-            user_stat["last_comment"] = comment['text']
-            user_stat["last_comment_time"] = comment['broadcast_seconds']
-        
-        # コメント数順にソート
-        ranking = sorted(user_stats.values(), key=lambda x: x['comment_count'], reverse=True)
+            add_to_user_stats(user_stats, comment)
         
-        # ランク付け
-        for i, user in enumerate(ranking, 1):
-            user["rank"] = i
+        # コメント数順にソートしてランク付け
+        ranking = build_ranking(user_stats)
         
         print(f"コメントランキング: {len(ranking)}ユーザー")
         return ranking
@@ -165,18 +119,17 @@ def generate_comment_ranking(comments_data):
         print(f"ランキング生成エラー: {str(e)}")
         raise
 
-def save_comments_json(broadcast_dir, lv_value, comments_data):
-    """コメントJSONを保存"""
+def save_comments_json(doc, lv_value, comments_data):
+    """コメントJSONを保存（ステップ終了時に書き出し）"""
     try:
-        comments_file = os.path.join(broadcast_dir, f"{lv_value}_comments.json")
+        comments_file = doc.path('comments')
         
-        with open(comments_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "lv_value": lv_value,
-                "total_comments": len(comments_data),
-                "created_at": datetime.now().isoformat(),
-                "comments": comments_data
-            }, f, ensure_ascii=False, indent=2)
+        doc.set_section('comments', {
+            "lv_value": lv_value,
+            "total_comments": len(comments_data),
+            "created_at": datetime.now().isoformat(),
+            "comments": comments_data
+        })
         
         print(f"コメントJSON保存: {comments_file}")
         return comments_file
@@ -185,18 +138,17 @@ def save_comments_json(broadcast_dir, lv_value, comments_data):
         print(f"コメントJSON保存エラー: {str(e)}")
         raise
 
-def save_ranking_json(broadcast_dir, lv_value, ranking_data):
-    """ランキングJSONを保存"""
+def save_ranking_json(doc, lv_value, ranking_data):
+    """ランキングJSONを保存（ステップ終了時に書き出し）"""
     try:
-        ranking_file = os.path.join(broadcast_dir, f"{lv_value}_comment_ranking.json")
-        
-        with open(ranking_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                "lv_value": lv_value,
-                "total_users": len(ranking_data),
-                "created_at": datetime.now().isoformat(),
-                "ranking": ranking_data
-            }, f, ensure_ascii=False, indent=2)
+        ranking_file = doc.path('comment_ranking')
+        
+        doc.set_section('comment_ranking', {
+            "lv_value": lv_value,
+            "total_users": len(ranking_data),
+            "created_at": datetime.now().isoformat(),
+            "ranking": ranking_data
+        })
         
         print(f"ランキングJSON保存: {ranking_file}")
         return ranking_file
@@ -1,15 +1,23 @@
 # processors/step11_06_special_user_html_generator.py
-import json
 import os
 from datetime import datetime
-import shutil
 import sys
+import importlib.util
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
+from pipeline_modules.nickname_resolver import get_nickname_resolver
+from pipeline_modules.special_user_history import SpecialUserHistory
+from pipeline_modules.static_assets import publish_static_assets
+from pipeline_modules.storage import storage_settings, write_html
+from pipeline_modules.special_user_analysis import (
+    build_comment_lines, comment_set_key, cached_analysis, run_analyses, ANALYSIS_FAILED,
+    DEFAULT_MAX_WORKERS, DEFAULT_PROVIDER_CONCURRENCY, DEFAULT_PROMPT_MAX_TOKENS
+)
+# 有無だけ確認し、読み込みは実際に使う時まで遅らせる
 try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
+    GEMINI_AVAILABLE = importlib.util.find_spec('google.generativeai') is not None
+except ModuleNotFoundError:
     GEMINI_AVAILABLE = False
 
 
@@ -26,17 +34,31 @@ def process(pipeline_data):
         broadcast_dir = os.path.join(account_dir, lv_value)
         
         # 2. 統合JSONファイル読み込み
-        broadcast_data = load_broadcast_data(broadcast_dir, lv_value)
+        broadcast_data = load_broadcast_data(pipeline_data)
         
         # 3. comments.jsonからスペシャルユーザーを検索
         special_users = get_special_users_from_config(config)
-        comments_json_path = os.path.join(broadcast_dir, f"{lv_value}_comments.json")
-        found_special_users = find_special_users_in_comments(comments_json_path, special_users)
+        comments_data = get_broadcast_document(pipeline_data).load('comments', required=False)
+        found_special_users = find_special_users_in_comments(comments_data, special_users)
         
-        # 4. スペシャルユーザーが見つかった場合、ページを生成
+        # 4. スペシャルユーザーが見つかった場合、ニックネームをまとめて取得してページを生成
         if found_special_users:
+            nicknames = get_nickname_resolver().resolve_many([u['user_id'] for u in found_special_users])
             for user_data in found_special_users:
-                create_special_user_pages(user_data, broadcast_data, broadcast_dir, lv_value, config)
+                if nicknames.get(user_data['user_id']):
+                    user_data['user_name'] = nicknames[user_data['user_id']]
+                    print(f"実際のニックネーム取得: {user_data['user_id']} -> {user_data['user_name']}")
+            
+            # AI分析はユーザー・プロバイダーをまたいで並列に実行し、ページ生成はその後で順番に
+            max_workers = config.get('special_users_config', {}).get('analysis_max_workers', DEFAULT_MAX_WORKERS)
+            analyses = run_analyses(
+                found_special_users,
+                lambda user_data: generate_analysis_text_with_config(user_data['comments'], config, user_data['user_id']),
+                max_workers
+            )
+            for user_data in found_special_users:
+                create_special_user_pages(user_data, broadcast_data, broadcast_dir, lv_value, config,
+                                          analyses.get(user_data['user_id']))
                 
         print(f"Step11 完了: {lv_value} - 検出スペシャルユーザー数: {len(found_special_users)}")
         return {"special_users_found": len(found_special_users), "users": [u['user_id'] for u in found_special_users]}
@@ -45,13 +67,9 @@ def process(pipeline_data):
         print(f"Step11 エラー: {str(e)}")
         raise
 
-def load_broadcast_data(broadcast_dir, lv_value):
-    """統合JSONファイルを読み込み"""
-    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-    if os.path.exists(json_path):
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    raise Exception(f"統合JSONファイルが見つかりません: {json_path}")
+def load_broadcast_data(pipeline_data):
+    """統合JSONを取得（放送ドキュメント経由、ファイルの読み込みはパイプライン内で1回）"""
+    return get_broadcast_document(pipeline_data).data
 
 def get_special_users_from_config(config):
     """設定からスペシャルユーザーリストを取得（詳細設定対応）"""
@@ -94,16 +112,13 @@ def get_user_detail_config(config, user_id):
         "tags": []
     }
 
-def find_special_users_in_comments(comments_json_path, special_users):
+def find_special_users_in_comments(comments_data, special_users):
     """comments.jsonからスペシャルユーザーを検索"""
-    if not os.path.exists(comments_json_path):
+    if comments_data is None:
         print("comments.jsonファイルが見つかりません")
         return []
     
     try:
-        with open(comments_json_path, 'r', encoding='utf-8') as f:
-            comments_data = json.load(f)
-        
         found_users = {}
         
         print(f"検出したコメント数: {len(comments_data.get('comments', []))}")
@@ -141,7 +156,7 @@ def find_special_users_in_comments(comments_json_path, special_users):
         traceback.print_exc()
         return []
 
-def create_special_user_pages(user_data, broadcast_data, broadcast_dir, lv_value, config=None):
+def create_special_user_pages(user_data, broadcast_data, broadcast_dir, lv_value, config=None, analysis_text=None):
     """スペシャルユーザーの一覧ページと個別ページを生成"""
     try:
         user_id = user_data['user_id']
@@ -150,13 +165,6 @@ def create_special_user_pages(user_data, broadcast_data, broadcast_dir, lv_value
         
         print(f"スペシャルユーザーページ生成中: {user_id} ({user_name})")
         
-        # ニックネームを取得して上書き
-        real_nickname = get_user_nickname_with_cache(user_id)
-        if real_nickname:
-            user_data['user_name'] = real_nickname
-            user_name = real_nickname
-            print(f"実際のニックネーム取得: {user_id} -> {real_nickname}")
-        
         # テンプレートディレクトリ
         template_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
         
@@ -165,14 +173,16 @@ def create_special_user_pages(user_data, broadcast_data, broadcast_dir, lv_value
         user_output_dir = os.path.join(account_dir, f"special_user_{user_id}")
         os.makedirs(user_output_dir, exist_ok=True)
         
-        # CSS/JSファイルをコピー
-        copy_static_files(template_dir, user_output_dir)
+        # CSS/JSはアカウント共通の static/ に公開済みのものを参照（変更があった時だけコピー）
+        assets = publish_static_assets(account_dir, template_dir)
         
         # 1. 個別ページ生成
-        create_user_detail_page(user_data, broadcast_data, template_dir, user_output_dir, lv_value, config)
+        create_user_detail_page(user_data, broadcast_data, template_dir, user_output_dir, lv_value, config, assets, analysis_text)
         
         # 2. 一覧ページ生成または更新
-        update_user_list_page(user_data, broadcast_data, template_dir, user_output_dir, lv_value)
+        page_size = (config or {}).get('special_users_config', {}).get('list_page_size', 0)
+        update_user_list_page(user_data, broadcast_data, template_dir, user_output_dir, lv_value, page_size, assets,
+                              storage_settings(config))
         
         print(f"スペシャルユーザーページ生成完了: {user_output_dir}")
         
@@ -180,82 +190,7 @@ def create_special_user_pages(user_data, broadcast_data, broadcast_dir, lv_value
         print(f"スペシャルユーザーページ生成エラー: {str(e)}")
         raise
 
-def get_user_nickname(user_id):
-    """ニコニコ動画のユーザーページからニックネームを取得"""
-    try:
-        import requests
-        from bs4 import BeautifulSoup
-        import time
-        
-        url = f"https://www.nicovideo.jp/user/{user_id}"
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # ニックネームを取得
-        nickname_element = soup.find(class_="UserDetailsHeader-nickname")
-        
-        if nickname_element:
-            nickname = nickname_element.get_text(strip=True)
-            print(f"ユーザー {user_id} のニックネーム: {nickname}")
-            time.sleep(1)  # レート制限対策
-            return nickname
-        else:
-            print(f"ユーザー {user_id} のニックネームが見つかりません")
-            return None
-            
-    except Exception as e:
-        print(f"ユーザー {user_id} の情報取得エラー: {e}")
-        return None
-
-def get_user_nickname_with_cache(user_id, cache_dir="user_cache"):
-    """キャッシュ付きでニックネーム取得"""
-    import json
-    import os
-    from datetime import datetime, timedelta
-    
-    # キャッシュディレクトリ作成
-    os.makedirs(cache_dir, exist_ok=True)
-    cache_file = os.path.join(cache_dir, f"{user_id}.json")
-    
-    # キャッシュチェック（7日間有効）
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-            
-            cache_time = datetime.fromisoformat(cache_data['cached_at'])
-            if datetime.now() - cache_time < timedelta(days=7):
-                print(f"キャッシュからニックネーム取得: {user_id} -> {cache_data['nickname']}")
-                return cache_data['nickname']
-        except Exception as e:
-            print(f"キャッシュ読み込みエラー: {e}")
-    
-    # 新規取得
-    nickname = get_user_nickname(user_id)
-    
-    if nickname:
-        # キャッシュ保存
-        cache_data = {
-            'user_id': user_id,
-            'nickname': nickname,
-            'cached_at': datetime.now().isoformat()
-        }
-        try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"キャッシュ保存エラー: {e}")
-    
-    return nickname
-
-def create_user_detail_page(user_data, broadcast_data, template_dir, output_dir, lv_value, config=None):
+def create_user_detail_page(user_data, broadcast_data, template_dir, output_dir, lv_value, config=None, assets=None, analysis_text=None):
     """個別ユーザーページを生成"""
     user_id = user_data['user_id']
     
@@ -280,8 +215,13 @@ def create_user_detail_page(user_data, broadcast_data, template_dir, output_dir,
     # コメント行を生成（broadcast_secondsを使用）
     comment_rows = generate_comment_rows(user_data['comments'])
     
-    # 分析テキストを生成（詳細設定を考慮）
-    if config:
+    # 分析テキストを生成（詳細設定を考慮、並列実行で生成済みならそれを使う）
+    if analysis_text is ANALYSIS_FAILED:
+        # 並列実行で失敗したユーザーはここで再度AIを呼ばず、基本統計だけ表示する
+        analysis_text = generate_basic_stats(user_data['comments']) + "AI分析に失敗しました。"
+    elif analysis_text is not None:
+        pass
+    elif config:
         analysis_text = generate_analysis_text_with_config(user_data['comments'], config, user_id)
     else:
         analysis_text = generate_analysis_text(user_data['comments'])
@@ -298,11 +238,12 @@ def create_user_detail_page(user_data, broadcast_data, template_dir, output_dir,
     html_content = html_content.replace('{{user_id}}', user_data['user_id'])
     html_content = html_content.replace('{{comment_rows}}', comment_rows)
     html_content = html_content.replace('{{analysis_text}}', analysis_text)
+    if assets:
+        html_content = assets.rewrite_links(html_content)
     
     # ファイル保存
     output_path = os.path.join(output_dir, f"{user_data['user_id']}_{lv_value}_detail.html")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    write_html(output_path, html_content, storage_settings(config))
     
     print(f"個別ページ生成: {output_path}")
 
@@ -381,11 +322,43 @@ def generate_basic_stats(comments):
         - 平均文字数: {avg_chars:.1f}文字<br><br>
     """
 
+def format_comment_line(comment):
+    """AI分析プロンプト用のコメント1行"""
+    timestamp = format_unix_time(comment.get('date', ''))
+    time_str = format_seconds_to_time(comment.get('broadcast_seconds', 0))
+    return f"[{timestamp} - 放送内時間:{time_str}] {comment.get('text', '')}"
+
+def build_analysis_prompt(comments, config, user_detail_config, analysis_prompt):
+    """分析プロンプトを構築（コメントはトークン上限内に収める）"""
+    max_tokens = config.get('special_users_config', {}).get('analysis_prompt_max_tokens', DEFAULT_PROMPT_MAX_TOKENS)
+    comment_lines, note = build_comment_lines(comments, format_comment_line, max_tokens)
+    if note:
+        print(f"分析プロンプトを縮小: {user_detail_config['user_id']} {note}")
+    user_data_text = "\n".join(comment_lines)
+    
+    return f"""
+{analysis_prompt}
+
+ユーザーID: {user_detail_config['user_id']}
+表示名: {user_detail_config.get('display_name', 'なし')}
+総コメント数: {len(comments)}件
+
+コメント履歴:
+{note + chr(10) if note else ''}{user_data_text}
+
+上記のデータを基に、このユーザーの詳細な分析を日本語で行ってください。
+分析結果はHTML形式で出力し、<br>タグで改行してください。
+"""
+
+def get_provider_concurrency(config):
+    """プロバイダーごとの同時呼び出し数"""
+    concurrency = dict(DEFAULT_PROVIDER_CONCURRENCY)
+    concurrency.update(config.get('special_users_config', {}).get('analysis_provider_concurrency', {}))
+    return concurrency
+
 def generate_ai_analysis(comments, config, user_detail_config):
     """OpenAI APIを使用してユーザー分析を生成"""
     try:
-        import openai
-        
         # API設定を取得
         api_settings = config.get("api_settings", {})
         ai_model = user_detail_config.get("analysis_ai_model", "openai-gpt4o")  # OpenAIがデフォルト
@@ -396,16 +369,7 @@ def generate_ai_analysis(comments, config, user_detail_config):
             print("OpenAI APIキーが設定されていません")
             return None
         
-        # コメントデータを整理
-        comment_texts = []
-        for comment in comments:
-            timestamp = format_unix_time(comment.get('date', ''))
-            broadcast_seconds = comment.get('broadcast_seconds', 0)
-            time_str = format_seconds_to_time(broadcast_seconds)
-            text = comment.get('text', '')
-            comment_texts.append(f"[{timestamp} - 放送内時間:{time_str}] {text}")
-        
-        if not comment_texts:
+        if not comments:
             return "分析対象のコメントがありません。"
         
         # プロンプトを構築
@@ -416,39 +380,27 @@ def generate_ai_analysis(comments, config, user_detail_config):
         system_prompt = "あなたは優秀な精神科医です。次の文章は{name}と言う人物のコメントです。この文章を要約し、感情分析と精神分析をしてください。特に攻撃性と現実逃避に焦点を当てて下さい。要約は箇条書きにし、人物名に注目してください。そして鋭く批判的に要約してください。"
         system_prompt = system_prompt.replace("{name}", user_detail_config.get('display_name', user_detail_config['user_id']))
 
-        user_data_text = "\n".join(comment_texts)
-        
-        full_prompt = f"""
-{analysis_prompt}
+        full_prompt = build_analysis_prompt(comments, config, user_detail_config, analysis_prompt)
+        model_name = "gpt-4o" if ai_model == "openai-gpt4o" else "gpt-3.5-turbo"
 
-ユーザーID: {user_detail_config['user_id']}
-表示名: {user_detail_config.get('display_name', 'なし')}
-総コメント数: {len(comments)}件
-
-コメント履歴:
-{user_data_text}
-
-上記のデータを基に、このユーザーの詳細な分析を日本語で行ってください。
-分析結果はHTML形式で出力し、<br>タグで改行してください。
-"""
-
-        # OpenAI APIを呼び出し
-        client = openai.OpenAI(api_key=openai_api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o" if ai_model == "openai-gpt4o" else "gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},  # 置換済みを使用
-                {"role": "user", "content": full_prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.7
-        )
-        
-        ai_result = response.choices[0].message.content.strip()
-        
-
-        return ai_result
+        def call():
+            import openai
+            
+            # OpenAI APIを呼び出し
+            client = openai.OpenAI(api_key=openai_api_key)
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": system_prompt},  # 置換済みを使用
+                    {"role": "user", "content": full_prompt}
+                ],
+                max_tokens=1500,
+                temperature=0.7
+            )
+            return response.choices[0].message.content.strip()
+
+        cache_key = comment_set_key('openai', model_name, system_prompt, analysis_prompt, comments=comments)
+        return cached_analysis('openai', cache_key, call, get_provider_concurrency(config))
         
     except Exception as e:
         print(f"AI分析エラー: {str(e)}")
@@ -457,8 +409,6 @@ def generate_ai_analysis(comments, config, user_detail_config):
 def generate_gemini_analysis(comments, config, user_detail_config):
     """Google Gemini APIを使用してユーザー分析を生成"""
     try:
-        import google.generativeai as genai
-        
         # API設定を取得
         api_settings = config.get("api_settings", {})
         google_api_key = api_settings.get("google_api_key", "")
@@ -467,40 +417,24 @@ def generate_gemini_analysis(comments, config, user_detail_config):
             print("Google APIキーが設定されていません")
             return None
         
-        # Gemini APIを設定
-        genai.configure(api_key=google_api_key)
         # 設定からモデル名を取得
         ai_model = user_detail_config.get("analysis_ai_model", "google-gemini-2.5-flash")
         model_name = ai_model.replace("google-", "") if ai_model.startswith("google-") else ai_model
-        model = genai.GenerativeModel(model_name)
         
         # プロンプトを構築（OpenAIと同様）
-        comment_texts = []
-        for comment in comments:
-            timestamp = format_unix_time(comment.get('date', ''))
-            broadcast_seconds = comment.get('broadcast_seconds', 0)
-            time_str = format_seconds_to_time(broadcast_seconds)
-            text = comment.get('text', '')
-            comment_texts.append(f"[{timestamp} - 放送内時間:{time_str}] {text}")
-        
         analysis_prompt = user_detail_config.get("analysis_prompt", "")
-        user_data_text = "\n".join(comment_texts)
-        
-        full_prompt = f"""
-{analysis_prompt}
+        full_prompt = build_analysis_prompt(comments, config, user_detail_config, analysis_prompt)
 
-ユーザーID: {user_detail_config['user_id']}
-表示名: {user_detail_config.get('display_name', 'なし')}
-総コメント数: {len(comments)}件
-
-コメント履歴:
-{user_data_text}
-
-上記のデータを基に、このユーザーの詳細な分析を日本語で行ってください。
-分析結果はHTML形式で出力し、<br>タグで改行してください。
-"""
+        def call():
+            import google.generativeai as genai
+            
+            # Gemini APIを設定
+            genai.configure(api_key=google_api_key)
+            model = genai.GenerativeModel(model_name)
+            return model.generate_content(full_prompt).text
 
-        response = model.generate_content(full_prompt)
+        cache_key = comment_set_key('google', model_name, analysis_prompt, comments=comments)
+        analysis = cached_analysis('google', cache_key, call, get_provider_concurrency(config))
         
         metadata = f"""
 <div style="background-color: #f0f8ff; padding: 10px; margin: 10px 0; border-left: 4px solid #0066cc;">
@@ -511,7 +445,7 @@ def generate_gemini_analysis(comments, config, user_detail_config):
 </div>
 """
         
-        return metadata + response.text
+        return metadata + analysis
         
     except Exception as e:
         print(f"Gemini分析エラー: {str(e)}")
@@ -533,19 +467,36 @@ def generate_analysis_text(comments):
     
     return analysis
 
-def update_user_list_page(user_data, broadcast_data, template_dir, output_dir, lv_value):
-    """一覧ページを生成または更新（複数放送対応）"""
+def list_page_filename(user_id, page, page_count):
+    """一覧ページのファイル名（最新ページは従来どおり {user_id}_list.html）"""
+    if page >= page_count:
+        return f"{user_id}_list.html"
+    return f"{user_id}_list_p{page}.html"
+
+def generate_list_pagination(user_id, page, page_count):
+    """ページ送りリンク"""
+    if page_count <= 1:
+        return ""
+    links = []
+    for number in range(1, page_count + 1):
+        if number == page:
+            links.append(f'<span class="current-page">{number}</span>')
+        else:
+            links.append(f'<a href="{list_page_filename(user_id, number, page_count)}">{number}</a>')
+    return f'<div class="pagination">{" ".join(links)}</div>'
+
+def update_user_list_page(user_data, broadcast_data, template_dir, output_dir, lv_value, page_size=0, assets=None, storage=None):
+    """出演履歴に追記し、変更のあった一覧ページだけを生成（page_sizeが0ならページ分割なし）"""
+    user_id = user_data['user_id']
     template_path = os.path.join(template_dir, 'user_list.html')
-    list_file_path = os.path.join(output_dir, f"{user_data['user_id']}_list.html")
-    
-    # 既存の一覧ページがある場合は読み込み
-    existing_items = []
-    if os.path.exists(list_file_path):
-        existing_items = load_existing_broadcast_items(list_file_path)
+    list_file_path = os.path.join(output_dir, list_page_filename(user_id, 1, 1))
     
-    # 新しい放送アイテムを追加
-    new_item = generate_broadcast_items(user_data, broadcast_data, lv_value)
-    existing_items.append(new_item)
+    history = SpecialUserHistory(output_dir, user_id)
+    change = history.record(lv_value, broadcast_data, user_data['user_name'], user_data['comments'])
+    # 履歴を作り直した初回は、既存の一覧ページが旧形式のままなので内容が同じでも全ページ生成する
+    if change is None and not history.rebuilt and os.path.exists(list_file_path):
+        print(f"一覧ページ変更なし: {list_file_path}")
+        return
     
     # テンプレートを読み込み
     if not os.path.exists(template_path):
@@ -555,19 +506,43 @@ def update_user_list_page(user_data, broadcast_data, template_dir, output_dir, l
     with open(template_path, 'r', encoding='utf-8') as f:
         template = f.read()
     
-    # 全ての放送アイテムを結合
-    all_items = '\n'.join(existing_items)
-
-    # テンプレート変数を置換
-    html_content = template.replace('{{broadcaster_name}}', user_data['user_name'])
-    html_content = html_content.replace('{{thumbnail_url}}', get_user_icon_path(user_data['user_id']))
-    html_content = html_content.replace('{{broadcast_items}}', all_items)
-    
-    # ファイル保存
-    with open(list_file_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
-    
-    print(f"一覧ページ更新: {list_file_path}")
+    pages = history.pages(page_size)
+    page_count = len(pages)
+    changed_page = history.page_of(lv_value, page_size)
+    previous_page_count = page_count
+    if change == 'added' and page_size > 0:
+        previous_page_count = max(1, -(-(len(history.entries) - 1) // page_size))
+    
+    if change is None or page_count != previous_page_count:
+        # ページ数が変わるとページ送りとファイル名が変わるので全ページ
+        targets = range(1, page_count + 1)
+    elif change == 'added':
+        # 途中に挿入された場合は以降のページがずれる
+        targets = range(changed_page, page_count + 1)
+    else:
+        targets = [changed_page]
+    
+    for page in targets:
+        items = [
+            generate_broadcast_items(
+                {'user_id': user_id, 'user_name': user_data['user_name'], 'comments': entry['comments']},
+                entry, entry['lv_value']
+            )
+            for entry in pages[page - 1]
+        ]
+        all_items = '\n'.join(items) + generate_list_pagination(user_id, page, page_count)
+        
+        # テンプレート変数を置換
+        html_content = template.replace('{{broadcaster_name}}', user_data['user_name'])
+        html_content = html_content.replace('{{thumbnail_url}}', get_user_icon_path(user_id))
+        html_content = html_content.replace('{{broadcast_items}}', all_items)
+        if assets:
+            html_content = assets.rewrite_links(html_content)
+        
+        page_path = os.path.join(output_dir, list_page_filename(user_id, page, page_count))
+        write_html(page_path, html_content, storage)
+    
+    print(f"一覧ページ更新: {list_file_path} ({len(targets)}/{page_count}ページ, 履歴{len(history.entries)}件)")
 
 def generate_broadcast_items(user_data, broadcast_data, lv_value):
     """放送アイテムリストを生成（broadcast_secondsを使用）"""
@@ -614,46 +589,6 @@ def generate_broadcast_items(user_data, broadcast_data, lv_value):
     
     return item
 
-def load_existing_broadcast_items(list_file_path):
-    """既存の一覧ページから放送アイテムを抽出"""
-    try:
-        with open(list_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 簡単な方法：既存のlink-itemを抽出
-        import re
-        pattern = r'<div class="link-item">.*?</div>'
-        matches = re.findall(pattern, content, re.DOTALL)
-        return matches
-        
-    except Exception as e:
-        print(f"既存アイテム読み込みエラー: {str(e)}")
-        return []
-
-def copy_static_files(template_dir, output_dir):
-    """CSS/JSファイルを出力ディレクトリにコピー"""
-    try:
-        # cssディレクトリをコピー
-        css_src = os.path.join(template_dir, 'css')
-        css_dst = os.path.join(output_dir, 'css')
-        if os.path.exists(css_src):
-            shutil.copytree(css_src, css_dst, dirs_exist_ok=True)
-        
-        # jsディレクトリをコピー
-        js_src = os.path.join(template_dir, 'js')
-        js_dst = os.path.join(output_dir, 'js')
-        if os.path.exists(js_src):
-            shutil.copytree(js_src, js_dst, dirs_exist_ok=True)
-        
-        # assetsディレクトリをコピー
-        assets_src = os.path.join(template_dir, 'assets')
-        assets_dst = os.path.join(output_dir, 'assets')
-        if os.path.exists(assets_src):
-            shutil.copytree(assets_src, assets_dst, dirs_exist_ok=True)
-            
-    except Exception as e:
-        print(f"静的ファイルコピーエラー: {str(e)}")
-
 def get_user_icon_path(user_id):
     """ニコニコ動画のユーザーアイコンパスを生成"""
     if len(user_id) <= 4:
@@ -1,13 +1,19 @@
 import os
-import json
 import html
 import re
+import numpy as np
 from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.broadcast_document import get_broadcast_document
+from pipeline_modules.static_assets import publish_static_assets
+from pipeline_modules.storage import storage_settings, write_html
+from pipeline_modules.highlights import detect_highlights
 from datetime import datetime, timezone, timedelta
 
+BLOCK_SECONDS = 10   # タイムラインの1ブロックの秒数
+
 
 def process(pipeline_data):
     """Step12: 完全版HTML生成（全機能統合）"""
@@ -21,36 +27,41 @@ def process(pipeline_data):
         account_dir = find_account_directory(pipeline_data['platform_directory'], pipeline_data['account_id'])
         broadcast_dir = os.path.join(account_dir, lv_value)
         
-        # 2. 全データファイル読み込み
-        broadcast_data = load_json_file(broadcast_dir, f"{lv_value}_data.json")
-        transcript_data = load_json_file(broadcast_dir, f"{lv_value}_transcript.json")
-        comments_data = load_json_file(broadcast_dir, f"{lv_value}_comments.json")
-        ranking_data = load_json_file(broadcast_dir, f"{lv_value}_comment_ranking.json")
+        # 2. 全データ取得（前段のステップで読み込み済みならメモリ上のものを使う）
+        doc = get_broadcast_document(pipeline_data)
+        broadcast_data = load_section(doc, 'data')
+        transcript_data = load_section(doc, 'transcript')
+        comments_data = load_section(doc, 'comments')
+        ranking_data = load_section(doc, 'comment_ranking')
         
         # 3. 各種データ準備
         timeline_data = create_timeline_blocks(transcript_data, comments_data, lv_value, broadcast_data)
         transcript_blocks = timeline_data['transcript_blocks']
         comment_blocks = timeline_data['comment_blocks']
         word_ranking = prepare_word_ranking(broadcast_data)
-        comment_ranking = prepare_comment_ranking(ranking_data, account_dir, lv_value)
+        comment_ranking = prepare_comment_ranking(ranking_data, account_dir, lv_value, comments_data)
         ai_chats = prepare_ai_chats(broadcast_data, config)
         
-        # 4. 完全版HTMLを生成
+        # 見どころ検出（コメント密度・反応キーワード・感情の変化）
+        highlights, heat = detect_highlights(timeline_data['series'], comments_data.get('comments', []), config, BLOCK_SECONDS)
+        timeline_data['highlights'] = highlights
+        timeline_data['heat'] = heat
+        doc.update_data({'highlights': highlights})
+        print(f"見どころ検出: {len(highlights)}件")
+        
+        # 4. 完全版HTMLを生成（CSSはアカウント共通の static/ を参照）
+        assets = publish_static_assets(account_dir)
         html_content = generate_complete_html(
             timeline_data, broadcast_data, word_ranking, 
-            comment_ranking, ai_chats, config, lv_value
+            comment_ranking, ai_chats, config, lv_value, assets
         )
         
         # 5. HTMLファイル保存
-        html_file = save_html_file(broadcast_dir, lv_value, broadcast_data.get('live_title', 'タイトル不明'), html_content)
-        
-        # 6. 統合JSONにHTMLパスを追加
-        broadcast_data['html_file_path'] = os.path.basename(html_file)  # ファイル名のみ
+        html_file = save_html_file(broadcast_dir, lv_value, broadcast_data.get('live_title', 'タイトル不明'), html_content,
+                                   storage_settings(config))
         
-        # JSONを再保存
-        json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(broadcast_data, f, ensure_ascii=False, indent=2)
+        # 6. 統合JSONにHTMLパスを追加（ファイル名のみ）
+        doc.update_data({'html_file_path': os.path.basename(html_file)})
         
         print(f"Step12 完全版完了: {lv_value} - 完全HTML生成: {html_file}")
         return {"html_generated": True, "html_file": html_file}
@@ -61,16 +72,12 @@ def process(pipeline_data):
         traceback.print_exc()
         raise
 
-def load_json_file(directory, filename):
-    """JSONファイルを読み込み"""
-    file_path = os.path.join(directory, filename)
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+def load_section(doc, section):
+    """放送ドキュメントからセクションを取得（ファイルがなければ空）"""
+    return doc.load(section, required=False) or {}
 
 def create_timeline_blocks(transcript_data, comments_data, lv_value, broadcast_data):
-    """タイムラインブロックを文字起こしとコメントで分離して作成"""
+    """タイムラインブロックを文字起こしとコメントで分離して作成（時刻・スコアは配列でまとめて集計）"""
     try:
         # elapsed_timeから最大時間を計算
         elapsed_time = broadcast_data.get('elapsed_time', '')
@@ -78,101 +85,129 @@ def create_timeline_blocks(transcript_data, comments_data, lv_value, broadcast_d
         
         print(f"elapsed_time: {elapsed_time}, 最大秒数: {max_seconds}")
         
-        # 0秒からelapsed_time分まで全タイムブロックを生成
-        all_time_blocks = set(range(0, max_seconds + 1, 10))
+        # 0秒からelapsed_time分まで全タイムブロック
+        block_count = max_seconds // BLOCK_SECONDS + 1
+        block_starts = np.arange(block_count, dtype=np.int64) * BLOCK_SECONDS
         
-        # 文字起こし用ブロック辞書
-        transcript_blocks = {}
-        # コメント用ブロック辞書  
-        comment_blocks = {}
+        transcripts = transcript_data.get('transcripts', [])
+        comments = comments_data.get('comments', [])
+        print(f"文字起こしデータ: {len(transcripts)}件")
+        print(f"コメントデータ: {len(comments)}件")
+        print(f"生成する全タイムブロック数: {block_count}")
         
-        print(f"文字起こしデータ: {len(transcript_data.get('transcripts', []))}件")
-        print(f"コメントデータ: {len(comments_data.get('comments', []))}件")
-        print(f"生成する全タイムブロック数: {len(all_time_blocks)}")
+        # 文字起こし：ブロック番号を一括計算し、ブロックごとのスコア平均をbincountで集計
+        timestamps = np.fromiter((segment.get('timestamp', 0) for segment in transcripts), dtype=np.int64, count=len(transcripts))
+        segment_blocks = np.floor_divide(timestamps, BLOCK_SECONDS)
+        in_range = (segment_blocks >= 0) & (segment_blocks < block_count)   # elapsed_time範囲内のみ
+        segment_blocks = segment_blocks[in_range]
+        segment_counts = np.bincount(segment_blocks, minlength=block_count)
+        divisor = np.maximum(segment_counts, 1)
         
-        # まず全タイムブロックを空で初期化
-        for block_time in all_time_blocks:
-            transcript_blocks[block_time] = {
-                'start_seconds': block_time,
-                'end_seconds': block_time + 10,
-                'time_range': format_time_range(block_time, block_time + 10),
-                'transcript': '',  # 空で初期化
-                'center_score': 0.0,
-                'positive_score': 0.0,
-                'negative_score': 0.0,
-                'screenshot_path': f"./screenshot/{lv_value}/{timeline_block}.jpg"  # .png → .jpg
-            }
-            
-            comment_blocks[block_time] = {
+        scores = {}
+        for key in ('center_score', 'positive_score', 'negative_score'):
+            values = np.fromiter((segment.get(key, 0) or 0 for segment in transcripts), dtype=np.float64, count=len(transcripts))
+            scores[key] = np.round(np.bincount(segment_blocks, weights=values[in_range], minlength=block_count) / divisor, 3)
+        
+        # ブロック内の文字起こしは時刻順につなげる
+        texts = [''] * block_count
+        segment_indexes = np.flatnonzero(in_range)
+        order = np.lexsort((timestamps[in_range], segment_blocks))
+        boundaries = np.cumsum(segment_counts)[:-1]
+        for block_index, group in enumerate(np.split(segment_indexes[order], boundaries)):
+            if len(group):
+                texts[block_index] = ' '.join(html.escape(transcripts[i].get('text', '')) for i in group)
+        
+        center_list = scores['center_score'].tolist()
+        positive_list = scores['positive_score'].tolist()
+        negative_list = scores['negative_score'].tolist()
+        transcript_timeline = []
+        for block_index, block_time in enumerate(block_starts.tolist()):
+            transcript_timeline.append({
                 'start_seconds': block_time,
-                'end_seconds': block_time + 10,
-                'time_range': format_time_range(block_time, block_time + 10),
-                'comments': []  # 空で初期化
-            }
+                'end_seconds': block_time + BLOCK_SECONDS,
+                'time_range': format_time_range(block_time, block_time + BLOCK_SECONDS),
+                'transcript': texts[block_index],
+                'center_score': center_list[block_index],
+                'positive_score': positive_list[block_index],
+                'negative_score': negative_list[block_index],
+                'screenshot_path': f"./screenshot/{lv_value}/{block_time}.jpg"  # .png → .jpg
+            })
         
-        # 文字起こしデータを適切なブロックに配置
-        transcripts = transcript_data.get('transcripts', [])
-        for segment in transcripts:
-            timestamp = segment.get('timestamp', 0)
-            timeline_block = (timestamp // 10) * 10
-            
-            # elapsed_time範囲内のデータのみ処理
-            if timeline_block in transcript_blocks:
-                transcript_blocks[timeline_block].update({
-                    'transcript': html.escape(segment.get('text', '')),
-                    'center_score': round(segment.get('center_score', 0), 3),
-                    'positive_score': round(segment.get('positive_score', 0), 3),
-                    'negative_score': round(segment.get('negative_score', 0), 3),
-                })
+        # コメント：step10で付けたtimeline_blockでブロック分けし、ブロック内は放送内時間順
+        comment_blocks_raw = np.fromiter((comment.get('timeline_block', 0) or 0 for comment in comments), dtype=np.int64, count=len(comments))
+        comment_seconds = np.fromiter((comment.get('broadcast_seconds', 0) or 0 for comment in comments), dtype=np.float64, count=len(comments))
+        comment_block_index = np.floor_divide(comment_blocks_raw, BLOCK_SECONDS)
+        comment_in_range = (comment_blocks_raw % BLOCK_SECONDS == 0) & (comment_block_index >= 0) & (comment_block_index < block_count)
+        comment_block_index = comment_block_index[comment_in_range]
+        comment_counts = np.bincount(comment_block_index, minlength=block_count)
+        comment_indexes = np.flatnonzero(comment_in_range)
+        order = np.lexsort((comment_seconds[comment_in_range], comment_block_index))
+        groups = np.split(comment_indexes[order], np.cumsum(comment_counts)[:-1])
         
-        # コメントデータを適切なブロックに配置
-        comments = comments_data.get('comments', [])
-        for comment in comments:
-            timeline_block = comment.get('timeline_block', 0)
-            
-            # elapsed_time範囲内のデータのみ処理
-            if timeline_block in comment_blocks:
+        comment_timeline = []
+        for block_time, group in zip(block_starts.tolist(), groups):
+            block_comments = []
+            for i in group.tolist():
+                comment = comments[i]
+                user_id = comment.get('user_id', '')
                 user_url = ""
-                if not comment.get('anonymity', False) and comment.get('user_id', ''):
-                    user_url = f"https://www.nicovideo.jp/user/{comment.get('user_id', '')}"
-                
-                comment_data = {
+                if not comment.get('anonymity', False) and user_id:
+                    user_url = f"https://www.nicovideo.jp/user/{user_id}"
+                block_comments.append({
                     'index': comment.get('no', 0),
                     'time': format_seconds_to_time(comment.get('broadcast_seconds', 0)),
                     'user_name': html.escape(comment.get('user_name', '')),
                     'user_url': user_url,
                     'text': html.escape(comment.get('text', '')),
-                    'icon_url': f"https://secure-dcdn.cdn.nimg.jp/nicoaccount/usericon/{comment.get('user_id', '')[:4]}/{comment.get('user_id', '')}.jpg"
-                }
-                
-                comment_blocks[timeline_block]['comments'].append(comment_data)
-        
-        # ソートして配列に変換
-        transcript_timeline = []
-        comment_timeline = []
-        
-        for block_time in sorted(all_time_blocks):
-            transcript_timeline.append(transcript_blocks[block_time])
-            
-            block = comment_blocks[block_time]
-            block['comments'].sort(key=lambda x: x.get('time', ''))
-            comment_timeline.append(block)
+                    'icon_url': f"https://secure-dcdn.cdn.nimg.jp/nicoaccount/usericon/{user_id[:4]}/{user_id}.jpg"
+                })
+            comment_timeline.append({
+                'start_seconds': block_time,
+                'end_seconds': block_time + BLOCK_SECONDS,
+                'time_range': format_time_range(block_time, block_time + BLOCK_SECONDS),
+                'comments': block_comments
+            })
         
         print(f"文字起こしブロック作成完了: {len(transcript_timeline)}ブロック")
         print(f"コメントブロック作成完了: {len(comment_timeline)}ブロック")
         
         return {
             'transcript_blocks': transcript_timeline,
-            'comment_blocks': comment_timeline
+            'comment_blocks': comment_timeline,
+            # グラフ用の系列（ブロック順の配列）
+            'series': {
+                'start_seconds': block_starts,
+                'center_score': scores['center_score'],
+                'positive_score': scores['positive_score'],
+                'negative_score': scores['negative_score'],
+                'segment_count': segment_counts,
+                'comment_count': comment_counts
+            }
         }
         
     except Exception as e:
         print(f"タイムライン作成エラー: {str(e)}")
         return {
             'transcript_blocks': [],
-            'comment_blocks': []
+            'comment_blocks': [],
+            'series': empty_series()
         }
 
+def empty_series():
+    """ブロックがない場合のグラフ系列"""
+    return {
+        'start_seconds': np.zeros(0, dtype=np.int64),
+        'center_score': np.zeros(0),
+        'positive_score': np.zeros(0),
+        'negative_score': np.zeros(0),
+        'segment_count': np.zeros(0, dtype=np.int64),
+        'comment_count': np.zeros(0, dtype=np.int64)
+    }
+
+def js_array_items(values):
+    """配列をJavaScriptの配列リテラルの中身に変換"""
+    return ','.join(map(str, values.tolist()))
+
 def parse_elapsed_time_to_seconds(elapsed_time_str):
     """elapsed_time文字列を秒数に変換"""
     try:
@@ -212,24 +247,13 @@ def prepare_word_ranking(broadcast_data):
         print(f"単語ランキング準備エラー: {str(e)}")
         return []
 
-def prepare_comment_ranking(ranking_data, account_dir, lv_value):
+def prepare_comment_ranking(ranking_data, account_dir, lv_value, comments_data):
     """コメントランキングデータを準備（全コメント含む）"""
     try:
         comment_ranking = []
         
-        # 正しいパス: account_dir配下のlvディレクトリ
-        broadcast_dir = os.path.join(account_dir, lv_value)
-        comments_file = os.path.join(broadcast_dir, f"{lv_value}_comments.json")
-        
-        print(f"DEBUGLOG: コメントファイルパス: {comments_file}")
-        print(f"DEBUGLOG: ファイル存在確認: {os.path.exists(comments_file)}")
-        
         all_comments = {}
-        if os.path.exists(comments_file):
-            # 以下は既存のコード
-            with open(comments_file, 'r', encoding='utf-8') as f:
-                comments_data = json.load(f)
-
+        if comments_data:
             # ユーザーID別にコメントをグループ化
             for comment in comments_data.get('comments', []):
                 user_id = comment.get('user_id', '')
@@ -329,7 +353,7 @@ def prepare_ai_chats(broadcast_data, config):
         return {'intro': [], 'outro': []}
         
 
-def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_ranking, ai_chats, config, lv_value):
+def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_ranking, ai_chats, config, lv_value, assets=None):
     """完全版HTMLを生成（全機能統合）"""
     try:
         # timeline_dataから文字起こしとコメントブロックを取得
@@ -343,10 +367,11 @@ def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_
         image_data = broadcast_data.get('image_generation', {})
         
         # JavaScript用データ準備
-        segments_js = ','.join([str(block['start_seconds']) for block in transcript_blocks])
-        positive_data_js = ','.join([str(block['positive_score']) for block in transcript_blocks])
-        center_data_js = ','.join([str(block['center_score']) for block in transcript_blocks])
-        negative_data_js = ','.join([str(block['negative_score']) for block in transcript_blocks])
+        series = timeline_data.get('series') or empty_series()
+        segments_js = js_array_items(series['start_seconds'])
+        positive_data_js = js_array_items(series['positive_score'])
+        center_data_js = js_array_items(series['center_score'])
+        negative_data_js = js_array_items(series['negative_score'])
         
         # HTMLヘッダー
         html_parts.append(f"""<!DOCTYPE html>
@@ -355,7 +380,7 @@ def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{html.escape(broadcast_data.get('live_title', ''))}</title>
-    <link rel="stylesheet" href="css/archive-style.css" />
+    <link rel="stylesheet" href="{assets.url('css/archive-style.css') if assets else '../static/css/archive-style.css'}" />
     <style>
         body {{ font-family: Arial, sans-serif; margin: 20px; line-height: 1.6; }}
         .header {{ background: #f4f4f4; padding: 20px; margin-bottom: 20px; border-radius: 5px; }}
@@ -758,13 +783,14 @@ def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_
             
             html_parts.append("        </div>\n")
 
-        # 要約画像
-        if image_data.get('imgur_url'):
+        # 要約画像（Imgurへのアップロードに失敗した場合はローカルの画像）
+        image_src = image_data.get('imgur_url') or (f"../{image_data['local_path']}" if image_data.get('local_path') else '')
+        if image_src:
             html_parts.append(f"""
         <div class="summary-image">
             <h3>要約を元に生成した画像</h3>
-            <a href="{image_data['imgur_url']}" target="_blank">
-                <img src="{image_data['imgur_url']}" alt="配信の抽象化イメージ">
+            <a href="{image_src}" target="_blank">
+                <img src="{image_src}" alt="配信の抽象化イメージ">
             </a>
         </div>
 """)
@@ -793,6 +819,11 @@ def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_
 """)
             html_parts.append("        </div>\n    </div>\n")
 
+        # 見どころヒートストリップ
+        html_parts.append(generate_heat_strip(
+            timeline_data.get('highlights', []), timeline_data.get('heat'), series['start_seconds']
+        ))
+
         # 横並びタイムライン
         html_parts.append("""
     <div class="container">
@@ -833,17 +864,14 @@ def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_
 """)
 
         # コメントタイムライン - 全時間範囲をカバー
-        # まず全時間ブロックを取得
-        all_time_blocks = set()
-        for block in transcript_blocks:
-            all_time_blocks.add(block['start_seconds'])
-        for block in comment_blocks:
-            all_time_blocks.add(block['start_seconds'])
+        comment_blocks_by_time = {block['start_seconds']: block for block in comment_blocks}
+        all_time_blocks = set(comment_blocks_by_time)
+        all_time_blocks.update(block['start_seconds'] for block in transcript_blocks)
 
         # 全時間ブロックに対してコメントブロックを表示
         for time_second in sorted(all_time_blocks):
             # その時間にコメントがあるかチェック
-            comment_block = next((b for b in comment_blocks if b['start_seconds'] == time_second), None)
+            comment_block = comment_blocks_by_time.get(time_second)
             
             html_parts.append(f"""
                     <div class="time-block" id="time_block_{time_second}" style="height: 180px;">
@@ -1207,6 +1235,46 @@ def generate_complete_html(timeline_data, broadcast_data, word_ranking, comment_
         traceback.print_exc()
         return "<html><body>HTML生成エラー</body></html>"
 
+def generate_heat_strip(highlights, heat, block_starts):
+    """見どころのヒートストリップ（全ブロックを1枚のcanvasに描画、クリックでそのブロックへ移動）"""
+    if heat is None or len(heat) == 0:
+        return ""
+    
+    links = ''.join(
+        f'<a class="highlight-link" href="#time_block_{item["start_seconds"]}">'
+        f'{item["rank"]}. {item["time"]}（コメント{item["comment_count"]}件）</a>'
+        for item in highlights
+    )
+    return f"""
+    <div class="section heat-strip-section">
+        <h2>見どころ</h2>
+        <canvas id="heatStrip" width="1000" height="24" style="width: 100%; height: 24px; cursor: pointer;"></canvas>
+        <div class="highlight-links" style="display: flex; gap: 10px; flex-wrap: wrap; margin-top: 10px;">{links}</div>
+    </div>
+    <script>
+    (function () {{
+        var heat = [{js_array_items(heat)}];
+        var starts = [{js_array_items(block_starts)}];
+        var canvas = document.getElementById('heatStrip');
+        var context = canvas.getContext('2d');
+        var width = canvas.width / heat.length;
+        for (var i = 0; i < heat.length; i++) {{
+            // 0: 薄い青 → 100: 赤
+            context.fillStyle = 'hsl(' + (220 - heat[i] * 2.2) + ', 80%, ' + (92 - heat[i] * 0.4) + '%)';
+            context.fillRect(i * width, 0, Math.ceil(width), canvas.height);
+        }}
+        canvas.addEventListener('click', function (evt) {{
+            var rect = canvas.getBoundingClientRect();
+            var index = Math.min(heat.length - 1, Math.floor((evt.clientX - rect.left) / rect.width * heat.length));
+            var block = document.getElementById('time_block_' + starts[index]);
+            if (block) {{
+                block.scrollIntoView({{behavior: 'smooth', block: 'center'}});
+            }}
+        }});
+    }})();
+    </script>
+"""
+
 def format_time_range(start_seconds, end_seconds):
     """時間範囲を表記"""
     start_time = format_seconds_to_time(start_seconds)
@@ -1223,7 +1291,7 @@ def format_seconds_to_time(seconds):
     except:
         return "00:00:00"
 
-def save_html_file(broadcast_dir, lv_value, live_title, html_content):
+def save_html_file(broadcast_dir, lv_value, live_title, html_content, storage=None):
     """HTMLファイルを保存"""
     try:
         filename = f"{lv_value}_{live_title}.html"
@@ -1236,8 +1304,7 @@ def save_html_file(broadcast_dir, lv_value, live_title, html_content):
         
         html_file = os.path.join(broadcast_dir, filename)
         
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        write_html(html_file, html_content, storage, checksum=True)
         
         print(f"完全HTML保存完了: {html_file}")
         return html_file
@@ -6,6 +6,10 @@ from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.fs_index import get_directory_index, get_account_index
+from pipeline_modules.media_store import image_sources
+from pipeline_modules.atomic_io import load_json_safe
+from pipeline_modules.storage import storage_settings, write_html
 
 def process(pipeline_data):
     """Step13: 一覧ページ生成（index.html + タグページ）"""
@@ -45,38 +49,37 @@ def collect_broadcast_data(account_dir):
     broadcast_list = []
     
     try:
-        for item in os.listdir(account_dir):
-            item_path = os.path.join(account_dir, item)
+        account_index = get_account_index(account_dir)
+        for lv_value in account_index.broadcast_ids():
+            item_path = os.path.join(account_dir, lv_value)
             
-            # lv で始まるディレクトリのみ処理
-            if os.path.isdir(item_path) and item.startswith('lv'):
-                lv_value = item
+            # データファイル読み込み（壊れたファイルはその配信だけ飛ばす）
+            data_file = account_index.data_json(lv_value)
+            if data_file:
+                data = load_json_safe(data_file)
+                if not isinstance(data, dict):
+                    print(f"配信データを読み込めないためスキップ: {lv_value}")
+                    continue
                 
-                # データファイル読み込み
-                data_file = os.path.join(item_path, f"{lv_value}_data.json")
-                if os.path.exists(data_file):
-                    with open(data_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # HTMLファイル検索
-                    html_file = find_html_file(item_path, lv_value)
-                    if html_file:
-                        broadcast_info = {
-                            'lv_value': lv_value,
-                            'title': data.get('live_title', 'タイトル不明'),
-                            'broadcaster': data.get('broadcaster', '不明'),
-                            'start_time': data.get('start_time', 0),
-                            'watch_count': data.get('watch_count', 0),
-                            'comment_count': data.get('comment_count', 0),
-                            'elapsed_time': data.get('elapsed_time', ''),
-                            'summary_text': data.get('summary_text', ''),
-                            'html_file': data.get('html_file_path', ''),
-                            'image_url': data.get('image_generation', {}).get('imgur_url', ''),
-                            'music_urls': get_music_urls_multiple(data),
-                            'transcript_segments': get_transcript_segments(item_path, lv_value),
-                            'tags': []
-                        }
-                        broadcast_list.append(broadcast_info)
+                # HTMLファイル検索
+                html_file = find_html_file(item_path, lv_value)
+                if html_file:
+                    broadcast_info = {
+                        'lv_value': lv_value,
+                        'title': data.get('live_title', 'タイトル不明'),
+                        'broadcaster': data.get('broadcaster', '不明'),
+                        'start_time': data.get('start_time', 0),
+                        'watch_count': data.get('watch_count', 0),
+                        'comment_count': data.get('comment_count', 0),
+                        'elapsed_time': data.get('elapsed_time', ''),
+                        'summary_text': data.get('summary_text', ''),
+                        'html_file': data.get('html_file_path', ''),
+                        'image': image_sources(data.get('image_generation')),
+                        'music_urls': get_music_urls_multiple(data),
+                        'transcript_segments': get_transcript_segments(item_path, lv_value),
+                        'tags': []
+                    }
+                    broadcast_list.append(broadcast_info)
         
         # 開始時間順でソート（新しい順）
         broadcast_list.sort(key=lambda x: x['start_time'], reverse=True)
@@ -100,9 +103,10 @@ def get_music_urls_multiple(data):
 
 def find_html_file(broadcast_dir, lv_value):
     """配信ディレクトリからHTMLファイルを検索"""
-    for file in os.listdir(broadcast_dir):
-        if file.startswith(lv_value) and file.endswith('.html'):
-            return file  # ファイル名のみを返す
+    index = get_directory_index(broadcast_dir, watch=False)
+    html_path = index.find(lambda name: name.startswith(lv_value) and name.endswith('.html'))
+    if html_path:
+        return os.path.basename(html_path)  # ファイル名のみを返す
     return None
 
 def get_music_url(data):
@@ -116,10 +120,8 @@ def get_music_url(data):
 def get_transcript_text(broadcast_dir, lv_value):
     """文字起こしテキストを取得"""
     transcript_file = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-    if os.path.exists(transcript_file):
-        with open(transcript_file, 'r', encoding='utf-8') as f:
-            transcript_data = json.load(f)
-        
+    transcript_data = load_json_safe(transcript_file)
+    if isinstance(transcript_data, dict):
         transcripts = transcript_data.get('transcripts', [])
         return ' '.join([t.get('text', '') for t in transcripts])
     return ''
@@ -149,8 +151,7 @@ def generate_index_page(account_dir, broadcast_list, config):
     html_content = create_index_html(broadcast_list, config.get('tags', []))
     
     index_file = os.path.join(account_dir, 'index.html')
-    with open(index_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    write_html(index_file, html_content, storage_settings(config))
     
     print(f"一覧ページ生成: {index_file}")
 
@@ -167,8 +168,7 @@ def generate_tag_pages(account_dir, broadcast_list, tags_config, config):
             html_content = create_tag_html(filtered_broadcasts, tag, config.get('tags', []))
             
             tag_file = os.path.join(tags_dir, f"tag_{tag}.html")
-            with open(tag_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
+            write_html(tag_file, html_content, storage_settings(config))
             
             print(f"タグページ生成: {tag_file} ({len(filtered_broadcasts)}件)")
 
@@ -181,7 +181,9 @@ def create_index_html(broadcast_list, all_tags):
             'title': broadcast['title'],
             'broadcaster': broadcast['broadcaster'],
             'summary': broadcast['summary_text'],
-            'imageUrl': broadcast['image_url'],
+            'imageUrl': broadcast['image']['src'],
+            'imageAvif': broadcast['image']['avif'],
+            'imageWebp': broadcast['image']['webp'],
             'musicUrls': broadcast['music_urls'],  # 配列として渡す
             'comments': broadcast['transcript_segments']
         }
@@ -476,13 +478,24 @@ def create_index_html(broadcast_list, all_tags):
             previewPopup.className = 'preview-popup';
             
             if (data.imageUrl) {{
+                // 縮小版（AVIF/WebP）があればそちらを優先して読み込む
+                const picture = document.createElement('picture');
+                [['image/avif', data.imageAvif], ['image/webp', data.imageWebp]].forEach(([type, srcset]) => {{
+                    if (!srcset) return;
+                    const source = document.createElement('source');
+                    source.type = type;
+                    source.srcset = srcset;
+                    source.sizes = '500px';
+                    picture.appendChild(source);
+                }});
                 const img = document.createElement('img');
                 img.className = 'preview-image';
                 img.src = data.imageUrl;
                 img.onerror = function() {{
                     this.style.display = 'none';
                 }};
-                previewPopup.appendChild(img);
+                picture.appendChild(img);
+                previewPopup.appendChild(picture);
             }}
             
             const title = document.createElement('div');
@@ -687,10 +700,8 @@ def create_tag_html(filtered_broadcasts, tag, all_tags):
 def get_transcript_segments(broadcast_dir, lv_value):
     """文字起こしセグメントを個別に取得"""
     transcript_file = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-    if os.path.exists(transcript_file):
-        with open(transcript_file, 'r', encoding='utf-8') as f:
-            transcript_data = json.load(f)
-        
+    transcript_data = load_json_safe(transcript_file)
+    if isinstance(transcript_data, dict):
         transcripts = transcript_data.get('transcripts', [])
         # 空でないセグメントのみ取得、最大10個
         segments = []
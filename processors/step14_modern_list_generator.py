@@ -5,6 +5,10 @@ from datetime import datetime
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils import find_account_directory
+from pipeline_modules.fs_index import get_directory_index, get_account_index
+from pipeline_modules.media_store import image_sources
+from pipeline_modules.atomic_io import load_json_safe
+from pipeline_modules.storage import storage_settings, write_html
 
 def process(pipeline_data):
     """Step14: モダンな一覧ページ生成"""
@@ -25,7 +29,7 @@ def process(pipeline_data):
         processed_broadcasts = process_tags(broadcast_list, tags_config)
         
         # 4. モダン一覧ページ生成
-        generate_modern_list_page(account_dir, processed_broadcasts, tags_config)
+        generate_modern_list_page(account_dir, processed_broadcasts, tags_config, storage_settings(config))
         
         print(f"Step14 完了: {account_id} - モダン一覧ページ生成完了")
         return {"modern_list_generated": True, "broadcast_count": len(processed_broadcasts)}
@@ -41,35 +45,35 @@ def collect_broadcast_data(account_dir):
     broadcast_list = []
     
     try:
-        for item in os.listdir(account_dir):
-            item_path = os.path.join(account_dir, item)
+        account_index = get_account_index(account_dir)
+        for lv_value in account_index.broadcast_ids():
+            item_path = os.path.join(account_dir, lv_value)
             
-            if os.path.isdir(item_path) and item.startswith('lv'):
-                lv_value = item
+            data_file = account_index.data_json(lv_value)
+            if data_file:
+                data = load_json_safe(data_file)
+                if not isinstance(data, dict):
+                    print(f"配信データを読み込めないためスキップ: {lv_value}")
+                    continue
                 
-                data_file = os.path.join(item_path, f"{lv_value}_data.json")
-                if os.path.exists(data_file):
-                    with open(data_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    html_file = find_html_file(item_path, lv_value)
-                    if html_file:
-                        broadcast_info = {
-                            'lv_value': lv_value,
-                            'title': data.get('live_title', 'タイトル不明'),
-                            'broadcaster': data.get('broadcaster', '不明'),
-                            'start_time': data.get('start_time', 0),
-                            'watch_count': data.get('watch_count', 0),
-                            'comment_count': data.get('comment_count', 0),
-                            'elapsed_time': data.get('elapsed_time', ''),
-                            'summary_text': data.get('summary_text', ''),
-                            'html_file': html_file,
-                            'image_url': data.get('image_generation', {}).get('imgur_url', ''),
-                            'music_urls': get_music_urls(data),
-                            'transcript_segments': get_transcript_segments(item_path, lv_value),
-                            'tags': []
-                        }
-                        broadcast_list.append(broadcast_info)
+                html_file = find_html_file(item_path, lv_value)
+                if html_file:
+                    broadcast_info = {
+                        'lv_value': lv_value,
+                        'title': data.get('live_title', 'タイトル不明'),
+                        'broadcaster': data.get('broadcaster', '不明'),
+                        'start_time': data.get('start_time', 0),
+                        'watch_count': data.get('watch_count', 0),
+                        'comment_count': data.get('comment_count', 0),
+                        'elapsed_time': data.get('elapsed_time', ''),
+                        'summary_text': data.get('summary_text', ''),
+                        'html_file': html_file,
+                        'image': image_sources(data.get('image_generation')),
+                        'music_urls': get_music_urls(data),
+                        'transcript_segments': get_transcript_segments(item_path, lv_value),
+                        'tags': []
+                    }
+                    broadcast_list.append(broadcast_info)
         
         broadcast_list.sort(key=lambda x: x['start_time'], reverse=True)
         print(f"配信データ収集完了: {len(broadcast_list)}件")
@@ -81,9 +85,10 @@ def collect_broadcast_data(account_dir):
 
 def find_html_file(broadcast_dir, lv_value):
     """配信ディレクトリからHTMLファイルを検索"""
-    for file in os.listdir(broadcast_dir):
-        if file.startswith(lv_value) and file.endswith('.html'):
-            return os.path.join(lv_value, file)
+    index = get_directory_index(broadcast_dir, watch=False)
+    html_path = index.find(lambda name: name.startswith(lv_value) and name.endswith('.html'))
+    if html_path:
+        return os.path.join(lv_value, os.path.basename(html_path))
     return None
 
 def get_music_urls(data):
@@ -99,10 +104,8 @@ def get_music_urls(data):
 def get_transcript_segments(broadcast_dir, lv_value):
     """文字起こしセグメントを取得"""
     transcript_file = os.path.join(broadcast_dir, f"{lv_value}_transcript.json")
-    if os.path.exists(transcript_file):
-        with open(transcript_file, 'r', encoding='utf-8') as f:
-            transcript_data = json.load(f)
-        
+    transcript_data = load_json_safe(transcript_file)
+    if isinstance(transcript_data, dict):
         transcripts = transcript_data.get('transcripts', [])
         segments = []
         for t in transcripts:
@@ -126,7 +129,7 @@ def process_tags(broadcast_list, tags_config):
     
     return broadcast_list
 
-def generate_modern_list_page(account_dir, broadcast_list, tags_config):
+def generate_modern_list_page(account_dir, broadcast_list, tags_config, storage=None):
     """モダンでインタラクティブな配信一覧ページ生成"""
     try:
         # JavaScriptデータ準備
@@ -136,7 +139,9 @@ def generate_modern_list_page(account_dir, broadcast_list, tags_config):
                 'title': broadcast['title'],
                 'broadcaster': broadcast['broadcaster'],
                 'summary': broadcast['summary_text'],
-                'imageUrl': broadcast['image_url'],
+                'imageUrl': broadcast['image']['src'],
+                'imageAvif': broadcast['image']['avif'],
+                'imageWebp': broadcast['image']['webp'],
                 'musicUrls': broadcast['music_urls'],
                 'transcriptSegments': broadcast['transcript_segments'],
                 'tags': broadcast['tags']
@@ -463,7 +468,11 @@ def generate_modern_list_page(account_dir, broadcast_list, tags_config):
     </div>
 
     <div class="preview-popup" id="previewPopup">
-        <img class="preview-image" id="previewImage" alt="配信画像">
+        <picture>
+            <source id="previewImageAvif" type="image/avif" sizes="500px">
+            <source id="previewImageWebp" type="image/webp" sizes="500px">
+            <img class="preview-image" id="previewImage" alt="配信画像">
+        </picture>
         <div class="preview-content">
             <div class="preview-title" id="previewTitle"></div>
             <div class="preview-summary" id="previewSummary"></div>
@@ -548,6 +557,9 @@ def generate_modern_list_page(account_dir, broadcast_list, tags_config):
             // 画像設定
             const img = document.getElementById('previewImage');
             if (data.imageUrl) {{
+                // 縮小版（AVIF/WebP）があればそちらを優先して読み込む
+                document.getElementById('previewImageAvif').srcset = data.imageAvif || '';
+                document.getElementById('previewImageWebp').srcset = data.imageWebp || '';
                 img.src = data.imageUrl;
                 img.style.display = 'block';
             }} else {{
@@ -635,8 +647,7 @@ def generate_modern_list_page(account_dir, broadcast_list, tags_config):
 </html>"""
         
         list_file = os.path.join(account_dir, 'modern_list.html')
-        with open(list_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        write_html(list_file, html_content, storage)
         
         print(f"モダン一覧ページ生成: {list_file}")
         
@@ -10,13 +10,27 @@ from logger import Logger
 
 DEBUGLOG = logging.getLogger(__name__)
 
+# 放送ページの埋め込みデータ（HTMLエスケープ済みJSON）にある番組の開始・終了予定（UNIX秒）
+SCHEDULE_PATTERNS = {
+    'begin_time': re.compile(r'(?:&quot;|")beginTime(?:&quot;|")\s*:\s*(\d{10})'),
+    'end_time': re.compile(r'(?:&quot;|")endTime(?:&quot;|")\s*:\s*(\d{10})')
+}
+
 class BroadcastMonitor:
-    def __init__(self, lv_no: str, check_interval: int = 30):
+    def __init__(self, lv_no: str, check_interval: int = 30, use_shared_service: bool = True,
+                 max_error_count: int = 3, begin_time: Optional[float] = None, expected_end: Optional[float] = None):
         self.lv_no = lv_no
+        self.begin_time = begin_time
+        self.expected_end = expected_end
+        self.schedule = {}
+        self.registered_at = None
         self.check_interval = check_interval
+        self.use_shared_service = use_shared_service
+        self.max_error_count = max_error_count
         self.broadcast_ended = threading.Event()
         self.monitor_thread = None
         self.running = False
+        self.status_service = None
 
     def start_monitoring(self):
         """監視開始"""
@@ -26,15 +40,29 @@ class BroadcastMonitor:
         
         self.running = True
         self.broadcast_ended.clear()
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+
+        if self.use_shared_service:
+            # 共有ポーラーに登録し、公開されるステータスを購読する
+            from recorder_modules.broadcast_status_service import get_shared_status_service
+            self.status_service = get_shared_status_service()
+            self.registered_at = self.status_service.register(self.lv_no, self.begin_time, self.expected_end)
+            self.status_service.ensure_poller()
+            target = self._subscribe_loop
+        else:
+            target = self._monitor_loop
+
+        self.monitor_thread = threading.Thread(target=target, daemon=True)
         self.monitor_thread.start()
-        DEBUGLOG.info(f"配信終了監視開始: {self.lv_no} (間隔: {self.check_interval}秒)")
+        DEBUGLOG.info(f"配信終了監視開始: {self.lv_no} (共有ポーラー: {self.use_shared_service})")
 
     def stop_monitoring(self):
         """監視停止"""
         self.running = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
+        if self.status_service:
+            self.status_service.unregister(self.lv_no)
+            self.status_service.stop()
         DEBUGLOG.info("配信終了監視停止")
 
     def is_broadcast_ended(self) -> bool:
@@ -61,50 +89,89 @@ class BroadcastMonitor:
                 DEBUGLOG.error(f"監視ループでエラー: {e}")
                 time.sleep(self.check_interval)
 
+    def _subscribe_loop(self):
+        """共有ポーラーが公開するステータスを購読（別スレッドで実行）"""
+        poll_interval = min(self.check_interval, 5)
+        while self.running:
+            try:
+                self.status_service.heartbeat(self.lv_no)
+                # ポーラー担当が落ちていれば引き継ぐ
+                self.status_service.ensure_poller()
+
+                # 前回の録画で残ったステータス（登録より前に確認されたもの）は無視
+                record = self.status_service.read_status(self.lv_no, since=self.registered_at)
+                if record:
+                    if record.get("status") == "ENDED":
+                        DEBUGLOG.info("配信終了を検知")
+                        self.broadcast_ended.set()
+                        break
+                    if record.get("status") == "ERROR" and record.get("error_count", 0) >= self.max_error_count:
+                        DEBUGLOG.info("ステータス取得エラーが続いたため終了扱い")
+                        self.broadcast_ended.set()
+                        break
+
+            except Exception as e:
+                DEBUGLOG.error(f"ステータス購読でエラー: {e}")
+
+            time.sleep(poll_interval)
+
     def _check_broadcast_end(self) -> bool:
         """配信終了チェック（nicolive_endcheck_discovery.pyロジック使用）"""
         try:
-            url = f"https://live.nicovideo.jp/watch/{self.lv_no}"
-            headers = {
-                "User-Agent": (
-                    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/120.0.0.0 Safari/537.36"
-                ),
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-                "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
-                "Cache-Control": "no-cache"
-            }
-            
-            resp = requests.get(url, timeout=30, headers=headers, allow_redirects=True)
-            resp.raise_for_status()
-            resp.encoding = 'utf-8'
-            html = resp.text
+            return self.fetch_status() == "ENDED"
 
-            # <script src> 抽出
-            script_urls = self._extract_script_srcs(html, resp.url)
+        except Exception as e:
+            DEBUGLOG.error(f"終了チェック失敗 {self.lv_no}: {e}")
+            return True  # エラー時は終了扱い
 
-            # /v*/programs/ API URLを自動発見
-            api_base = self._discover_program_api_base(html, script_urls)
-            status = "UNKNOWN"
+    def fetch_status(self, session=None) -> str:
+        """配信ステータスを1回取得（通信エラーは例外として送出）"""
+        http = session or requests
+        url = f"https://live.nicovideo.jp/watch/{self.lv_no}"
+        headers = {
+            "User-Agent": (
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/120.0.0.0 Safari/537.36"
+            ),
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+            "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
+            "Cache-Control": "no-cache"
+        }
             
-            if api_base:
-                status = self._read_status_from_api(api_base, self.lv_no, referer=resp.url)
-                DEBUGLOG.debug(f"[API検知] {self.lv_no}: status={status}")
+        resp = http.get(url, timeout=30, headers=headers, allow_redirects=True)
+        resp.raise_for_status()
+        resp.encoding = 'utf-8'
+        html = resp.text
+        self.schedule = self._extract_schedule(html)
 
-            # API取得失敗時はHTMLフォールバック
-            if status in ("NOT_FOUND", "UNKNOWN"):
-                fallback_status = self._infer_status_from_html(html)
-                status = fallback_status if fallback_status != "UNKNOWN" else status
-                DEBUGLOG.debug(f"[HTML検知] {self.lv_no}: status={status}")
+        # <script src> 抽出
+        script_urls = self._extract_script_srcs(html, resp.url)
 
-            # 終了判定
-            is_ended = (status == "ENDED")
-            return is_ended
+        # /v*/programs/ API URLを自動発見
+        api_base = self._discover_program_api_base(html, script_urls)
+        status = "UNKNOWN"
 
-        except Exception as e:
-            DEBUGLOG.error(f"終了チェック失敗 {self.lv_no}: {e}")
-            return True  # エラー時は終了扱い
+        if api_base:
+            status = self._read_status_from_api(api_base, self.lv_no, referer=resp.url, session=http)
+            DEBUGLOG.debug(f"[API検知] {self.lv_no}: status={status}")
+
+        # API取得失敗時はHTMLフォールバック
+        if status in ("NOT_FOUND", "UNKNOWN"):
+            fallback_status = self._infer_status_from_html(html)
+            status = fallback_status if fallback_status != "UNKNOWN" else status
+            DEBUGLOG.debug(f"[HTML検知] {self.lv_no}: status={status}")
+
+        return status
+
+    def _extract_schedule(self, html: str) -> dict:
+        """放送ページから番組の開始・終了予定を取得（見つからなければ空）"""
+        schedule = {}
+        for key, pattern in SCHEDULE_PATTERNS.items():
+            m = pattern.search(html)
+            if m:
+                schedule[key] = int(m.group(1))
+        return schedule
 
     def _extract_script_srcs(self, html: str, base_url: str) -> list:
         """HTML内の<script src>を抽出"""
@@ -125,8 +192,9 @@ class BroadcastMonitor:
             DEBUGLOG.debug(f"HTMLからAPI発見: {api_url}")
             return api_url
 
-    def _read_status_from_api(self, api_base: str, lv: str, referer: str) -> str:
+    def _read_status_from_api(self, api_base: str, lv: str, referer: str, session=None) -> str:
         """API から status を取得"""
+        http = session or requests
         api_url = api_base + lv
         
         headers_try = [
@@ -154,7 +222,7 @@ class BroadcastMonitor:
         for i, headers in enumerate(headers_try):
             try:
                 DEBUGLOG.debug(f"API試行 {i+1}/{len(headers_try)}: {api_url}")
-                r = requests.get(api_url, headers=headers, timeout=12)
+                r = http.get(api_url, headers=headers, timeout=12)
                 
                 if r.status_code == 404:
                     DEBUGLOG.debug(f"API 404: {api_url}")
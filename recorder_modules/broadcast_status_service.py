@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import random
+import threading
+import logging
+import requests
+from typing import Optional, Dict, Any, Callable, List
+
+DEBUGLOG = logging.getLogger(__name__)
+
+# 共有ステータスディレクトリ構成
+#   watch/{lv}.json   … 監視登録（各レコーダーが書き込み、生存中は定期的に更新）
+#   status/{lv}.json  … 最新ステータス（ポーリング担当が書き込み）
+#   service.lock      … ポーリング担当プロセスのハートビート
+DEFAULT_STATUS_DIR = os.path.join('data', 'broadcast_status')
+
+TERMINAL_STATUSES = ("ENDED",)
+
+
+def _write_json_atomic(path: str, data: Dict[str, Any]):
+    """一時ファイル経由でJSONを書き込み（読み手に書きかけを見せない）"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    """JSON読み込み（存在しない・書き込み途中の場合はNone）"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+class BroadcastStatusService:
+    """複数放送の配信ステータスを1つのポーラーでまとめて監視する共有サービス"""
+
+    def __init__(self, status_dir: str = DEFAULT_STATUS_DIR,
+                 tick_interval: float = 5,
+                 batch_size: int = 5,
+                 request_spacing: float = 1.0,
+                 jitter: float = 0.2,
+                 early_interval: int = 60,
+                 normal_interval: int = 30,
+                 near_end_interval: int = 10,
+                 early_phase: int = 1800,
+                 near_end_window: int = 600,
+                 lease_timeout: int = 60,
+                 watch_timeout: int = 300):
+        self.status_dir = status_dir
+        self.watch_dir = os.path.join(status_dir, 'watch')
+        self.result_dir = os.path.join(status_dir, 'status')
+        self.lock_path = os.path.join(status_dir, 'service.lock')
+
+        self.tick_interval = tick_interval
+        self.batch_size = batch_size
+        self.request_spacing = request_spacing
+        self.jitter = jitter
+        self.early_interval = early_interval
+        self.normal_interval = normal_interval
+        self.near_end_interval = near_end_interval
+        self.early_phase = early_phase
+        self.near_end_window = near_end_window
+        self.lease_timeout = lease_timeout
+        self.watch_timeout = watch_timeout
+
+        self.token = f"{os.getpid()}-{random.randint(0, 1 << 30)}"
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.subscribers: List[Callable[[str, Dict[str, Any]], None]] = []
+        self.session = requests.Session()
+
+        self.lock = threading.Lock()
+        self.poller_thread = None
+        self.running = False
+        self.is_poller = False
+
+        os.makedirs(self.watch_dir, exist_ok=True)
+        os.makedirs(self.result_dir, exist_ok=True)
+
+    # ---- 購読側API ----
+
+    def register(self, lv_no: str, begin_time: Optional[float] = None, expected_end: Optional[float] = None) -> float:
+        """放送を監視対象に登録し、登録時刻を返す（これより前に確認されたステータスは前回の録画のもの）"""
+        watch_path = os.path.join(self.watch_dir, f"{lv_no}.json")
+        existing = _read_json(watch_path) or {}
+        registered_at = existing.get("registered_at") if existing.get("pid") == os.getpid() else None
+        registered_at = registered_at or time.time()
+        _write_json_atomic(watch_path, {
+            "lv_no": lv_no,
+            "begin_time": begin_time or existing.get("begin_time") or time.time(),
+            "expected_end": expected_end or existing.get("expected_end"),
+            "registered_at": registered_at,
+            "pid": os.getpid()
+        })
+        DEBUGLOG.info(f"ステータス監視登録: {lv_no}")
+        return registered_at
+
+    def heartbeat(self, lv_no: str):
+        """監視登録の生存通知（登録ファイルのmtimeを更新）"""
+        watch_path = os.path.join(self.watch_dir, f"{lv_no}.json")
+        try:
+            os.utime(watch_path, None)
+        except OSError:
+            self.register(lv_no)
+
+    def unregister(self, lv_no: str):
+        """監視対象から除外（公開済みステータスも削除し、次回の録画に持ち越さない）"""
+        try:
+            os.remove(os.path.join(self.watch_dir, f"{lv_no}.json"))
+            DEBUGLOG.info(f"ステータス監視解除: {lv_no}")
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(os.path.join(self.result_dir, f"{lv_no}.json"))
+        except FileNotFoundError:
+            pass
+
+    def read_status(self, lv_no: str, since: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """公開済みの最新ステータスを取得（since より前に確認されたものは無視）"""
+        record = _read_json(os.path.join(self.result_dir, f"{lv_no}.json"))
+        if record and since is not None and record.get("checked_at", 0) < since:
+            return None
+        return record
+
+    def subscribe(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """同一プロセス内のステータス変化通知を購読"""
+        with self.lock:
+            self.subscribers.append(callback)
+
+    # ---- ポーリング担当の選出 ----
+
+    def ensure_poller(self) -> bool:
+        """ポーリング担当が不在なら自プロセスで引き受ける"""
+        if self.is_poller:
+            return True
+        if not self._try_acquire_lease():
+            return False
+
+        self.is_poller = True
+        self.running = True
+        self.poller_thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self.poller_thread.start()
+        DEBUGLOG.info(f"共有ステータスポーラー起動 (pid={os.getpid()})")
+        return True
+
+    def stop(self):
+        """ポーリング停止（担当権も解放）"""
+        self.running = False
+        if self.poller_thread:
+            self.poller_thread.join(timeout=5)
+            self.poller_thread = None
+        if self.is_poller:
+            lease = _read_json(self.lock_path)
+            if lease and lease.get("token") == self.token:
+                try:
+                    os.remove(self.lock_path)
+                except OSError:
+                    pass
+        self.is_poller = False
+
+    def _try_acquire_lease(self) -> bool:
+        """ハートビート付きロックファイルでポーリング担当を取得"""
+        lease = {"token": self.token, "pid": os.getpid(), "heartbeat": time.time()}
+        try:
+            fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(lease, f)
+            return True
+        except FileExistsError:
+            pass
+
+        current = _read_json(self.lock_path)
+        if current and time.time() - current.get("heartbeat", 0) < self.lease_timeout:
+            return False
+
+        # 担当プロセスのハートビートが途絶えているため引き継ぐ
+        DEBUGLOG.warning("ステータスポーラーのハートビート途絶、担当を引き継ぎます")
+        _write_json_atomic(self.lock_path, lease)
+        current = _read_json(self.lock_path)
+        return bool(current and current.get("token") == self.token)
+
+    def _renew_lease(self) -> bool:
+        """担当権を更新（他プロセスに奪われていたらFalse）"""
+        current = _read_json(self.lock_path)
+        if current and current.get("token") != self.token:
+            return False
+        _write_json_atomic(self.lock_path, {"token": self.token, "pid": os.getpid(), "heartbeat": time.time()})
+        return True
+
+    # ---- ポーリング本体 ----
+
+    def _poll_loop(self):
+        """登録済みの全放送をまとめてポーリング（別スレッドで実行）"""
+        while self.running:
+            try:
+                if not self._renew_lease():
+                    DEBUGLOG.warning("ステータスポーラーの担当権を失ったため停止します")
+                    self.is_poller = False
+                    break
+
+                self._sync_entries()
+                self._poll_due_entries()
+
+            except Exception as e:
+                DEBUGLOG.error(f"ステータスポーリングでエラー: {e}")
+
+            time.sleep(self.tick_interval)
+
+    def _sync_entries(self):
+        """監視登録ファイルと内部エントリを同期"""
+        now = time.time()
+        active = {}
+        for name in os.listdir(self.watch_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.watch_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.watch_timeout:
+                    # 登録元のレコーダーが落ちたまま残った登録は無視
+                    continue
+            except OSError:
+                continue
+            watch = _read_json(path)
+            if watch and watch.get("lv_no"):
+                active[watch["lv_no"]] = watch
+
+        for lv_no in list(self.entries.keys()):
+            if lv_no not in active:
+                del self.entries[lv_no]
+
+        for lv_no, watch in active.items():
+            entry = self.entries.get(lv_no)
+            if entry is None:
+                # 登録より前のステータスは前回の録画で残ったものなので使わない
+                previous = self.read_status(lv_no, since=watch.get("registered_at", 0)) or {}
+                if previous.get("status") in TERMINAL_STATUSES:
+                    continue
+                # 初回チェックもジッターで分散させる
+                entry = {"status": previous.get("status", "UNKNOWN"), "error_count": 0,
+                         "next_check": now + random.uniform(0, self.tick_interval)}
+                self.entries[lv_no] = entry
+            entry["begin_time"] = watch.get("begin_time") or now
+            entry["expected_end"] = watch.get("expected_end")
+
+    def _poll_due_entries(self):
+        """期限の来た放送をバッチ単位で順番に確認"""
+        # 循環importを避けるためここでimport
+        from recorder_modules.broadcast_monitor import BroadcastMonitor
+
+        now = time.time()
+        due = [lv for lv, e in self.entries.items() if e["next_check"] <= now]
+        due.sort(key=lambda lv: self.entries[lv]["next_check"])
+
+        for i, lv_no in enumerate(due[:self.batch_size]):
+            if not self.running:
+                break
+            if i > 0:
+                time.sleep(self.request_spacing)
+
+            entry = self.entries.get(lv_no)
+            if entry is None:
+                continue
+
+            try:
+                monitor = BroadcastMonitor(lv_no)
+                status = monitor.fetch_status(session=self.session)
+                entry["error_count"] = 0
+                # 放送ページの番組開始・終了予定は登録時の値より正確
+                if monitor.schedule.get("begin_time"):
+                    entry["schedule_begin"] = monitor.schedule["begin_time"]
+                if monitor.schedule.get("end_time"):
+                    entry["schedule_end"] = monitor.schedule["end_time"]
+            except Exception as e:
+                DEBUGLOG.error(f"ステータス取得失敗 {lv_no}: {e}")
+                status = "ERROR"
+                entry["error_count"] += 1
+
+            self._publish(lv_no, entry, status)
+
+            if status in TERMINAL_STATUSES:
+                del self.entries[lv_no]
+            else:
+                entry["next_check"] = time.time() + self._next_interval(entry)
+
+    def _next_interval(self, entry: Dict[str, Any]) -> float:
+        """放送経過・終了予定に応じた次回チェックまでの間隔（ジッター付き）"""
+        now = time.time()
+        expected_end = entry.get("schedule_end") or entry.get("expected_end")
+        begin_time = entry.get("schedule_begin") or entry.get("begin_time", now)
+
+        if entry.get("error_count"):
+            interval = self.near_end_interval
+        elif expected_end and expected_end - now <= self.near_end_window:
+            interval = self.near_end_interval
+        elif now - begin_time < self.early_phase:
+            interval = self.early_interval
+        else:
+            interval = self.normal_interval
+
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _publish(self, lv_no: str, entry: Dict[str, Any], status: str):
+        """ステータスをファイルに公開し、変化時は購読者に通知"""
+        now = time.time()
+        changed = status != entry.get("status")
+        if changed:
+            entry["changed_at"] = now
+        entry["status"] = status
+
+        record = {
+            "lv_no": lv_no,
+            "status": status,
+            "checked_at": now,
+            "changed_at": entry.get("changed_at", now),
+            "error_count": entry["error_count"]
+        }
+        _write_json_atomic(os.path.join(self.result_dir, f"{lv_no}.json"), record)
+
+        if changed:
+            DEBUGLOG.info(f"ステータス変化: {lv_no} -> {status}")
+            with self.lock:
+                subscribers = list(self.subscribers)
+            for callback in subscribers:
+                try:
+                    callback(lv_no, record)
+                except Exception as e:
+                    DEBUGLOG.error(f"ステータス通知エラー: {e}")
+
+
+_shared_service = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_status_service() -> BroadcastStatusService:
+    """プロセス内で共有するステータスサービスを取得"""
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            _shared_service = BroadcastStatusService()
+        return _shared_service
+
+
+if __name__ == "__main__":
+    # 単独起動: レコーダーとは別に常駐ポーラーとして動かす
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    service = get_shared_status_service()
+    try:
+        while True:
+            service.ensure_poller()
+            time.sleep(service.lease_timeout / 2)
+    except KeyboardInterrupt:
+        service.stop()
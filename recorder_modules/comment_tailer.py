@@ -0,0 +1,64 @@
+import os
+import threading
+import logging
+from typing import Optional
+
+from pipeline_modules.fs_index import get_directory_index
+from pipeline_modules.live_comments import LiveCommentIngester
+
+DEBUGLOG = logging.getLogger(__name__)
+
+
+class CommentTailer:
+    """配信中にNCVのXMLを定期的に読み進め、終了と同時にコメントとランキングを書き出す"""
+
+    def __init__(self, ncv_dir: str, broadcast_dir: str, lv_no: str, poll_interval: float = 5.0,
+                 wait_timeout: float = 600.0, storage: Optional[dict] = None):
+        self.ncv_dir = ncv_dir
+        self.broadcast_dir = broadcast_dir
+        self.lv_no = lv_no
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self.storage = storage
+        self.ingester: Optional[LiveCommentIngester] = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """取り込み開始（XMLが出現するまでは待機）"""
+        self.thread = threading.Thread(target=self._run, name=f"comment-tailer-{self.lv_no}", daemon=True)
+        self.thread.start()
+        DEBUGLOG.info(f"ライブコメント取り込み開始: {self.lv_no} ({self.ncv_dir})")
+
+    def _run(self):
+        try:
+            index = get_directory_index(self.ncv_dir)
+            xml_path = index.wait_for(lambda name: name.endswith('.xml') and self.lv_no in name, self.wait_timeout)
+            if not xml_path:
+                DEBUGLOG.warning(f"NCVのXMLが見つからないためライブ取り込みを行いません: {self.lv_no}")
+                return
+            self.ingester = LiveCommentIngester(xml_path, self.broadcast_dir, self.lv_no, storage=self.storage)
+            DEBUGLOG.info(f"NCVのXMLを追跡: {xml_path}")
+
+            while not self.stop_event.is_set():
+                added = self.ingester.poll()
+                if added:
+                    DEBUGLOG.debug(f"ライブコメント追加: {added}件（累計 {self.ingester.state['comment_count']}件）")
+                self.stop_event.wait(self.poll_interval)
+        except Exception as e:
+            DEBUGLOG.error(f"ライブコメント取り込みエラー: {e}", exc_info=True)
+
+    def stop(self, write_outputs: bool = True):
+        """取り込みを止め、残りを読み込んでから comments.json / ランキングを書き出す"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=30)
+        if not self.ingester:
+            return
+        try:
+            self.ingester.poll()
+            if write_outputs and os.path.isdir(self.broadcast_dir):
+                self.ingester.write_outputs()
+            DEBUGLOG.info(f"ライブコメント取り込み終了: {self.ingester.state['comment_count']}件")
+        except Exception as e:
+            DEBUGLOG.error(f"ライブコメント最終処理エラー: {e}", exc_info=True)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# リポジトリ直下のモジュール（utils, pipeline_modules, processors）を読み込めるように
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,95 @@
+import os
+import json
+import gzip
+
+import pytest
+
+import pipeline_modules.atomic_io as atomic_io
+from pipeline_modules.atomic_io import (
+    atomic_write, atomic_write_json, read_json, load_json_safe, verify_artifact, existing_variant,
+    CHECKSUM_MANIFEST, ZSTD_AVAILABLE
+)
+
+
+def test_interrupted_write_keeps_previous_file(tmp_path, monkeypatch):
+    path = tmp_path / 'lv1_data.json'
+    atomic_write_json(str(path), {'version': 1})
+
+    def crash(src, dst):
+        raise KeyboardInterrupt()   # rename の直前で止まった
+
+    monkeypatch.setattr(atomic_io.os, 'replace', crash)
+    with pytest.raises(KeyboardInterrupt):
+        atomic_write_json(str(path), {'version': 2})
+    monkeypatch.undo()
+
+    assert json.loads(path.read_text(encoding='utf-8')) == {'version': 1}
+    assert os.listdir(tmp_path) == ['lv1_data.json']   # 一時ファイルも残らない
+
+
+def test_failed_write_does_not_create_file(tmp_path, monkeypatch):
+    path = tmp_path / 'new.json'
+
+    def fail_fsync(fd):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(atomic_io.os, 'fsync', fail_fsync)
+    with pytest.raises(OSError):
+        atomic_write(str(path), 'data')
+    assert os.listdir(tmp_path) == []
+
+
+def test_read_json_reads_gzip_variant(tmp_path):
+    path = tmp_path / 'lv1_comments.json'
+    atomic_write_json(str(path) + '.gz', {'comments': [1, 2]}, compress='gzip')
+    assert gzip.decompress((tmp_path / 'lv1_comments.json.gz').read_bytes())
+    assert existing_variant(str(path)) == str(path) + '.gz'
+    assert read_json(str(path)) == {'comments': [1, 2]}
+
+
+@pytest.mark.skipif(not ZSTD_AVAILABLE, reason='zstandardがインストールされていない')
+def test_read_json_reads_zstd_variant(tmp_path):
+    path = tmp_path / 'lv1_transcript.json'
+    atomic_write_json(str(path) + '.zst', {'transcripts': []}, compress='zstd')
+    assert read_json(str(path)) == {'transcripts': []}
+
+
+def test_read_json_prefers_newest_variant(tmp_path):
+    path = tmp_path / 'lv1_comments.json'
+    atomic_write_json(str(path), {'old': True})
+    atomic_write_json(str(path) + '.gz', {'old': False}, compress='gzip')
+    os.utime(path, ns=(1, 1))
+    assert read_json(str(path)) == {'old': False}
+
+
+def test_read_json_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_json(str(tmp_path / 'missing.json'))
+    assert load_json_safe(str(tmp_path / 'missing.json'), default={}) == {}
+
+
+def test_checksum_recorded_and_verified(tmp_path):
+    path = tmp_path / 'lv1_data.json'
+    _, digest, size = atomic_write_json(str(path), {'a': 1}, checksum=True)
+    manifest = json.loads((tmp_path / CHECKSUM_MANIFEST).read_text(encoding='utf-8'))
+    assert manifest['lv1_data.json']['sha256'] == digest
+    assert manifest['lv1_data.json']['size'] == size
+    assert verify_artifact(str(path)) is True
+    assert verify_artifact(str(path), full=True) is True
+    assert verify_artifact(str(tmp_path / 'other.json')) is None
+
+
+def test_checksum_detects_corruption(tmp_path, capsys):
+    path = tmp_path / 'lv1_data.json'
+    atomic_write_json(str(path), {'a': 1}, checksum=True)
+    content = path.read_bytes()
+    path.write_bytes(content.replace(b'1', b'2'))   # 同じサイズで中身だけ変わる
+    assert verify_artifact(str(path)) is False
+
+    path.write_bytes(content[:-2])   # 途中で切れた
+    assert verify_artifact(str(path)) is False
+    assert load_json_safe(str(path), default='fallback') == 'fallback'
+    assert 'チェックサム不一致' in capsys.readouterr().out
+
+    os.remove(path)
+    assert verify_artifact(str(path)) is False
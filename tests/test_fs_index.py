@@ -0,0 +1,35 @@
+import threading
+
+from pipeline_modules.fs_index import DirectoryIndex
+
+
+class MissedEventIndex(DirectoryIndex):
+    """監視中だがイベントが届かない状態（ネットワークドライブなど）"""
+
+    def is_live(self):
+        return True
+
+
+def test_wait_for_finds_file_when_event_is_missed(tmp_path):
+    index = MissedEventIndex(str(tmp_path), watch=False, poll_interval=0.05).start()
+    timer = threading.Timer(0.1, lambda: (tmp_path / 'lv1_comment.xml').write_text('<x/>'))
+    timer.start()
+    try:
+        found = index.wait_for(lambda name: name.endswith('.xml'), timeout=5)
+    finally:
+        timer.join()
+    assert found == str(tmp_path / 'lv1_comment.xml')
+
+
+def test_wait_for_rescans_once_before_giving_up(tmp_path):
+    index = MissedEventIndex(str(tmp_path), watch=False, poll_interval=10).start()
+    (tmp_path / 'lv1_comment.xml').write_text('<x/>')
+    found = index.wait_for(lambda name: name.endswith('.xml'), timeout=0)
+    assert found == str(tmp_path / 'lv1_comment.xml')
+
+
+def test_unwatched_names_follow_directory_changes(tmp_path):
+    index = DirectoryIndex(str(tmp_path), watch=False).start()
+    assert index.names() == []
+    (tmp_path / 'a.mp4').write_text('')
+    assert index.names() == ['a.mp4']
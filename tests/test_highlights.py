@@ -0,0 +1,102 @@
+import numpy as np
+
+from pipeline_modules.highlights import (
+    detect_highlights, highlight_settings, keyword_counts, rolling_zscore, sentiment_shift
+)
+
+
+def make_series(comment_count, positive=None, negative=None):
+    count = len(comment_count)
+    return {
+        'start_seconds': np.arange(count, dtype=np.int64) * 10,
+        'center_score': np.zeros(count),
+        'positive_score': np.zeros(count) if positive is None else np.asarray(positive, dtype=np.float64),
+        'negative_score': np.zeros(count) if negative is None else np.asarray(negative, dtype=np.float64),
+        'segment_count': np.ones(count, dtype=np.int64),
+        'comment_count': np.asarray(comment_count, dtype=np.int64)
+    }
+
+
+def make_comments(comment_count, text='こんばんは', burst_text='草'):
+    comments = []
+    for block, count in enumerate(comment_count):
+        for _ in range(count):
+            comments.append({'timeline_block': block * 10, 'text': burst_text if count > 1 else text})
+    return comments
+
+
+def test_single_burst_is_detected():
+    counts = [1] * 60
+    counts[40] = 30
+    highlights, heat = detect_highlights(make_series(counts), make_comments(counts))
+    assert len(highlights) == 1
+    top = highlights[0]
+    assert top['rank'] == 1
+    assert top['start_seconds'] == 400
+    assert top['time'] == '00:06:40'
+    assert top['comment_count'] == 30
+    assert top['keyword_count'] == 30
+    assert len(heat) == 60
+    assert heat.argmax() == 40
+    assert heat[40] == 100
+    assert heat.min() >= 0
+
+
+def test_min_gap_keeps_higher_peak():
+    counts = [1] * 60
+    counts[30] = 20
+    counts[33] = 30   # min_gap_seconds=60（6ブロック）以内なので高い方だけ残る
+    highlights, _ = detect_highlights(make_series(counts), make_comments(counts))
+    assert [h['start_seconds'] for h in highlights] == [330]
+
+
+def test_threshold_and_max_highlights_from_config():
+    counts = [1] * 90
+    for block in (20, 50, 80):
+        counts[block] = 30
+    config = {'highlight_settings': {'max_highlights': 2}}
+    highlights, _ = detect_highlights(make_series(counts), make_comments(counts), config)
+    assert len(highlights) == 2
+    assert [h['rank'] for h in highlights] == [1, 2]
+
+    config = {'highlight_settings': {'threshold': 1000}}
+    highlights, heat = detect_highlights(make_series(counts), make_comments(counts), config)
+    assert highlights == []
+    assert len(heat) == 90
+
+
+def test_quiet_broadcast_has_no_highlights():
+    counts = [2] * 30
+    highlights, heat = detect_highlights(make_series(counts), make_comments(counts, burst_text='こんばんは'))
+    assert highlights == []
+    assert heat.tolist() == [0] * 30
+
+
+def test_empty_series():
+    series = make_series([])
+    highlights, heat = detect_highlights(series, [])
+    assert highlights == []
+    assert heat.shape == (0,)
+
+
+def test_rolling_zscore_compares_with_previous_window():
+    values = np.array([1.0, 1.0, 1.0, 1.0, 9.0])
+    scores = rolling_zscore(values, 3)
+    assert scores[-1] == scores.max()
+    assert abs(scores[1]) < 1e-9
+
+
+def test_sentiment_shift_carries_over_blocks_without_transcript():
+    positive = [0.5, 0.0, 0.0, 0.9]
+    negative = [0.1, 0.0, 0.0, 0.1]
+    shift = sentiment_shift(positive, negative, [1, 0, 0, 1])
+    # 文字起こしのないブロックは直前の感情を引き継ぐので変化なし
+    assert np.allclose(shift, [0.0, 0.0, 0.0, 0.4])
+
+
+def test_laugh_keywords_ignore_w_inside_words():
+    settings = highlight_settings(None)
+    texts = ['それなwww', '草ｗ', 'ｗｗｗそれ', 'wow', 'https://www.example.com', 'new window', 'これはw ']
+    comments = [{'timeline_block': i * 10, 'text': text} for i, text in enumerate(texts)]
+    counts = keyword_counts(comments, len(texts), settings['keywords'], 10, settings['keyword_patterns'])
+    assert counts.tolist() == [1, 1, 1, 0, 0, 0, 1]
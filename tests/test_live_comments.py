@@ -0,0 +1,109 @@
+import os
+import json
+
+from pipeline_modules.live_comments import LiveCommentIngester
+
+START_TIME = 1700000000
+
+HEADER = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<NiconamaComment>\n'
+    f'<LiveInfo><StartTime>{START_TIME}</StartTime></LiveInfo>\n'
+    '<ChatList>\n'
+)
+
+
+def chat(no, user_id, seconds, text):
+    return f'<chat no="{no}" user_id="{user_id}" date="{START_TIME + seconds}" premium="1">{text}</chat>\n'
+
+
+def append(path, text):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(text)
+
+
+def make_ingester(tmp_path):
+    return LiveCommentIngester(str(tmp_path / 'ncv.xml'), str(tmp_path / 'lv1'), 'lv1')
+
+
+def test_poll_resumes_from_saved_offset(tmp_path):
+    xml_path = tmp_path / 'ncv.xml'
+    second = chat(2, 'u2', 15, '二件目')
+    append(xml_path, HEADER + chat(1, 'u1', 5, '一件目') + second[:20])   # 2件目は書きかけ
+
+    ingester = make_ingester(tmp_path)
+    assert not ingester.has_progress()
+    assert ingester.poll() == 1
+    assert ingester.poll() == 0   # 増えていなければ何もしない
+
+    # 別プロセスで再開：保存した読み込み位置から続きだけを読む
+    append(xml_path, second[20:] + chat(3, 'u1', 25, '三件目'))
+    resumed = make_ingester(tmp_path)
+    assert resumed.has_progress()
+    assert resumed.state['start_time'] == START_TIME
+    assert resumed.poll() == 2
+
+    comments = resumed.comments()
+    assert [c['no'] for c in comments] == [1, 2, 3]
+    assert [c['timeline_block'] for c in comments] == [0, 10, 20]
+    assert comments[1]['text'] == '二件目'
+    ranking = resumed.ranking()
+    assert [(u['user_id'], u['comment_count']) for u in ranking] == [('u1', 2), ('u2', 1)]
+    assert ranking[0]['last_comment'] == '三件目'
+    assert resumed.state['histogram'] == {'0': 1, '10': 1, '20': 1}
+
+
+def test_resume_discards_unconfirmed_store_tail(tmp_path):
+    xml_path = tmp_path / 'ncv.xml'
+    append(xml_path, HEADER + chat(1, 'u1', 5, '一件目'))
+    ingester = make_ingester(tmp_path)
+    assert ingester.poll() == 1
+
+    # 追記後、状態を保存する前に落ちた場合の書きかけ
+    with open(ingester.store_path, 'ab') as f:
+        f.write(b'{"no": 99, "broken')
+
+    append(xml_path, chat(2, 'u2', 12, '二件目'))
+    resumed = make_ingester(tmp_path)
+    assert resumed.poll() == 1
+    assert [c['no'] for c in resumed.comments()] == [1, 2]
+    with open(resumed.store_path, 'rb') as f:
+        assert len(f.read().splitlines()) == 2
+
+
+def test_start_time_waits_for_live_info(tmp_path):
+    xml_path = tmp_path / 'ncv.xml'
+    append(xml_path, '<?xml version="1.0" encoding="utf-8"?>\n<NiconamaComment>\n')
+    ingester = make_ingester(tmp_path)
+    assert ingester.poll() == 0
+    assert not ingester.has_progress()
+
+    append(xml_path, HEADER.split('\n', 2)[2] + chat(1, 'u1', 3, '一件目'))
+    assert ingester.poll() == 1
+    assert ingester.state['start_time'] == START_TIME
+
+
+def test_rewritten_xml_is_read_again(tmp_path):
+    xml_path = tmp_path / 'ncv.xml'
+    append(xml_path, HEADER + chat(1, 'u1', 5, '一件目') + chat(2, 'u2', 15, '二件目'))
+    ingester = make_ingester(tmp_path)
+    assert ingester.poll() == 2
+
+    # NCVがファイルを作り直した（縮んだ）場合は最初から
+    xml_path.write_text(HEADER + chat(1, 'u3', 7, '別'), encoding='utf-8')
+    resumed = make_ingester(tmp_path)
+    assert resumed.poll() == 1
+    assert [c['user_id'] for c in resumed.comments()] == ['u3']
+    assert resumed.state['comment_count'] == 1
+
+
+def test_write_outputs(tmp_path):
+    append(tmp_path / 'ncv.xml', HEADER + chat(1, 'u1', 5, '一件目') + chat(2, 'u1', 8, '二件目'))
+    ingester = make_ingester(tmp_path)
+    ingester.poll()
+    comments, ranking = ingester.write_outputs()
+    assert len(comments) == 2
+    with open(os.path.join(ingester.broadcast_dir, 'lv1_comment_ranking.json'), encoding='utf-8') as f:
+        saved = json.load(f)
+    assert saved['total_users'] == 1
+    assert saved['ranking'][0]['comment_count'] == 2
@@ -0,0 +1,66 @@
+from processors.step12_html_generator import create_timeline_blocks, BLOCK_SECONDS
+
+
+def make_timeline():
+    transcript_data = {'transcripts': [
+        # 同じブロック内は時刻順につながる（入力順は逆）
+        {'timestamp': 7, 'text': 'world', 'center_score': 3, 'positive_score': 0.5, 'negative_score': 0.1},
+        {'timestamp': 3, 'text': 'hello', 'center_score': 1, 'positive_score': 0.3, 'negative_score': 0.2},
+        {'timestamp': 25, 'text': '<b>', 'center_score': 2, 'positive_score': None},
+        {'timestamp': 50, 'text': '範囲外', 'center_score': 9},
+    ]}
+    comments_data = {'comments': [
+        {'no': 2, 'user_id': '1234567', 'user_name': 'B', 'text': '二番目', 'timeline_block': 0, 'broadcast_seconds': 8},
+        {'no': 1, 'user_id': '7654321', 'user_name': 'A', 'text': '一番目', 'timeline_block': 0, 'broadcast_seconds': 2,
+         'anonymity': True},
+        {'no': 3, 'user_id': 'a:xyz', 'user_name': '', 'text': '<i>', 'timeline_block': 20, 'broadcast_seconds': 21},
+        {'no': 4, 'user_id': '', 'text': '刻み外', 'timeline_block': 15, 'broadcast_seconds': 15},
+        {'no': 5, 'user_id': '', 'text': '範囲外', 'timeline_block': 100, 'broadcast_seconds': 100},
+    ]}
+    return create_timeline_blocks(transcript_data, comments_data, 'lv1', {'elapsed_time': '00:00:35.5'})
+
+
+def test_blocks_cover_elapsed_time():
+    timeline = make_timeline()
+    assert BLOCK_SECONDS == 10
+    assert [b['start_seconds'] for b in timeline['transcript_blocks']] == [0, 10, 20, 30]
+    assert [b['start_seconds'] for b in timeline['comment_blocks']] == [0, 10, 20, 30]
+    assert timeline['transcript_blocks'][1]['time_range'] == '00:00:10 - 00:00:20'
+    assert timeline['series']['start_seconds'].tolist() == [0, 10, 20, 30]
+
+
+def test_transcript_blocks_average_scores_and_join_text():
+    blocks = make_timeline()['transcript_blocks']
+    assert blocks[0]['transcript'] == 'hello world'
+    assert blocks[0]['center_score'] == 2.0
+    assert blocks[0]['positive_score'] == 0.4
+    assert blocks[0]['negative_score'] == 0.15
+    assert blocks[1]['transcript'] == ''
+    assert blocks[1]['center_score'] == 0.0
+    assert blocks[2]['transcript'] == '&lt;b&gt;'
+    assert blocks[2]['positive_score'] == 0.0
+    assert blocks[0]['screenshot_path'] == './screenshot/lv1/0.jpg'
+
+
+def test_comment_blocks_sorted_by_broadcast_time():
+    blocks = make_timeline()['comment_blocks']
+    first = blocks[0]['comments']
+    assert [c['index'] for c in first] == [1, 2]
+    assert first[0]['time'] == '00:00:02'
+    assert first[0]['user_url'] == ''   # 匿名コメントはユーザーページにリンクしない
+    assert first[1]['user_url'] == 'https://www.nicovideo.jp/user/1234567'
+    assert blocks[1]['comments'] == []
+    assert [c['text'] for c in blocks[2]['comments']] == ['&lt;i&gt;']
+
+
+def test_series_counts():
+    series = make_timeline()['series']
+    assert series['segment_count'].tolist() == [2, 0, 1, 0]
+    assert series['comment_count'].tolist() == [2, 0, 1, 0]
+    assert series['center_score'].tolist() == [2.0, 0.0, 2.0, 0.0]
+
+
+def test_missing_elapsed_time_gives_single_block():
+    timeline = create_timeline_blocks({'transcripts': []}, {'comments': []}, 'lv1', {})
+    assert len(timeline['transcript_blocks']) == 1
+    assert timeline['series']['comment_count'].tolist() == [0]
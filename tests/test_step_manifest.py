@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+import pipeline_modules.step_manifest as step_manifest
+from pipeline_modules.broadcast_document import BroadcastDocument
+from pipeline_modules.step_manifest import StepManifest
+
+DEPENDENCIES = {'fake_first': [], 'fake_second': ['fake_first']}
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """ステップのソースとモジュール・テンプレートを置く仮のリポジトリ"""
+    root = tmp_path / 'repo'
+    (root / 'processors').mkdir(parents=True)
+    (root / 'pipeline_modules').mkdir()
+    (root / 'templates').mkdir()
+    (root / 'processors' / 'fake_first.py').write_text('VERSION = 1\n')
+    (root / 'processors' / 'fake_second.py').write_text('VERSION = 1\n')
+    (root / 'pipeline_modules' / 'helper.py').write_text('HELPER = 1\n')
+    (root / 'templates' / 'page.html').write_text('<p>{{x}}</p>\n')
+    monkeypatch.setattr(step_manifest, 'ROOT_DIR', str(root))
+    monkeypatch.setattr(step_manifest, 'PROCESSORS_DIR', str(root / 'processors'))
+    return root
+
+
+@pytest.fixture
+def broadcast_dir(tmp_path):
+    path = tmp_path / 'account' / 'lv1'
+    path.mkdir(parents=True)
+    (path / 'lv1_first.json').write_text('{}')
+    return path
+
+
+def make_manifest(broadcast_dir, config=None, **kwargs):
+    step_inputs = {
+        'fake_first': {
+            'config': ['api.model'], 'outputs': ['{lv}_first.json'],
+            'code': ['pipeline_modules/helper.py', 'templates']
+        },
+        'fake_second': {}
+    }
+    doc = BroadcastDocument(str(broadcast_dir.parent.parent), 'account', 'lv1', broadcast_dir=str(broadcast_dir))
+    return StepManifest(doc, DEPENDENCIES, step_inputs, config or {'api': {'model': 'a'}}, **kwargs)
+
+
+def record_all_ok(manifest):
+    for step_name in DEPENDENCIES:
+        manifest.record(step_name, {'status': 'ok', 'seconds': 1.0})
+
+
+def test_unchanged_inputs_are_fresh_after_reload(repo, broadcast_dir):
+    record_all_ok(make_manifest(broadcast_dir))
+    manifest = make_manifest(broadcast_dir)
+    assert manifest.is_fresh('fake_first')
+    assert manifest.is_fresh('fake_second')
+    assert manifest.steps['fake_first']['outputs'] == ['lv1_first.json']
+
+
+def test_config_change_is_a_miss(repo, broadcast_dir):
+    record_all_ok(make_manifest(broadcast_dir))
+    manifest = make_manifest(broadcast_dir, {'api': {'model': 'b'}})
+    assert not manifest.is_fresh('fake_first')
+    # 関係しない設定の変更は影響しない
+    manifest = make_manifest(broadcast_dir, {'api': {'model': 'a', 'other': 1}})
+    assert manifest.is_fresh('fake_first')
+
+
+@pytest.mark.parametrize('relative_path', [
+    'processors/fake_first.py', 'pipeline_modules/helper.py', 'templates/page.html'
+])
+def test_code_change_is_a_miss(repo, broadcast_dir, relative_path):
+    record_all_ok(make_manifest(broadcast_dir))
+    with open(repo / relative_path, 'a') as f:
+        f.write('# changed\n')
+    assert not make_manifest(broadcast_dir).is_fresh('fake_first')
+
+
+def test_new_template_file_is_a_miss(repo, broadcast_dir):
+    record_all_ok(make_manifest(broadcast_dir))
+    (repo / 'templates' / 'extra.css').write_text('p {}\n')
+    assert not make_manifest(broadcast_dir).is_fresh('fake_first')
+
+
+def test_rerun_upstream_invalidates_dependents(repo, broadcast_dir):
+    record_all_ok(make_manifest(broadcast_dir))
+    manifest = make_manifest(broadcast_dir)
+    manifest.record('fake_first', {'status': 'ok', 'seconds': 1.0})
+    assert manifest.is_fresh('fake_first')
+    assert not manifest.is_fresh('fake_second')
+
+
+def test_missing_output_is_a_miss(repo, broadcast_dir):
+    record_all_ok(make_manifest(broadcast_dir))
+    os.remove(broadcast_dir / 'lv1_first.json')
+    assert not make_manifest(broadcast_dir).is_fresh('fake_first')
+
+
+@pytest.mark.parametrize('status', ['error', 'failed', 'skipped'])
+def test_unsuccessful_steps_are_rerun(repo, broadcast_dir, status):
+    manifest = make_manifest(broadcast_dir)
+    manifest.record('fake_first', {'status': status, 'seconds': 0.1, 'error': 'x'})
+    assert not make_manifest(broadcast_dir).is_fresh('fake_first')
+
+
+def test_forced_and_always_run_steps_are_never_fresh(repo, broadcast_dir):
+    record_all_ok(make_manifest(broadcast_dir))
+    assert not make_manifest(broadcast_dir, force_steps=['fake_first']).is_fresh('fake_first')
+    assert not make_manifest(broadcast_dir, force_all=True).is_fresh('fake_second')
+    assert not make_manifest(broadcast_dir, always_run=['fake_second']).is_fresh('fake_second')
@@ -0,0 +1,109 @@
+import sys
+import time
+import types
+import threading
+
+import pytest
+
+from pipeline_modules.step_scheduler import StepScheduler
+
+
+class RecordingSteps:
+    """processors.{name} として読み込まれる偽のステップ（開始・終了順を記録）"""
+
+    def __init__(self, monkeypatch, behaviors):
+        self.events = []
+        self.lock = threading.Lock()
+        for name, behavior in behaviors.items():
+            module = types.ModuleType(f"processors.{name}")
+            module.process = self._make_process(name, behavior)
+            monkeypatch.setitem(sys.modules, f"processors.{name}", module)
+
+    def _make_process(self, name, behavior):
+        def process(pipeline_data):
+            with self.lock:
+                self.events.append(('start', name))
+            time.sleep(behavior.get('sleep', 0))
+            with self.lock:
+                self.events.append(('end', name))
+            if behavior.get('raise'):
+                raise RuntimeError(f"{name} failed")
+            return behavior.get('result', {'name': name})
+        return process
+
+    def index(self, kind, name):
+        return self.events.index((kind, name))
+
+
+def run(dependencies, should_run=lambda name: True, **kwargs):
+    scheduler = StepScheduler(dependencies, max_workers=4, **kwargs)
+    pipeline_data = {'results': {}}
+    return scheduler.run(pipeline_data, should_run), pipeline_data
+
+
+def test_dependencies_run_in_order_and_independent_steps_overlap(monkeypatch):
+    steps = RecordingSteps(monkeypatch, {
+        'fake_a': {}, 'fake_b': {'sleep': 0.2}, 'fake_c': {'sleep': 0.2}, 'fake_d': {}
+    })
+    dependencies = {'fake_a': [], 'fake_b': ['fake_a'], 'fake_c': ['fake_a'], 'fake_d': ['fake_b', 'fake_c']}
+    timings, pipeline_data = run(dependencies)
+
+    assert {name: t['status'] for name, t in timings.items()} == dict.fromkeys(dependencies, 'ok')
+    assert steps.index('end', 'fake_a') < steps.index('start', 'fake_b')
+    assert steps.index('end', 'fake_a') < steps.index('start', 'fake_c')
+    assert steps.index('end', 'fake_b') < steps.index('start', 'fake_d')
+    assert steps.index('end', 'fake_c') < steps.index('start', 'fake_d')
+    # b と c は互いに依存しないので並行して動く
+    assert steps.index('start', 'fake_c') < steps.index('end', 'fake_b')
+    assert pipeline_data['results']['fake_d'] == {'name': 'fake_d'}
+
+
+def test_failed_critical_step_skips_its_dependents(monkeypatch):
+    steps = RecordingSteps(monkeypatch, {
+        'fake_a': {'raise': True}, 'fake_b': {}, 'fake_c': {}, 'fake_other': {}
+    })
+    dependencies = {'fake_a': [], 'fake_b': ['fake_a'], 'fake_c': ['fake_b'], 'fake_other': []}
+    timings, _ = run(dependencies, critical_steps=['fake_a'])
+
+    assert timings['fake_a']['status'] == 'error'
+    assert timings['fake_b']['status'] == 'skipped'
+    assert timings['fake_c']['status'] == 'skipped'   # 後続の後続も省略
+    assert 'fake_a' in timings['fake_b']['error']
+    assert timings['fake_other']['status'] == 'ok'
+    assert ('start', 'fake_b') not in steps.events
+    assert ('start', 'fake_c') not in steps.events
+
+
+def test_soft_failure_of_critical_step_also_skips_dependents(monkeypatch):
+    RecordingSteps(monkeypatch, {
+        'fake_a': {'result': {'status': 'failed', 'reason': 'no_input'}}, 'fake_b': {}
+    })
+    timings, _ = run({'fake_a': [], 'fake_b': ['fake_a']}, critical_steps=['fake_a'])
+    assert timings['fake_a'] == {'status': 'failed', 'seconds': timings['fake_a']['seconds'], 'error': 'no_input'}
+    assert timings['fake_b']['status'] == 'skipped'
+
+
+def test_failure_of_other_steps_does_not_stop_dependents(monkeypatch):
+    RecordingSteps(monkeypatch, {'fake_a': {'raise': True}, 'fake_b': {}})
+    timings, _ = run({'fake_a': [], 'fake_b': ['fake_a']})
+    assert timings['fake_a']['status'] == 'error'
+    assert timings['fake_b']['status'] == 'ok'
+
+
+def test_disabled_step_does_not_block_dependents(monkeypatch):
+    steps = RecordingSteps(monkeypatch, {'fake_a': {}, 'fake_b': {}})
+    timings, _ = run({'fake_a': [], 'fake_b': ['fake_a']}, should_run=lambda name: name != 'fake_a')
+    assert timings['fake_a']['status'] == 'disabled'
+    assert timings['fake_b']['status'] == 'ok'
+    assert ('start', 'fake_a') not in steps.events
+
+
+def test_undefined_dependency_is_rejected():
+    with pytest.raises(ValueError):
+        StepScheduler({'fake_a': ['missing']})
+
+
+def test_cycle_is_reported(monkeypatch):
+    RecordingSteps(monkeypatch, {'fake_a': {}, 'fake_b': {}})
+    with pytest.raises(Exception, match='依存関係'):
+        run({'fake_a': ['fake_b'], 'fake_b': ['fake_a']})
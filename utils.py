@@ -1,89 +1,122 @@
-import requests
-from bs4 import BeautifulSoup
 import json
 import os
-import pickle
-from datetime import datetime, timedelta
+import time
+import threading
+from contextlib import contextmanager
+from pipeline_modules.fs_index import find_child_directory
 
-def fetch_nico_user_name(user_id: str):
-    """ニコニコ動画からユーザー名を取得"""
-    url = f"https://www.nicovideo.jp/user/{user_id}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
-    }
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.encoding = "utf-8"
-        soup = BeautifulSoup(response.text, "lxml")
+def get_user_nickname_with_cache(user_id: str, cache_days=7):
+    """キャッシュ機能付きでユーザーニックネームを取得（cache/nicknames.sqlite3 を共有）"""
+    from pipeline_modules.nickname_resolver import get_nickname_resolver
+    return get_nickname_resolver().resolve(user_id, fresh_seconds=cache_days * 24 * 3600)
 
-        # 1. metaタグから取得
-        meta_tag = soup.find("meta", {"property": "profile:username"})
-        if meta_tag and meta_tag.get("content"):
-            return meta_tag["content"]
+def save_json_atomic(path, data, indent=2, checksum=False):
+    """一時ファイルに書き出し、fsyncしてから置き換えてJSONを保存（書きかけを残さない）"""
+    from pipeline_modules.atomic_io import atomic_write_json
+    atomic_write_json(path, data, indent=indent, checksum=checksum)
 
-        # 2. JSON-LDから取得
-        json_ld = soup.find("script", type="application/ld+json")
-        if json_ld:
+@contextmanager
+def file_lock(path, timeout=60, stale_seconds=300):
+    """ロックファイルによる排他（スレッド・プロセス間共通）"""
+    lock_path = f"{path}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            break
+        except FileExistsError:
             try:
-                data = json.loads(json_ld.string)
-                if isinstance(data, dict) and "name" in data:
-                    return data["name"]
-            except json.JSONDecodeError:
-                pass
+                # 異常終了で残ったロックは破棄
+                if time.time() - os.path.getmtime(lock_path) > stale_seconds:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"ロック取得タイムアウト: {lock_path}")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
 
-        # 3. クラス名から取得
-        nickname_element = soup.find(class_="UserDetailsHeader-nickname")
-        if nickname_element:
-            return nickname_element.get_text(strip=True)
+def merge_broadcast_json(broadcast_dir, lv_value, updates):
+    """統合JSONの指定キーだけを更新（並列実行中の他ステップの更新を上書きしない）"""
+    json_path = os.path.join(broadcast_dir, f"{lv_value}_data.json")
+    with file_lock(json_path):
+        if not os.path.exists(json_path):
+            print(f"統合JSONが見つかりません: {json_path}")
+            return False
+        with open(json_path, 'r', encoding='utf-8') as f:
+            broadcast_data = json.load(f)
+        broadcast_data.update(updates)
+        save_json_atomic(json_path, broadcast_data, checksum=True)
+    return True
 
-        return None
+GPU_INFO_CACHE = os.path.join('cache', 'gpu_info.json')
+GPU_INFO_TTL = 24 * 3600
 
-    except requests.RequestException as e:
-        print(f"HTTPエラー: {e}")
+_gpu_info = None
+_gpu_info_lock = threading.Lock()
+
+def _installed_torch_version():
+    """torchを読み込まずにインストール済みのバージョンを取得"""
+    try:
+        from importlib.metadata import version
+        return version('torch')
+    except Exception:
         return None
 
-def get_user_nickname_with_cache(user_id: str, cache_days=7):
-    """キャッシュ機能付きでユーザーニックネームを取得"""
-    cache_file = f"cache/user_nickname_{user_id}.pkl"
-    
-    # キャッシュディレクトリを作成
-    os.makedirs("cache", exist_ok=True)
-    
-    # キャッシュが存在し、有効期限内かチェック
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'rb') as f:
-                cached_data = pickle.load(f)
-                cached_time = cached_data.get('timestamp')
-                cached_nickname = cached_data.get('nickname')
-                
-                if cached_time and cached_nickname:
-                    # 有効期限をチェック
-                    if datetime.now() - cached_time < timedelta(days=cache_days):
-                        print(f"キャッシュからニックネーム取得: {user_id} -> {cached_nickname}")
-                        return cached_nickname
-        except (pickle.PickleError, KeyError):
-            # キャッシュファイルが破損している場合は削除
-            os.remove(cache_file)
+def probe_gpu():
+    """torchを読み込んでGPU情報を取得（数秒かかる）"""
+    try:
+        import torch
+    except ImportError:
+        return {"available": False, "name": "PyTorch未インストール", "cuda_version": "N/A"}
     
-    # キャッシュが無効または存在しない場合、新しく取得
-    print(f"APIからニックネーム取得: {user_id}")
-    nickname = fetch_nico_user_name(user_id)
+    available = torch.cuda.is_available()
+    return {
+        "available": available,
+        "name": torch.cuda.get_device_name() if available else "N/A",
+        "cuda_version": torch.version.cuda if available else "N/A",
+        "memory_mb": torch.cuda.get_device_properties(0).total_memory // (1024 * 1024) if available else 0
+    }
+
+def get_gpu_info(refresh=False, probe=True):
+    """GPU情報を取得（プロセス内とcache/に保存、torchの入れ替え時や期限切れで再取得）
+    probe=False の場合は有効なキャッシュがなければNoneを返す（torchを読み込まない）"""
+    global _gpu_info
+    torch_version = _installed_torch_version()
     
-    if nickname:
-        # 成功した場合はキャッシュに保存
-        cache_data = {
-            'nickname': nickname,
-            'timestamp': datetime.now()
-        }
+    with _gpu_info_lock:
+        if not refresh:
+            if _gpu_info is not None:
+                return _gpu_info
+            try:
+                with open(GPU_INFO_CACHE, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+                if cached.get("torch_version") == torch_version and time.time() - cached.get("checked_at", 0) < GPU_INFO_TTL:
+                    _gpu_info = cached
+                    return cached
+            except (OSError, json.JSONDecodeError):
+                pass
+        
+        if not probe:
+            return None
+        
+        info = probe_gpu()
+        info.update({"torch_version": torch_version, "checked_at": time.time()})
+        _gpu_info = info
         try:
-            with open(cache_file, 'wb') as f:
-                pickle.dump(cache_data, f)
-            print(f"ニックネームをキャッシュに保存: {user_id} -> {nickname}")
-        except Exception as e:
-            print(f"キャッシュ保存エラー: {e}")
-    
-    return nickname
+            os.makedirs(os.path.dirname(GPU_INFO_CACHE), exist_ok=True)
+            save_json_atomic(GPU_INFO_CACHE, info)
+        except OSError as e:
+            print(f"GPU情報キャッシュ保存エラー: {str(e)}")
+        return info
 
 def sanitize_path_component(name: str) -> str:
     """パス用のサニタイズ"""
@@ -107,18 +140,12 @@ def find_account_directory(platform_directory, account_id, display_name=None):
         safe_name = sanitize_path_component(display_name)
         account_dir = os.path.join(platform_directory, f"{account_id}_{safe_name}")
     else:
-        # display_nameがない場合は既存ディレクトリを探す
-        if os.path.exists(platform_directory):
-            for item in os.listdir(platform_directory):
-                item_path = os.path.join(platform_directory, item)
-                if os.path.isdir(item_path) and item.startswith(f"{account_id}_"):
-                    account_dir = item_path
-                    break
-            else:
-                # 見つからない場合はaccount_idのみ
-                account_dir = os.path.join(platform_directory, account_id)
-        else:
-            account_dir = os.path.join(platform_directory, account_id)
+        # display_nameがない場合は既存ディレクトリを探す（インデックス経由）
+        found = find_child_directory(platform_directory, f"{account_id}_")
+        if found:
+            return found
+        # 見つからない場合はaccount_idのみ
+        account_dir = os.path.join(platform_directory, account_id)
     
     os.makedirs(account_dir, exist_ok=True)
     return account_dir
@@ -135,12 +162,10 @@ def find_ncv_directory(ncv_directory, account_id, display_name=None):
         if os.path.exists(target_dir):
             return target_dir
     
-    # フォールバック: account_idで始まるディレクトリを探す
-    if os.path.exists(ncv_directory):
-        for item in os.listdir(ncv_directory):
-            item_path = os.path.join(ncv_directory, item)
-            if os.path.isdir(item_path) and item.startswith(f"{account_id}_"):
-                return item_path
+    # フォールバック: account_idで始まるディレクトリを探す（インデックス経由）
+    found = find_child_directory(ncv_directory, f"{account_id}_")
+    if found:
+        return found
     
     # デフォルト
     return ncv_directory
\ No newline at end of file